@@ -0,0 +1,388 @@
+"""In-process stand-ins for the Pyrogram user and bot clients, used by the benchmarks.
+
+They implement the part of the client API the bot uses (get_messages, stream_media,
+download_media, send_*, save_file, send_media_group, copy_*) on top of a simulated network with
+per-request latency, per-connection and shared-link bandwidth, and random FloodWaits. Source
+messages are real ``pyrogram.types.Message`` objects, so the bot's code runs unchanged.
+"""
+
+import asyncio
+import inspect
+import os
+import random
+from datetime import datetime
+from itertools import count
+from time import monotonic
+from types import SimpleNamespace
+
+from pyrogram import enums
+from pyrogram.errors import FloodWait
+from pyrogram.types import Audio, Chat, Document, Message, Photo, Video
+
+from config import PyroConf
+from helpers.ratelimit import rate_limiter
+from helpers.streaming import MediaStream
+from helpers.upload import BIG_FILE_SIZE, PART_SIZE, UploadedFile
+
+CHUNK_SIZE = 1024 * 1024  # stream_media chunk
+ZERO_CHUNK = bytes(CHUNK_SIZE)
+MB = 1024 * 1024
+
+
+class Network:
+    """Latency, bandwidth and FloodWait model shared by the fake clients."""
+
+    def __init__(self, latency: float, connection_bandwidth: float, link_bandwidth: float,
+                 flood_rate: float, flood_seconds: float, seed: int):
+        self.latency = latency
+        self.connection_bandwidth = connection_bandwidth  # bytes/s of one connection
+        self.link_bandwidth = link_bandwidth  # bytes/s shared by all connections (0 = unlimited)
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.random = random.Random(seed)
+        self._link_free_at = 0.0
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self.api_calls = 0
+        self.flood_waits = 0
+
+    async def transfer(self, size: int, direction: str):
+        """Sleeps for moving ``size`` bytes over one connection of the shared link."""
+        now = monotonic()
+        duration = size / self.connection_bandwidth
+        if self.link_bandwidth:
+            start = max(now, self._link_free_at)
+            self._link_free_at = start + size / self.link_bandwidth
+            duration = max(duration, self._link_free_at - now)
+        await asyncio.sleep(duration)
+        if direction == "down":
+            self.bytes_down += size
+        else:
+            self.bytes_up += size
+
+    def flood(self) -> bool:
+        return self.flood_rate > 0 and self.random.random() < self.flood_rate
+
+
+class FakeClient:
+    def __init__(self, name: str, network: Network, user_id: int, is_premium: bool = False):
+        self.name = name
+        self.network = network
+        self.me = SimpleNamespace(id=user_id, is_premium=is_premium)
+        self.flood_until = 0.0
+
+    async def _api(self, method_class: str = None):
+        """One API round trip, throttled by the bot's real rate limiter like ManagedClient.invoke."""
+        bucket = rate_limiter.bucket(self.name, method_class) if method_class else None
+        while True:
+            if bucket:
+                await bucket.acquire()
+            await asyncio.sleep(self.network.latency)
+            self.network.api_calls += 1
+            if not self.network.flood():
+                if bucket:
+                    bucket.on_success()
+                return
+            self.network.flood_waits += 1
+            seconds = self.network.flood_seconds
+            self.flood_until = max(self.flood_until, monotonic() + seconds)
+            if seconds > PyroConf.FLOOD_WAIT_MAX:
+                raise FloodWait(value=int(seconds))
+            if bucket:
+                bucket.on_flood_wait(seconds)
+            else:
+                await asyncio.sleep(seconds)
+
+
+def media_of(message: Message):
+    return getattr(message, message.media.value) if message.media else None
+
+
+async def _report(progress, current: int, total: int, progress_args: tuple):
+    # Like Pyrogram: coroutine callbacks are awaited, plain ones run in an executor thread
+    if progress:
+        if inspect.iscoroutinefunction(progress):
+            await progress(current, total, *progress_args)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, progress, current, total, *progress_args)
+
+
+class FakeUser(FakeClient):
+    """The user session: serves a generated source channel and its media."""
+
+    def __init__(self, network: Network, channel: dict, chat: Chat):
+        super().__init__("bench_user", network, user_id=1000)
+        self.channel = channel  # message id -> Message
+        self.chat = chat
+
+    async def get_chat(self, chat_id):
+        await self._api()
+        return self.chat
+
+    async def get_messages(self, chat_id, message_ids):
+        await self._api("get_messages")
+        ids = message_ids if isinstance(message_ids, list) else [message_ids]
+        found = [self.channel.get(i) or Message(id=i, empty=True) for i in ids]
+        return found if isinstance(message_ids, list) else found[0]
+
+    async def get_chat_history(self, chat_id, limit: int = 0, offset_id: int = 0, min_id: int = 0):
+        # Newest first, one request per 100 messages like the real method
+        ids = sorted((i for i in self.channel if (not offset_id or i < offset_id) and i >= min_id), reverse=True)
+        if limit:
+            ids = ids[:limit]
+        for i, message_id in enumerate(ids):
+            if i % 100 == 0:
+                await self._api("get_messages")
+            yield self.channel[message_id]
+
+    async def get_media_group(self, chat_id, message_id):
+        await self._api("get_messages")
+        group_id = self.channel[message_id].media_group_id
+        return [m for m in self.channel.values() if m.media_group_id == group_id]
+
+    async def stream_media(self, message, limit: int = 0, offset: int = 0):
+        size = media_of(message).file_size
+        chunk = offset
+        end = -(-size // CHUNK_SIZE)
+        if limit:
+            end = min(end, offset + limit)
+        await self._api()
+        while chunk < end:
+            length = min(CHUNK_SIZE, size - chunk * CHUNK_SIZE)
+            await self.network.transfer(length, "down")
+            yield ZERO_CHUNK[:length]
+            chunk += 1
+
+    async def download_media(self, message, file_name: str = "downloads/", progress=None, progress_args: tuple = (),
+                             **kwargs):
+        media = media_of(message)
+        directory, name = os.path.split(file_name)
+        name = name or getattr(media, "file_name", None) or f"{message.media.value}_{message.id}.bin"
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.abspath(os.path.join(directory, name))
+        done = 0
+        with open(path + ".temp", "wb") as file:
+            async for chunk in self.stream_media(message):
+                file.write(chunk)
+                done += len(chunk)
+                await _report(progress, done, media.file_size, progress_args)
+        os.replace(path + ".temp", path)
+        return path
+
+
+class FakeBot(FakeClient):
+    """The bot: "uploads" files at the simulated bandwidth and returns sent messages."""
+
+    def __init__(self, network: Network):
+        super().__init__("bench_bot", network, user_id=2000)
+        self._ids = count(1)
+        self._files = count(1)
+        self.sent_media = {}  # file_id -> media type, for send_cached_media
+        self.sent = 0
+
+    async def _upload_parts(self, parts, size: int, progress=None, progress_args: tuple = ()):
+        """Uploads ``(index, data)`` parts like upload_parts: UPLOAD_WORKERS connections for big files."""
+        workers = max(1, PyroConf.UPLOAD_WORKERS) if size > BIG_FILE_SIZE else 1
+        queue = asyncio.Queue(workers * 2)
+        uploaded = 0
+
+        async def worker():
+            nonlocal uploaded
+            while (item := await queue.get()) is not None:
+                await asyncio.sleep(self.network.latency)
+                await self.network.transfer(len(item), "up")
+                uploaded += len(item)
+                await _report(progress, uploaded, size, progress_args)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            async for _, data in parts:
+                await queue.put(data)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hasattr(parts, "aclose"):
+                await parts.aclose()
+
+    async def _file_parts(self, path: str):
+        size = os.path.getsize(path)
+        for index in range(-(-size // PART_SIZE)):
+            yield index, ZERO_CHUNK[:min(PART_SIZE, size - index * PART_SIZE)]
+
+    async def save_file(self, path, progress=None, progress_args: tuple = (), **kwargs):
+        if isinstance(path, UploadedFile):
+            return path.input_file
+        if isinstance(path, MediaStream):
+            await self._upload_parts(path.iter_parts(), path.size, progress, progress_args)
+            return SimpleNamespace(size=path.size)
+        size = os.path.getsize(path)
+        await self._upload_parts(self._file_parts(path), size, progress, progress_args)
+        return SimpleNamespace(size=size)
+
+    def _message(self, chat_id, media_type: str = None, caption: str = None, text: str = None,
+                 media_group_id: str = None, file_id: str = None) -> Message:
+        fields = {}
+        if media_type:
+            file_id = file_id or f"bench_file_{next(self._files)}"
+            self.sent_media[file_id] = media_type
+            media_class = {"photo": Photo, "video": Video, "audio": Audio}.get(media_type, Document)
+            extra = {"width": 1280, "height": 720, "date": datetime.now()} if media_type == "photo" else \
+                {"width": 1280, "height": 720, "duration": 60} if media_type == "video" else \
+                {"duration": 60} if media_type == "audio" else {}
+            fields[media_type] = media_class(file_id=file_id, file_unique_id=file_id, file_size=0, **extra)
+            fields["media"] = enums.MessageMediaType(media_type)
+        self.sent += 1
+        return Message(id=next(self._ids), chat=Chat(id=chat_id, type=enums.ChatType.CHANNEL), caption=caption,
+                       text=text, media_group_id=media_group_id, client=self, **fields)
+
+    async def _send_media(self, chat_id, media_type: str, media, caption=None, progress=None,
+                          progress_args: tuple = (), **kwargs) -> Message:
+        await self.save_file(media, progress=progress, progress_args=progress_args)
+        await self._api("send")
+        return self._message(chat_id, media_type, caption=caption)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._send_media(chat_id, "photo", photo, **kwargs)
+
+    async def send_video(self, chat_id, video, **kwargs):
+        return await self._send_media(chat_id, "video", video, **kwargs)
+
+    async def send_audio(self, chat_id, audio, **kwargs):
+        return await self._send_media(chat_id, "audio", audio, **kwargs)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._send_media(chat_id, "document", document, **kwargs)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._api("send")
+        return self._message(chat_id, text=text)
+
+    async def send_cached_media(self, chat_id, file_id, caption=None, **kwargs):
+        await self._api("send")
+        return self._message(chat_id, self.sent_media.get(file_id, "document"), caption=caption, file_id=file_id)
+
+    async def send_media_group(self, chat_id, media: list, **kwargs):
+        # Pyrogram uploads the items one after another before the single send call
+        types = []
+        for item in media:
+            media_type = type(item).__name__.replace("InputMedia", "").lower()
+            if not (isinstance(item.media, str) and item.media in self.sent_media):
+                await self.save_file(item.media)
+            types.append(media_type)
+        await self._api("send")
+        group_id = f"bench_group_{next(self._ids)}"
+        return [self._message(chat_id, t, caption=item.caption, media_group_id=group_id) for t, item in zip(types, media)]
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._api("send")
+        return self._message(chat_id, text="copy")
+
+    async def copy_media_group(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._api("send")
+        return [self._message(chat_id, text="copy")]
+
+    # Edits/deletions of messages the bot sent itself (e.g. mirror sync notices)
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._api("edit")
+        return self._message(chat_id, text=text)
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        await self._api()
+        return True
+
+
+class StatusMessage:
+    """A message the bot sent to the user (progress/status), which can be edited and deleted."""
+
+    _ids = count(1)
+
+    def __init__(self, bot: FakeBot, chat_id: int, text: str):
+        self.bot = bot
+        self.chat = SimpleNamespace(id=chat_id)
+        self.id = next(self._ids)
+        self.text = text
+        self.edits = 0
+
+    async def edit(self, text: str, **kwargs):
+        await self.bot._api("edit")
+        self.text = text
+        self.edits += 1
+        return self
+
+    async def delete(self):
+        await self.bot._api()
+
+
+class CommandMessage:
+    """The user's /dl command message, which the bot replies to."""
+
+    def __init__(self, bot: FakeBot, user_id: int, command: list):
+        self.bot = bot
+        self.chat = SimpleNamespace(id=user_id)
+        self.from_user = SimpleNamespace(id=user_id)
+        self.command = command
+        self.replies = []
+
+    async def reply(self, text: str, **kwargs):
+        await self.bot._api("send")
+        status = StatusMessage(self.bot, self.chat.id, text)
+        self.replies.append(status)
+        return status
+
+
+def build_channel(user_client_factory, chat_id: int, count_: int, mix: dict, sizes: dict, seed: int,
+                  protected: bool = True, empty_rate: float = 0.0):
+    """Generates ``count_`` source message IDs with the given media mix.
+
+    ``mix`` weights the kinds text, photo, album, video, document and audio; ``sizes`` gives
+    their file sizes in bytes (``album_items`` sets the album length). Returns ``(chat, messages)``.
+    """
+    rng = random.Random(seed)
+    chat = Chat(id=chat_id, type=enums.ChatType.CHANNEL, has_protected_content=protected)
+    kinds, weights = zip(*[(k, w) for k, w in mix.items() if w > 0])
+    messages = {}
+    next_id = 1
+    groups = count(1)
+
+    def jitter(size: int) -> int:
+        return max(1, int(size * rng.uniform(0.75, 1.25)))
+
+    def media_message(msg_id: int, kind: str, group_id: str = None) -> Message:
+        file_id = f"src_{chat_id}_{msg_id}"
+        common = dict(file_id=file_id, file_unique_id=file_id, file_size=jitter(sizes[kind]))
+        if kind == "photo":
+            media = Photo(width=1280, height=720, date=datetime.now(), **common)
+        elif kind == "video":
+            media = Video(width=1280, height=720, duration=120, file_name=f"video_{msg_id}.mp4",
+                          mime_type="video/mp4", **common)
+        elif kind == "audio":
+            media = Audio(duration=180, file_name=f"audio_{msg_id}.mp3", mime_type="audio/mpeg", **common)
+        else:
+            media = Document(file_name=f"file_{msg_id}.bin", mime_type="application/octet-stream", **common)
+        return Message(id=msg_id, chat=chat, media=enums.MessageMediaType(kind), caption=f"{kind} {msg_id}",
+                       media_group_id=group_id, has_protected_content=protected, **{kind: media})
+
+    while next_id <= count_:
+        if empty_rate and rng.random() < empty_rate:
+            next_id += 1  # Deleted message: the ID is simply missing
+            continue
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "text":
+            messages[next_id] = Message(id=next_id, chat=chat, text=f"Message {next_id}", has_protected_content=protected)
+            next_id += 1
+        elif kind == "album":
+            group_id = f"album_{next(groups)}"
+            for _ in range(min(sizes["album_items"], count_ - next_id + 1)):
+                messages[next_id] = media_message(next_id, rng.choice(["photo", "photo", "video"]), group_id)
+                next_id += 1
+        else:
+            messages[next_id] = media_message(next_id, kind)
+            next_id += 1
+
+    user = user_client_factory(messages, chat)
+    for message in messages.values():
+        message._client = user
+    return chat, messages, user
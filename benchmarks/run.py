@@ -0,0 +1,231 @@
+"""Offline benchmark of the forwarding engine against fake Telegram clients.
+
+Runs the bot's own code (the /dl handler, download_message_range or processMediaGroup) on a
+generated source channel over a simulated network, and reports messages/s, bytes/s, peak RSS
+and the disk high-water mark. Nothing talks to Telegram.
+
+Examples:
+    python benchmarks/run.py range --messages 100
+    python benchmarks/run.py range --mix video=1 --video-mb 80 --set STREAM_MEDIA=False
+    python benchmarks/run.py dl --messages 40 --flood-rate 0.02 --json
+    python benchmarks/run.py album --albums 10 --album-items 6
+
+``--set KEY=VALUE`` overrides any config.py setting (applied before the bot is imported), so engine
+modes can be compared run against run. Each run uses a fresh temporary working directory.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from time import monotonic
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_CHAT_ID = -1001234567890
+USER_ID = 42
+MB = 1024 * 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenario", choices=["dl", "range", "album"],
+                        help="dl: the /dl command end to end; range: download_message_range; album: processMediaGroup")
+    parser.add_argument("--messages", type=int, default=50, help="Source message IDs (dl/range)")
+    parser.add_argument("--albums", type=int, default=5, help="Albums to send (album scenario)")
+    parser.add_argument("--mix", default="text=3,photo=3,album=1,video=1",
+                        help="Media mix weights of text, photo, album, video, document, audio")
+    parser.add_argument("--photo-kb", type=int, default=300)
+    parser.add_argument("--video-mb", type=float, default=30)
+    parser.add_argument("--document-mb", type=float, default=5)
+    parser.add_argument("--audio-mb", type=float, default=6)
+    parser.add_argument("--album-items", type=int, default=5)
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="Share of deleted message IDs")
+    parser.add_argument("--copy-allowed", action="store_true",
+                        help="Source chat without content protection (server-side copies)")
+    parser.add_argument("--destinations", type=int, default=1, help="Forward to this many chats")
+    parser.add_argument("--latency-ms", type=float, default=60, help="Per-request round trip")
+    parser.add_argument("--bandwidth-mbps", type=float, default=40, help="Per-connection bandwidth (Mbit/s)")
+    parser.add_argument("--link-mbps", type=float, default=400, help="Shared link bandwidth (Mbit/s, 0 = unlimited)")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability of a FloodWait per API call")
+    parser.add_argument("--flood-seconds", type=float, default=2, help="Length of injected FloodWaits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Override a config setting")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the bot's INFO logging")
+    return parser.parse_args(argv)
+
+
+def prepare_environment(args) -> str:
+    """Isolates the run in a temporary directory and applies config overrides before any bot import."""
+    workdir = tempfile.mkdtemp(prefix="fwdbot-bench-")
+    os.environ.update({
+        "API_ID": "1",
+        "API_HASH": "benchmark",
+        "BOT_TOKEN": "1:benchmark",
+        "SESSION_STRING": "benchmark",
+        "SPOOL_DIR": os.path.join(workdir, "downloads"),
+        "DATABASE_PATH": os.path.join(workdir, "bot_data.db"),
+    })
+    for override in args.set:
+        key, _, value = override.partition("=")
+        os.environ[key.strip()] = value.strip()
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    return workdir
+
+
+class ResourceSampler:
+    """Samples process RSS and the bytes spooled on disk, keeping the peaks."""
+
+    def __init__(self, directories: list, interval: float = 0.05):
+        import psutil
+
+        self.process = psutil.Process()
+        self.directories = [d for d in directories if d]
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._task = None
+
+    def disk_usage(self) -> int:
+        total = 0
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += os.stat(os.path.join(root, name)).st_blocks * 512
+                    except OSError:
+                        pass
+        return total
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+        self.peak_disk = max(self.peak_disk, self.disk_usage())
+
+    async def _run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.sample()
+
+
+async def wait_for_scheduler(scheduler):
+    while scheduler.running or any(scheduler.queues.values()):
+        await asyncio.sleep(0.05)
+
+
+async def run_benchmark(args) -> dict:
+    # Imported here: config must see the overrides from prepare_environment
+    import main
+    from config import PyroConf
+    from helpers import metrics
+    from helpers.client_pool import ClientPool
+    from helpers.scheduler import Job, RANGE, scheduler
+    from helpers.utils import processMediaGroup
+    from benchmarks.fake_telegram import CommandMessage, FakeBot, FakeUser, Network, build_channel
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    network = Network(
+        latency=args.latency_ms / 1000,
+        connection_bandwidth=args.bandwidth_mbps * 1e6 / 8,
+        link_bandwidth=args.link_mbps * 1e6 / 8,
+        flood_rate=args.flood_rate,
+        flood_seconds=args.flood_seconds,
+        seed=args.seed,
+    )
+    mix = {}
+    for item in args.mix.split(","):
+        kind, _, weight = item.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    sizes = {
+        "photo": args.photo_kb * 1024,
+        "video": int(args.video_mb * MB),
+        "document": int(args.document_mb * MB),
+        "audio": int(args.audio_mb * MB),
+        "album_items": max(2, min(10, args.album_items)),
+    }
+    if args.scenario == "album":
+        mix, count = {"album": 1}, args.albums * sizes["album_items"]
+    else:
+        count = args.messages
+    _, channel, user = build_channel(lambda messages, chat: FakeUser(network, messages, chat), SOURCE_CHAT_ID,
+                                     count, mix, sizes, args.seed, protected=not args.copy_allowed,
+                                     empty_rate=args.empty_rate)
+    bot = FakeBot(network)
+    destinations = [-1009000000000 - i for i in range(args.destinations)] if args.destinations > 0 else []
+    command = CommandMessage(bot, USER_ID, [])
+
+    sampler = ResourceSampler([PyroConf.SPOOL_DIR, PyroConf.SPOOL_TMPFS_DIR, os.path.abspath("Assets")])
+    os.makedirs("Assets", exist_ok=True)
+    sampler.start()
+    started = monotonic()
+    if args.scenario == "dl":
+        main.user_pool = ClientPool("users", [user])
+        main.bot_pool = ClientPool("bots", [bot])
+        channel_link = f"https://t.me/c/{str(SOURCE_CHAT_ID)[4:]}/1"
+        command.command = ["dl", channel_link, str(count), *[str(d) for d in destinations]]
+        await main.download_media(bot, command)
+        await wait_for_scheduler(scheduler)
+    elif args.scenario == "range":
+        job = Job(USER_ID, RANGE, "benchmark", lambda job: None, total=count)
+        await main.download_message_range(bot, command, user, SOURCE_CHAT_ID, 1, count, destinations, job)
+    else:
+        job = Job(USER_ID, RANGE, "benchmark", lambda job: None, total=count)
+        firsts = {}
+        for message in channel.values():
+            firsts.setdefault(message.media_group_id, []).append(message)
+        for members in firsts.values():
+            await processMediaGroup(members[0], bot, command, destinations[0] if destinations else USER_ID,
+                                    job, members)
+    elapsed = monotonic() - started
+    await sampler.stop()
+
+    outcomes = {f"{kind}:{outcome}": int(value)
+                for (kind, outcome), value in metrics.messages_processed.values.items()}
+    return {
+        "scenario": args.scenario,
+        "settings": args.set,
+        "source_messages": len(channel),
+        "seconds": round(elapsed, 2),
+        "messages_per_second": round(len(channel) / elapsed, 2),
+        "downloaded_mb": round(network.bytes_down / MB, 1),
+        "uploaded_mb": round(network.bytes_up / MB, 1),
+        "mb_per_second": round((network.bytes_down + network.bytes_up) / MB / elapsed, 2),
+        "peak_rss_mb": round(sampler.peak_rss / MB, 1),
+        "disk_high_water_mb": round(sampler.peak_disk / MB, 1),
+        "api_calls": network.api_calls,
+        "flood_waits": network.flood_waits,
+        "sent_messages": bot.sent,
+        "outcomes": outcomes,
+    }
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    prepare_environment(args)
+    result = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    width = max(len(key) for key in result)
+    for key, value in result.items():
+        print(f"{key.ljust(width)}  {value}")
+
+
+if __name__ == "__main__":
+    main_cli()
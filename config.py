@@ -22,10 +22,107 @@ except:
         exit(1)
 
 
+def _unique(values):
+    """Strips and de-duplicates a list of config values, keeping order and dropping blanks."""
+    result = []
+    for value in values:
+        value = (value or "").strip()
+        if value and value not in result:
+            result.append(value)
+    return result
+
+
 # Pyrogram setup
 class PyroConf(object):
     API_ID = int(getenv("API_ID", "6"))
     API_HASH = getenv("API_HASH", "eb06d4abfb49dc3eeb1aeb98ae0f581e")
     BOT_TOKEN = getenv("BOT_TOKEN")
     SESSION_STRING = getenv("SESSION_STRING")
+    # Optional extra clients for the transfer pools (comma-separated). The bot above stays the one
+    # users talk to; extra bots only upload to chats they are members of.
+    BOT_TOKENS = _unique([BOT_TOKEN, *getenv("BOT_TOKENS", "").split(",")])
+    SESSION_STRINGS = _unique([SESSION_STRING, *getenv("SESSION_STRINGS", "").split(",")])
     BOT_START_TIME = time()
+
+    # Adaptive rate limiting (starting requests/second per client; learned from FloodWaits afterwards)
+    RATE_GET_MESSAGES = float(getenv("RATE_GET_MESSAGES", "2"))
+    RATE_SEND = float(getenv("RATE_SEND", "1"))
+    RATE_EDIT = float(getenv("RATE_EDIT", "1"))
+    # Progress/status edits are coalesced: at most one edit per PROGRESS_EDIT_INTERVAL seconds overall
+    # and per PROGRESS_MESSAGE_INTERVAL seconds for the same message; intermediate updates are dropped
+    PROGRESS_EDIT_INTERVAL = float(getenv("PROGRESS_EDIT_INTERVAL", "1"))
+    PROGRESS_MESSAGE_INTERVAL = float(getenv("PROGRESS_MESSAGE_INTERVAL", "5"))
+    FLOOD_WAIT_MAX = int(getenv("FLOOD_WAIT_MAX", "300"))  # Longer FloodWaits stop the task
+    FLOOD_RETRIES = int(getenv("FLOOD_RETRIES", "5"))  # Consecutive FloodWaits absorbed per call
+
+    # Local state (file_id cache etc.)
+    DATABASE_PATH = getenv("DATABASE_PATH", "bot_data.db")
+    FILE_CACHE = getenv("FILE_CACHE", "True").lower() == "true"  # Reuse uploaded file_ids for repeat media
+    FILE_CACHE_MAX_ENTRIES = int(getenv("FILE_CACHE_MAX_ENTRIES", "50000"))
+    FILE_CACHE_TTL_DAYS = float(getenv("FILE_CACHE_TTL_DAYS", "30"))
+
+    # Job scheduler
+    MAX_CONCURRENT_JOBS = int(getenv("MAX_CONCURRENT_JOBS", "3"))  # Jobs running at once across all users
+    MAX_JOBS_PER_USER = int(getenv("MAX_JOBS_PER_USER", "1"))  # Jobs running at once per user
+    MAX_QUEUED_PER_USER = int(getenv("MAX_QUEUED_PER_USER", "10"))
+
+    # Range job checkpoints
+    AUTO_RESUME = getenv("AUTO_RESUME", "True").lower() == "true"  # Resume jobs interrupted by a restart
+    JOB_HISTORY_DAYS = float(getenv("JOB_HISTORY_DAYS", "7"))  # Keep completed job journals this long
+
+    # Remember what was delivered where, so overlapping /dl ranges only send new messages
+    DELIVERY_INDEX = getenv("DELIVERY_INDEX", "True").lower() == "true"
+
+    # /mirror: new posts are synced every MIRROR_POLL_INTERVAL seconds; every MIRROR_BACKFILL_INTERVAL
+    # the last MIRROR_BACKFILL_LIMIT mirrored posts are re-checked for ones that were never delivered
+    MIRROR_POLL_INTERVAL = int(getenv("MIRROR_POLL_INTERVAL", "300"))
+    MIRROR_BACKFILL_INTERVAL = int(getenv("MIRROR_BACKFILL_INTERVAL", "21600"))  # 0 = no backfill
+    MIRROR_BACKFILL_LIMIT = int(getenv("MIRROR_BACKFILL_LIMIT", "1000"))
+
+    # Copy unrestricted messages server-side instead of downloading and re-uploading them
+    COPY_FAST_PATH = getenv("COPY_FAST_PATH", "True").lower() == "true"
+
+    # Streaming: large media is uploaded while it downloads, without a temporary file
+    STREAM_MEDIA = getenv("STREAM_MEDIA", "True").lower() == "true"
+    STREAM_THRESHOLD_MB = int(getenv("STREAM_THRESHOLD_MB", "20"))  # Smaller files keep the disk pipeline
+    STREAM_BUFFER_MB = int(getenv("STREAM_BUFFER_MB", "8"))  # Download chunks held in memory ahead of the upload
+
+    # Parallel downloads: large files are fetched as several ranges over separate connections
+    DOWNLOAD_CONNECTIONS = int(getenv("DOWNLOAD_CONNECTIONS", "4"))
+    PARALLEL_DOWNLOAD_THRESHOLD_MB = int(getenv("PARALLEL_DOWNLOAD_THRESHOLD_MB", "50"))
+    MAX_TRANSMISSIONS = int(getenv("MAX_TRANSMISSIONS", "8"))  # Concurrent file transfers per client
+
+    # ffprobe/ffmpeg run only when the source message lacks metadata; at most this many at once
+    MEDIA_TOOLS_CONCURRENCY = int(getenv("MEDIA_TOOLS_CONCURRENCY", "2"))
+    MEDIA_TOOLS_TIMEOUT = float(getenv("MEDIA_TOOLS_TIMEOUT", "60"))  # Seconds before a call is killed
+
+    # Uploads: big files are sent as parallel parts, each worker on its own connection
+    UPLOAD_WORKERS = int(getenv("UPLOAD_WORKERS", "6"))
+    UPLOAD_PART_RETRIES = int(getenv("UPLOAD_PART_RETRIES", "3"))
+    # Downloads reserve their file size in the spool before starting and wait while it is full
+    SPOOL_DIR = getenv("SPOOL_DIR", "downloads")
+    SPOOL_QUOTA_MB = int(getenv("SPOOL_QUOTA_MB", "0"))  # 0 = limited by free disk space only
+    SPOOL_MIN_FREE_MB = int(getenv("SPOOL_MIN_FREE_MB", "512"))  # Always left free on the disk
+    SPOOL_WAIT_MAX = int(getenv("SPOOL_WAIT_MAX", "1800"))  # Seconds a download waits for space before failing
+    # Optional tmpfs (e.g. /dev/shm/fwd-bot) for files up to SPOOL_TMPFS_MAX_FILE_MB
+    SPOOL_TMPFS_DIR = getenv("SPOOL_TMPFS_DIR", "")
+    SPOOL_TMPFS_MAX_FILE_MB = int(getenv("SPOOL_TMPFS_MAX_FILE_MB", "20"))
+    SPOOL_TMPFS_QUOTA_MB = int(getenv("SPOOL_TMPFS_QUOTA_MB", "256"))
+
+    # Logging: records are written by a background thread; LOG_JSON=True writes JSON lines
+    LOG_JSON = getenv("LOG_JSON", "False").lower() == "true"
+    LOG_FILE_MAX_MB = int(getenv("LOG_FILE_MAX_MB", "5"))
+    LOG_BACKUP_COUNT = int(getenv("LOG_BACKUP_COUNT", "10"))
+    LOG_REPEAT_INTERVAL = float(getenv("LOG_REPEAT_INTERVAL", "60"))  # Identical warnings/errors logged once per interval
+    LOG_TAIL_MB = int(getenv("LOG_TAIL_MB", "5"))  # /logs sends the last this many MB, gzipped
+
+    # /stats reads a background sampler taking CPU/memory/disk/network readings this often
+    STATS_SAMPLE_INTERVAL = float(getenv("STATS_SAMPLE_INTERVAL", "5"))
+    STATS_HISTORY = int(getenv("STATS_HISTORY", "900"))  # Seconds of samples kept for the trends
+
+    # Range downloads
+    FETCH_BATCH_SIZE = int(getenv("FETCH_BATCH_SIZE", "200"))  # IDs per get_messages call (max 200)
+    FETCH_QUEUE_SIZE = int(getenv("FETCH_QUEUE_SIZE", "400"))  # Prefetched messages waiting to be processed
+    DOWNLOAD_WORKERS = int(getenv("DOWNLOAD_WORKERS", "3"))  # Concurrent downloads ahead of the upload stage
+    ALBUM_WORKERS = int(getenv("ALBUM_WORKERS", "4"))  # Media group items downloaded/uploaded at once
+    PIPELINE_BUFFER = int(getenv("PIPELINE_BUFFER", "6"))  # Max messages between fetch and upload (bounds disk use)
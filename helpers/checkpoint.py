@@ -0,0 +1,150 @@
+import json
+from time import time
+from typing import Iterable, Optional
+
+from config import PyroConf
+from logger import LOGGER
+from helpers.database import Database, get_db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS range_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    chat_id TEXT NOT NULL,
+    start_id INTEGER NOT NULL,
+    end_id INTEGER NOT NULL,
+    forward_chat_ids TEXT,
+    last_committed_id INTEGER,
+    status TEXT NOT NULL,
+    success INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    destination_success TEXT,
+    filters TEXT,
+    mirror_id INTEGER,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_range_jobs_user_status ON range_jobs (user_id, status);
+CREATE TABLE IF NOT EXISTS range_job_messages (
+    job_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    PRIMARY KEY (job_id, message_id)
+);
+"""
+
+# Job states. A job left "running" when the process dies was interrupted by a crash/restart.
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+STOPPED = "stopped"  # Stopped by a FloodWait that could not be absorbed
+RESUMABLE_STATES = (RUNNING, CANCELLED, STOPPED)
+
+
+def parse_chat_id(value: str):
+    """Chat IDs are stored as text because public chats are referenced by username."""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def get_forward_chat_ids(journal_job) -> list:
+    """Destination chats of a journaled job (empty when it delivers to the user's own chat)."""
+    if not journal_job["forward_chat_ids"]:
+        return []
+    return [int(chat_id) for chat_id in journal_job["forward_chat_ids"].split(",")]
+
+
+def get_destination_success(journal_job) -> dict:
+    """Per-destination success counters of a journaled job, keyed by chat ID."""
+    counts = json.loads(journal_job["destination_success"] or "{}")
+    return {int(chat_id): count for chat_id, count in counts.items()}
+
+
+class JobJournal:
+    """On-disk journal of /dl range jobs: the last committed message ID and per-message outcomes.
+
+    The upload stage delivers messages in source order, so everything up to
+    ``last_committed_id`` has been handled and a job can continue from the ID after it.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.db.executescript(SCHEMA)
+
+    def create(self, user_id: int, chat_id, start_id: int, end_id: int, forward_chat_ids: list,
+               filters: Optional[str] = None, mirror_id: Optional[int] = None) -> int:
+        """``filters`` is the job's MessageFilter as JSON, so a resumed job filters the same way.
+
+        ``mirror_id`` marks a mirror sync; those are never resumed, the next mirror poll redoes them.
+        """
+        now = time()
+        with self.db.transaction():
+            self.db.execute(
+                "INSERT INTO range_jobs (user_id, chat_id, start_id, end_id, forward_chat_ids, filters, mirror_id, "
+                "status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, str(chat_id), start_id, end_id, ",".join(str(chat_id) for chat_id in forward_chat_ids) or None,
+                 filters, mirror_id, RUNNING, now, now),
+            )
+            job_id = self.db.execute("SELECT last_insert_rowid() AS id")[0]["id"]
+        LOGGER(__name__).info(f"Created range job {job_id} for user {user_id}: {chat_id} {start_id}-{end_id}")
+        return job_id
+
+    def get(self, job_id: int):
+        rows = self.db.execute("SELECT * FROM range_jobs WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def commit(self, job_id: int, message_ids: Iterable[int], outcome: str, success: int, failed: int,
+               destination_success: Optional[dict] = None):
+        """Records the outcome of one processed unit (a message or an album) and advances the checkpoint."""
+        message_ids = list(message_ids)
+        with self.db.transaction():
+            self.db.executemany(
+                "INSERT OR REPLACE INTO range_job_messages (job_id, message_id, outcome) VALUES (?, ?, ?)",
+                [(job_id, message_id, outcome) for message_id in message_ids],
+            )
+            self.db.execute(
+                "UPDATE range_jobs SET last_committed_id = MAX(COALESCE(last_committed_id, 0), ?), "
+                "success = ?, failed = ?, destination_success = COALESCE(?, destination_success), updated = ? "
+                "WHERE job_id = ?",
+                (max(message_ids), success, failed, json.dumps(destination_success) if destination_success else None,
+                 time(), job_id),
+            )
+
+    def set_status(self, job_id: int, status: str):
+        self.db.execute("UPDATE range_jobs SET status = ?, updated = ? WHERE job_id = ?", (status, time(), job_id))
+
+    def get_resumable(self, user_id: int, job_id: Optional[int] = None):
+        """The given job, or the user's most recent unfinished one (mirror syncs excluded)."""
+        placeholders = ", ".join("?" for _ in RESUMABLE_STATES)
+        sql = f"SELECT * FROM range_jobs WHERE user_id = ? AND mirror_id IS NULL AND status IN ({placeholders})"
+        params = [user_id, *RESUMABLE_STATES]
+        if job_id is not None:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        rows = self.db.execute(sql + " ORDER BY updated DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    def get_interrupted(self) -> list:
+        """Jobs still marked running, i.e. cut short by a crash or restart, oldest first."""
+        return self.db.execute("SELECT * FROM range_jobs WHERE status = ? ORDER BY job_id", (RUNNING,))
+
+    def purge(self, older_than_days: float):
+        """Drops finished jobs (and their per-message rows) not updated for a while."""
+        cutoff = time() - older_than_days * 86400
+        with self.db.transaction():
+            self.db.execute(
+                "DELETE FROM range_job_messages WHERE job_id IN "
+                "(SELECT job_id FROM range_jobs WHERE status = ? AND updated < ?)",
+                (COMPLETED, cutoff),
+            )
+            self.db.execute("DELETE FROM range_jobs WHERE status = ? AND updated < ?", (COMPLETED, cutoff))
+
+
+_journal: Optional[JobJournal] = None
+
+
+def get_job_journal() -> JobJournal:
+    global _journal
+    if _journal is None:
+        _journal = JobJournal(get_db())
+        _journal.purge(PyroConf.JOB_HISTORY_DAYS)
+    return _journal
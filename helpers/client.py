@@ -0,0 +1,85 @@
+import asyncio
+import os
+from time import monotonic
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+from config import PyroConf
+from logger import LOGGER
+from helpers.ratelimit import rate_limiter, get_method_class
+from helpers import metrics
+from helpers.streaming import MediaStream
+from helpers.upload import UploadedFile, upload_parts, upload_file
+
+
+class ManagedClient(Client):
+    """Pyrogram client whose API calls go through the shared adaptive rate limiter.
+
+    FloodWaits up to ``FLOOD_WAIT_MAX`` seconds are absorbed: the limiter slows the method class
+    down for every task using this client and the call is retried. Longer waits, or more than
+    ``FLOOD_RETRIES`` in a row, are raised to the caller as before.
+
+    ``save_file`` uploads local files with the parallel part uploader. It also accepts a
+    MediaStream, so the regular ``send_*`` methods can upload media that is still being downloaded,
+    and an UploadedFile, so they can send a file that was uploaded ahead of time.
+    """
+
+    flood_until = 0.0  # monotonic() time until which the session is known to be flood-limited
+
+    def __init__(self, *args, **kwargs):
+        # Pyrogram allows one file transfer at a time per client by default
+        kwargs.setdefault("max_concurrent_transmissions", PyroConf.MAX_TRANSMISSIONS)
+        super().__init__(*args, **kwargs)
+
+    async def invoke(self, query, retries: int = Session.MAX_RETRIES, timeout: float = Session.WAIT_TIMEOUT,
+                     sleep_threshold: float = None):
+        method_class = get_method_class(query)
+        bucket = rate_limiter.bucket(self.name, method_class) if method_class else None
+        attempt = 0
+        while True:
+            if bucket:
+                await bucket.acquire()
+            method = type(query).__name__
+            started = monotonic()
+            try:
+                # sleep_threshold=0 makes Pyrogram raise every FloodWait so the limiter can learn from it
+                result = await super().invoke(query, retries, timeout, 0)
+            except FloodWait as fw:
+                metrics.api_seconds.observe(monotonic() - started, method=method)
+                metrics.flood_waits.inc(client=self.name, method=method)
+                metrics.flood_wait_seconds.inc(fw.value, client=self.name, method=method)
+                attempt += 1
+                self.flood_until = max(self.flood_until, monotonic() + fw.value)
+                if fw.value > PyroConf.FLOOD_WAIT_MAX or attempt > PyroConf.FLOOD_RETRIES:
+                    raise
+                LOGGER(__name__).warning(
+                    f"[{self.name}] FloodWait of {fw.value}s on {method} "
+                    f"(attempt {attempt}/{PyroConf.FLOOD_RETRIES}), slowing down"
+                )
+                if bucket:
+                    bucket.on_flood_wait(fw.value)  # acquire() sleeps until the pause ends
+                else:
+                    await asyncio.sleep(fw.value)
+                continue
+            except Exception:
+                metrics.api_seconds.observe(monotonic() - started, method=method)
+                raise
+            metrics.api_seconds.observe(monotonic() - started, method=method)
+            if bucket:
+                bucket.on_success()
+            return result
+
+    async def save_file(self, path, file_id: int = None, file_part: int = 0, progress=None, progress_args: tuple = ()):
+        if isinstance(path, UploadedFile):
+            if file_id is None:
+                return path.input_file
+            # Telegram lost a part of the earlier upload: send it again from the file on disk
+            return await upload_file(self, path.path, file_id, file_part, progress, progress_args)
+        if isinstance(path, MediaStream):
+            return await upload_parts(self, path.iter_parts(file_part), path.size, path.name,
+                                      file_id, file_part, progress, progress_args)
+        if isinstance(path, (str, os.PathLike)):
+            return await upload_file(self, str(path), file_id, file_part, progress, progress_args)
+        return await super().save_file(path, file_id, file_part, progress, progress_args)
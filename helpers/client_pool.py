@@ -0,0 +1,109 @@
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+from logger import LOGGER
+
+
+class PoolMember:
+    """A client in a pool together with its health and load."""
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.load = 0  # Jobs currently leasing this client
+        self.alive = True
+        self.chat_access = {}  # chat_id -> bool, learned lazily
+
+    @property
+    def flood_limited(self) -> bool:
+        return getattr(self.client, "flood_until", 0) > monotonic()
+
+
+class ClientPool:
+    """Spreads jobs across several clients (user sessions or bot tokens).
+
+    Each lease goes to the least-loaded healthy member that can access all the requested chats.
+    Members that are flood-limited are left out of rotation until their wait ends, and members
+    that fail to start are removed. The first client is the primary one and is used whenever no
+    chat is given or no other member qualifies.
+    """
+
+    def __init__(self, name: str, clients: list):
+        self.name = name
+        self.members = [PoolMember(client) for client in clients]
+
+    @property
+    def primary(self) -> Client:
+        return self.members[0].client
+
+    def __len__(self):
+        return sum(1 for m in self.members if m.alive)
+
+    async def start(self):
+        """Starts every member except the primary (started by main); members that fail are dropped."""
+        for member in self.members[1:]:
+            try:
+                await member.client.start()
+                LOGGER(__name__).info(f"[{self.name}] Started pool member {member.client.name}")
+            except Exception as e:
+                member.alive = False
+                LOGGER(__name__).error(f"[{self.name}] Could not start {member.client.name}, removing it from the pool: {e}")
+
+    async def stop(self):
+        for member in self.members[1:]:
+            if member.alive and member.client.is_connected:
+                try:
+                    await member.client.stop()
+                except Exception as e:
+                    LOGGER(__name__).warning(f"[{self.name}] Error stopping {member.client.name}: {e}")
+
+    async def _can_access(self, member: PoolMember, chat_id) -> bool:
+        if chat_id not in member.chat_access:
+            try:
+                await member.client.get_chat(chat_id)
+                member.chat_access[chat_id] = True
+            except FloodWait:
+                return False  # Unknown for now; ask again later
+            except Exception as e:
+                LOGGER(__name__).info(f"[{self.name}] {member.client.name} cannot access chat {chat_id}: {e}")
+                member.chat_access[chat_id] = False
+        return member.chat_access[chat_id]
+
+    async def pick(self, *chat_ids) -> PoolMember:
+        """Chooses the member for a new lease."""
+        primary = self.members[0]
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id is not None]
+        if not chat_ids or len(self) <= 1:
+            return primary
+        candidates = []
+        for member in self.members:
+            if member.alive and all([await self._can_access(member, chat_id) for chat_id in chat_ids]):
+                candidates.append(member)
+        if not candidates:
+            return primary
+        healthy = [m for m in candidates if not m.flood_limited] or candidates
+        # Least loaded first; the primary wins ties since it is listed first
+        return min(healthy, key=lambda m: m.load)
+
+    @asynccontextmanager
+    async def lease(self, *chat_ids):
+        """Leases a client for the duration of a job: ``async with pool.lease(chat_id) as client``."""
+        member = await self.pick(*chat_ids)
+        member.load += 1
+        try:
+            yield member.client
+        finally:
+            member.load -= 1
+
+    def status(self) -> list:
+        return [
+            {
+                "name": m.client.name,
+                "alive": m.alive,
+                "load": m.load,
+                "flood_limited": m.flood_limited,
+            }
+            for m in self.members
+        ]
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from config import PyroConf
+from logger import LOGGER
+
+
+class Database:
+    """Shared SQLite connection (WAL mode) for the bot's local state.
+
+    Queries are short and run on the caller's thread; a lock serialises access because the
+    connection is shared between the event loop and helper threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        LOGGER(__name__).info(f"Opened database {path}")
+
+    def execute(self, sql: str, params=()) -> list:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def executemany(self, sql: str, seq_of_params):
+        with self.lock:
+            self.conn.executemany(sql, seq_of_params)
+
+    def executescript(self, script: str):
+        with self.lock:
+            self.conn.executescript(script)
+
+    @contextmanager
+    def transaction(self):
+        """Groups several writes into one commit."""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_db: Optional[Database] = None
+
+
+def get_db() -> Database:
+    global _db
+    if _db is None:
+        _db = Database(PyroConf.DATABASE_PATH)
+    return _db
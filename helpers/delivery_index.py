@@ -0,0 +1,100 @@
+from time import time
+from typing import Iterable, Optional
+
+from config import PyroConf
+from helpers.database import Database, get_db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS delivered_messages (
+    source_chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    destination INTEGER NOT NULL,
+    delivered_id INTEGER,
+    media_group_id TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (source_chat_id, destination, message_id)
+);
+"""
+
+# Stays well under SQLite's limit on bound parameters per statement
+MAX_PARAMS_PER_QUERY = 500
+
+
+def _chunks(values: list, size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class DeliveryIndex:
+    """Remembers which source messages were delivered to which destination chat.
+
+    Keys are ``(source chat, message ID, destination)``. Album members are recorded one by one, so
+    items left out of an album (by a /dl filter or a failed download) are still sent by a later
+    run; album rows also carry their ``media_group_id``. The range engine asks for a whole batch at
+    once (``delivered_ids`` / ``delivered_messages``) so re-running an overlapping range only
+    transfers the messages that are new.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.db.executescript(SCHEMA)
+
+    def delivered_ids(self, source_chat_id: int, message_ids: Iterable[int], destinations: list,
+                      albums: bool = True) -> set:
+        """IDs among ``message_ids`` already delivered to every destination (album members left out
+        with ``albums=False``)."""
+        message_ids, destinations = list(message_ids), list(dict.fromkeys(destinations))
+        if not message_ids or not destinations:
+            return set()
+        found = set()
+        for ids in _chunks(message_ids, MAX_PARAMS_PER_QUERY - len(destinations)):
+            rows = self.db.execute(
+                f"SELECT message_id FROM delivered_messages WHERE source_chat_id = ? "
+                f"AND destination IN ({', '.join('?' * len(destinations))}) "
+                f"AND message_id IN ({', '.join('?' * len(ids))}) "
+                f"{'' if albums else 'AND media_group_id IS NULL '}"
+                f"GROUP BY message_id HAVING COUNT(DISTINCT destination) = ?",
+                (source_chat_id, *destinations, *ids, len(destinations)),
+            )
+            found.update(row["message_id"] for row in rows)
+        return found
+
+    def delivered_messages(self, messages: list, destinations: list) -> set:
+        """IDs of fetched messages already delivered to every destination."""
+        destinations = list(dict.fromkeys(destinations))
+        if not messages or not destinations:
+            return set()
+        found = set()
+        by_chat = {}
+        for msg in messages:
+            by_chat.setdefault(msg.chat.id, []).append(msg.id)
+        for source_chat_id, message_ids in by_chat.items():
+            found |= self.delivered_ids(source_chat_id, message_ids, destinations)
+        return found
+
+    def record(self, deliveries: list, destination: int):
+        """Stores the delivery of ``(source, sent)`` message pairs to ``destination``."""
+        if not deliveries:
+            return
+        now = time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO delivered_messages "
+            "(source_chat_id, message_id, destination, delivered_id, media_group_id, created) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (msg.chat.id, msg.id, destination, getattr(sent, "id", None), msg.media_group_id, now)
+                for msg, sent in deliveries
+            ],
+        )
+
+
+_index: Optional[DeliveryIndex] = None
+
+
+def get_delivery_index() -> Optional[DeliveryIndex]:
+    """Returns the shared index, or None when DELIVERY_INDEX is disabled."""
+    global _index
+    if not PyroConf.DELIVERY_INDEX:
+        return None
+    if _index is None:
+        _index = DeliveryIndex(get_db())
+    return _index
@@ -0,0 +1,99 @@
+from time import time
+from typing import Optional
+
+from config import PyroConf
+from logger import LOGGER
+from helpers.database import Database, get_db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_cache (
+    bot_id INTEGER NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    media_type TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (bot_id, file_unique_id)
+);
+CREATE INDEX IF NOT EXISTS idx_file_cache_last_used ON file_cache (last_used);
+"""
+
+# Run eviction after this many inserts rather than on every one
+EVICT_EVERY = 100
+
+
+class FileIdCache:
+    """Maps a source file's ``file_unique_id`` to the ``file_id`` a bot got back after uploading it.
+
+    file_ids are only valid for the bot that produced them, so entries are keyed per bot.
+    Entries expire ``ttl`` seconds after being stored and the least recently used ones are
+    dropped once the cache holds more than ``max_entries``.
+    """
+
+    def __init__(self, db: Database, max_entries: int, ttl: float):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._puts = 0
+        self.db.executescript(SCHEMA)
+        self.evict()
+
+    def get(self, bot_id: int, file_unique_id: str) -> Optional[str]:
+        rows = self.db.execute(
+            "SELECT file_id, created FROM file_cache WHERE bot_id = ? AND file_unique_id = ?",
+            (bot_id, file_unique_id),
+        )
+        if not rows:
+            return None
+        now = time()
+        if self.ttl and rows[0]["created"] < now - self.ttl:
+            self.invalidate(bot_id, file_unique_id)
+            return None
+        self.db.execute(
+            "UPDATE file_cache SET last_used = ? WHERE bot_id = ? AND file_unique_id = ?",
+            (now, bot_id, file_unique_id),
+        )
+        return rows[0]["file_id"]
+
+    def put(self, bot_id: int, file_unique_id: str, file_id: str, media_type: str = None):
+        now = time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO file_cache (bot_id, file_unique_id, file_id, media_type, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (bot_id, file_unique_id, file_id, media_type, now, now),
+        )
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 0:
+            self.evict()
+
+    def invalidate(self, bot_id: int, file_unique_id: str):
+        self.db.execute(
+            "DELETE FROM file_cache WHERE bot_id = ? AND file_unique_id = ?",
+            (bot_id, file_unique_id),
+        )
+
+    def evict(self):
+        with self.db.transaction():
+            if self.ttl:
+                self.db.execute("DELETE FROM file_cache WHERE created < ?", (time() - self.ttl,))
+            count = self.db.execute("SELECT COUNT(*) AS n FROM file_cache")[0]["n"]
+            if self.max_entries and count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM file_cache WHERE rowid IN "
+                    "(SELECT rowid FROM file_cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                LOGGER(__name__).info(f"Evicted {count - self.max_entries} least recently used file cache entries")
+
+
+_cache: Optional[FileIdCache] = None
+
+
+def get_file_cache() -> Optional[FileIdCache]:
+    """Returns the shared cache, or None when FILE_CACHE is disabled."""
+    global _cache
+    if not PyroConf.FILE_CACHE:
+        return None
+    if _cache is None:
+        _cache = FileIdCache(get_db(), PyroConf.FILE_CACHE_MAX_ENTRIES, PyroConf.FILE_CACHE_TTL_DAYS * 86400)
+    return _cache
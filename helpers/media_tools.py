@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+from asyncio.subprocess import PIPE
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import PyroConf
+from logger import LOGGER
+
+
+class MediaToolsError(Exception):
+    """An ffprobe/ffmpeg call failed or timed out."""
+
+
+def parse_probe(data: dict) -> tuple:
+    """Reduces ffprobe's JSON to ``(duration, artist, title, width, height)``."""
+    format_info = data.get("format", {})
+    duration = round(float(format_info.get("duration") or 0))
+    tags = {key.lower(): value for key, value in format_info.get("tags", {}).items()}
+    video_stream = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), {})
+    return duration, tags.get("artist"), tags.get("title"), video_stream.get("width"), video_stream.get("height")
+
+
+class MediaToolsExecutor:
+    """Runs ffprobe/ffmpeg with at most ``max_concurrent`` processes at a time.
+
+    Further calls wait their turn in order, and every call is killed after its timeout so a
+    broken file cannot hold a slot forever.
+    """
+
+    def __init__(self, max_concurrent: int, timeout: float):
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self.timeout = timeout
+        self.running = 0
+        self.queued = 0
+
+    async def _exec(self, cmd: list, timeout: float) -> bytes:
+        try:
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
+        except FileNotFoundError:
+            raise MediaToolsError(f"{cmd[0]} not found. Ensure ffmpeg is installed.")
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise MediaToolsError(f"{cmd[0]} timed out after {timeout}s")
+        if proc.returncode != 0:
+            raise MediaToolsError(f"{cmd[0]} exited with {proc.returncode}: {stderr.decode(errors='ignore').strip()}")
+        return stdout
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for a free process slot (in arrival order) and holds it."""
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    async def run(self, *cmds: list, timeout: Optional[float] = None) -> list:
+        """Runs the commands one after another in a single slot and returns their stdout."""
+        async with self.slot():
+            return [await self._exec(cmd, timeout or self.timeout) for cmd in cmds]
+
+    @staticmethod
+    def _probe_cmd(path: str) -> list:
+        return ["ffprobe", "-hide_banner", "-loglevel", "error", "-print_format", "json",
+                "-show_format", "-show_streams", path]
+
+    @staticmethod
+    def _thumbnail_cmd(path: str, output: str, duration: float) -> list:
+        return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{max(1, duration // 2)}", "-i", path,
+                "-vf", "thumbnail,scale=320:-1", "-q:v", "2", "-frames:v", "1", output]
+
+    async def probe(self, path: str, timeout: Optional[float] = None) -> dict:
+        (stdout,) = await self.run(self._probe_cmd(path), timeout=timeout)
+        return json.loads(stdout or b"{}")
+
+    async def thumbnail(self, path: str, output: str, duration: float, timeout: Optional[float] = None) -> str:
+        await self.run(self._thumbnail_cmd(path, output, duration), timeout=timeout)
+        if not os.path.exists(output):
+            raise MediaToolsError(f"ffmpeg wrote no thumbnail for {path}")
+        return output
+
+    async def probe_with_thumbnail(self, path: str, output: str, timeout: Optional[float] = None) -> tuple:
+        """Probes a video and grabs a thumbnail at its midpoint in one queue slot.
+
+        Returns ``(probe_data, thumbnail_path or None)``; the frame grab reuses the probed duration.
+        """
+        async with self.slot():
+            data = json.loads(await self._exec(self._probe_cmd(path), timeout or self.timeout) or b"{}")
+            duration = parse_probe(data)[0] or 3
+            try:
+                await self._exec(self._thumbnail_cmd(path, output, duration), timeout or self.timeout)
+            except MediaToolsError as e:
+                LOGGER(__name__).error(f"Could not extract thumbnail for {path}: {e}")
+            return data, output if os.path.exists(output) else None
+
+
+media_tools = MediaToolsExecutor(PyroConf.MEDIA_TOOLS_CONCURRENCY, PyroConf.MEDIA_TOOLS_TIMEOUT)
@@ -0,0 +1,166 @@
+import json
+import re
+from typing import Optional
+
+from pyrogram.enums import MessageMediaType
+from pyrogram.types import Message
+
+# Kinds accepted by --only: "text" plus every media type (photo, video, document, audio, voice, ...)
+KINDS = {"text"} | {media_type.value for media_type in MessageMediaType if media_type != MessageMediaType.WEB_PAGE_PREVIEW}
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+# Options taking a value; --skip-text is a plain flag
+VALUE_OPTIONS = ("--only", "--min-size", "--max-size", "--caption", "--exclude-caption")
+
+
+def parse_size(value: str) -> int:
+    """Bytes of a size such as ``500K``, ``20MB`` or ``1.5G`` (plain numbers are bytes)."""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", value)
+    if not match or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def message_kind(msg: Message) -> Optional[str]:
+    """``text`` for text messages (link previews included), else the media type's value."""
+    if msg.media and msg.media != MessageMediaType.WEB_PAGE_PREVIEW:
+        return msg.media.value
+    return "text" if msg.text else None
+
+
+class MessageFilter:
+    """Which source messages a /dl job delivers, decided from message metadata alone.
+
+    ``only`` limits the kinds (``text``, ``photo``, ``video``, ...), ``min_size``/``max_size``
+    bound media file sizes (a minimum also drops text), ``skip_text`` drops messages without
+    media, and ``caption``/``exclude_caption`` are case-insensitive regexes searched in the
+    caption or text. Albums are filtered item by item on kind and size, and as a whole on their
+    caption.
+    """
+
+    def __init__(self, only: Optional[set] = None, min_size: int = 0, max_size: int = 0, skip_text: bool = False,
+                 caption: Optional[str] = None, exclude_caption: Optional[str] = None):
+        self.only = set(only) if only else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.skip_text = skip_text
+        self.caption = caption
+        self.exclude_caption = exclude_caption
+        self._caption_re = re.compile(caption, re.IGNORECASE) if caption else None
+        self._exclude_re = re.compile(exclude_caption, re.IGNORECASE) if exclude_caption else None
+
+    @classmethod
+    def parse(cls, args: list) -> tuple:
+        """Takes the filter options out of /dl arguments; returns ``(filter or None, other args)``.
+
+        Options are ``--only kind[,kind...]``, ``--min-size SIZE``, ``--max-size SIZE``,
+        ``--skip-text``, ``--caption REGEX`` and ``--exclude-caption REGEX`` (also as
+        ``--option=value``). Raises ValueError on bad options.
+        """
+        options, remaining = {}, []
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if not arg.startswith("--"):
+                remaining.append(arg)
+                continue
+            name, has_value, value = arg.partition("=")
+            if name == "--skip-text" and not has_value:
+                options[name] = True
+                continue
+            if name not in VALUE_OPTIONS:
+                raise ValueError(f"Unknown option {name}")
+            if not has_value:
+                if not args:
+                    raise ValueError(f"{name} needs a value")
+                value = args.pop(0)
+            options[name] = value
+
+        if not options:
+            return None, remaining
+        only = None
+        if "--only" in options:
+            only = {kind.strip().lower() for kind in options["--only"].split(",") if kind.strip()}
+            unknown = only - KINDS
+            if unknown:
+                raise ValueError(f"Unknown kind(s) {', '.join(sorted(unknown))}; use {', '.join(sorted(KINDS))}")
+        for name in ("--caption", "--exclude-caption"):
+            if name in options:
+                try:
+                    re.compile(options[name])
+                except re.error as e:
+                    raise ValueError(f"Invalid {name} regex: {e}") from e
+        message_filter = cls(
+            only=only,
+            min_size=parse_size(options["--min-size"]) if "--min-size" in options else 0,
+            max_size=parse_size(options["--max-size"]) if "--max-size" in options else 0,
+            skip_text=options.get("--skip-text", False),
+            caption=options.get("--caption"),
+            exclude_caption=options.get("--exclude-caption"),
+        )
+        if message_filter.max_size and message_filter.min_size > message_filter.max_size:
+            raise ValueError("--min-size is larger than --max-size")
+        return message_filter, remaining
+
+    @property
+    def selects_items(self) -> bool:
+        """True when albums may lose some of their items (kind or size limits)."""
+        return bool(self.only or self.min_size or self.max_size)
+
+    def _item_matches(self, msg: Message) -> bool:
+        kind = message_kind(msg)
+        if kind is None:
+            return True  # Service messages etc. are handled (skipped) downstream as before
+        if kind == "text":
+            # Text has no file, so it can't reach a minimum size
+            return not self.skip_text and not self.min_size and (not self.only or "text" in self.only)
+        if self.only and kind not in self.only:
+            return False
+        size = getattr(getattr(msg, kind, None), "file_size", None) or 0
+        if self.min_size and size < self.min_size:
+            return False
+        return not (self.max_size and size > self.max_size)
+
+    def _caption_matches(self, text: str) -> bool:
+        if self._caption_re and not self._caption_re.search(text):
+            return False
+        return not (self._exclude_re and self._exclude_re.search(text))
+
+    def matches(self, msg: Message) -> bool:
+        return self._item_matches(msg) and self._caption_matches(msg.caption or msg.text or "")
+
+    def filter_album(self, members: list) -> list:
+        """The album items to deliver: none when the album caption is filtered out."""
+        caption = next((m.caption for m in members if m.caption), "")
+        if not self._caption_matches(caption):
+            return []
+        return [m for m in members if self._item_matches(m)]
+
+    def describe(self) -> str:
+        parts = []
+        if self.only:
+            parts.append(f"only {','.join(sorted(self.only))}")
+        if self.min_size:
+            parts.append(f">= {self.min_size / 1024 ** 2:g} MB")
+        if self.max_size:
+            parts.append(f"<= {self.max_size / 1024 ** 2:g} MB")
+        if self.skip_text:
+            parts.append("no text")
+        if self.caption:
+            parts.append(f"caption ~ {self.caption}")
+        if self.exclude_caption:
+            parts.append(f"caption !~ {self.exclude_caption}")
+        return ", ".join(parts)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "only": sorted(self.only) if self.only else None,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "skip_text": self.skip_text,
+            "caption": self.caption,
+            "exclude_caption": self.exclude_caption,
+        })
+
+    @classmethod
+    def from_json(cls, value: Optional[str]) -> Optional["MessageFilter"]:
+        return cls(**json.loads(value)) if value else None
@@ -0,0 +1,161 @@
+import threading
+from bisect import bisect_left
+
+# Upper bounds (seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base of the metrics below: a name, help text and label names, safe to use from any thread."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def samples(self) -> list:
+        """``(suffix, labels_text, value)`` lines of the exposition."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{suffix}{labels} {value}" for suffix, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self, **labels) -> float:
+        """Sum over every series matching the given labels."""
+        wanted = [(self.labels.index(name), value) for name, value in labels.items()]
+        with self._lock:
+            return sum(value for key, value in self.values.items() if all(key[i] == v for i, v in wanted))
+
+    def samples(self) -> list:
+        with self._lock:
+            return [("", _format_labels(self.labels, key), value) for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, series in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    samples.append(("_bucket", _format_labels(self.labels, key, f'le="{bound}"'), cumulative))
+                samples.append(("_bucket", _format_labels(self.labels, key, 'le="+Inf"'), series[-1]))
+                samples.append(("_sum", _format_labels(self.labels, key), round(series[-2], 6)))
+                samples.append(("_count", _format_labels(self.labels, key), series[-1]))
+        return samples
+
+
+class Gauge(Metric):
+    """A value read when the metrics are scraped; ``read`` returns a number or ``{labels tuple: number}``."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, read, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self.read = read
+
+    def samples(self) -> list:
+        value = self.read()
+        if isinstance(value, dict):
+            return [("", _format_labels(self.labels, key if isinstance(key, tuple) else (key,)), v)
+                    for key, v in value.items()]
+        return [("", "", value)]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        parts = []
+        for metric in self.metrics:
+            try:
+                parts.append(metric.render())
+            except Exception as e:
+                # A broken gauge must not take the whole scrape down
+                parts.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+
+messages_processed = registry.register(Counter(
+    "fwdbot_messages_total", "Source messages processed, by kind and outcome", ("kind", "outcome")))
+message_seconds = registry.register(Histogram(
+    "fwdbot_message_seconds", "Time spent processing one source message", ("kind",)))
+delivery_paths = registry.register(Counter(
+    "fwdbot_delivery_paths_total", "How media reached its destination", ("path",)))
+album_items = registry.register(Counter(
+    "fwdbot_album_items_total", "Media group items by outcome", ("outcome",)))
+album_seconds = registry.register(Histogram(
+    "fwdbot_album_seconds", "Media group time per phase", ("phase",)))
+range_stage_seconds = registry.register(Histogram(
+    "fwdbot_range_stage_seconds", "Range job time per stage and message", ("stage",)))
+transfer_bytes = registry.register(Counter(
+    "fwdbot_transfer_bytes_total", "Bytes downloaded and uploaded", ("direction", "mode")))
+transfer_seconds = registry.register(Histogram(
+    "fwdbot_transfer_seconds", "Duration of whole file transfers", ("direction", "mode")))
+api_seconds = registry.register(Histogram(
+    "fwdbot_api_request_seconds", "Latency of Telegram API calls", ("method",),
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+flood_waits = registry.register(Counter(
+    "fwdbot_flood_waits_total", "FloodWaits received", ("client", "method")))
+flood_wait_seconds = registry.register(Counter(
+    "fwdbot_flood_wait_seconds_total", "Seconds of FloodWait requested by Telegram", ("client", "method")))
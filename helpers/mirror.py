@@ -0,0 +1,100 @@
+from time import time
+from typing import Optional
+
+from logger import LOGGER
+from helpers.database import Database, get_db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrors (
+    mirror_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    source_chat TEXT NOT NULL,
+    destination INTEGER NOT NULL,
+    start_id INTEGER NOT NULL,
+    high_water INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    last_sync REAL,
+    last_backfill REAL,
+    last_error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mirrors_status ON mirrors (status);
+"""
+
+ACTIVE = "active"
+STOPPED = "stopped"
+
+
+class MirrorStore:
+    """Mirrors of a source chat into a destination chat, kept across restarts.
+
+    ``high_water`` is the highest source message ID already handed to a sync; each poll only
+    syncs the IDs above it. ``start_id`` is the first ID the mirror covers, which bounds backfills.
+    Source chats are stored as text because public chats are referenced by username (see
+    ``checkpoint.parse_chat_id``).
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.db.executescript(SCHEMA)
+
+    def create(self, user_id: int, source_chat, destination: int, high_water: int) -> int:
+        now = time()
+        with self.db.transaction():
+            self.db.execute(
+                "INSERT INTO mirrors (user_id, source_chat, destination, start_id, high_water, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, str(source_chat), destination, high_water + 1, high_water, ACTIVE, now, now),
+            )
+            mirror_id = self.db.execute("SELECT last_insert_rowid() AS id")[0]["id"]
+        LOGGER(__name__).info(f"Created mirror {mirror_id} for user {user_id}: {source_chat} -> {destination} after {high_water}")
+        return mirror_id
+
+    def get(self, mirror_id: int):
+        rows = self.db.execute("SELECT * FROM mirrors WHERE mirror_id = ?", (mirror_id,))
+        return rows[0] if rows else None
+
+    def find_active(self, source_chat, destination: int):
+        rows = self.db.execute(
+            "SELECT * FROM mirrors WHERE source_chat = ? AND destination = ? AND status = ?",
+            (str(source_chat), destination, ACTIVE),
+        )
+        return rows[0] if rows else None
+
+    def active(self) -> list:
+        return self.db.execute("SELECT * FROM mirrors WHERE status = ? ORDER BY mirror_id", (ACTIVE,))
+
+    def for_user(self, user_id: int) -> list:
+        return self.db.execute("SELECT * FROM mirrors WHERE user_id = ? AND status = ? ORDER BY mirror_id",
+                               (user_id, ACTIVE))
+
+    def advance(self, mirror_id: int, high_water: int):
+        """Raises the high-water mark (never lowers it) and records a successful sync."""
+        self.db.execute(
+            "UPDATE mirrors SET high_water = MAX(high_water, ?), last_sync = ?, last_error = NULL, updated = ? "
+            "WHERE mirror_id = ?",
+            (high_water, time(), time(), mirror_id),
+        )
+
+    def set_error(self, mirror_id: int, error: str):
+        self.db.execute("UPDATE mirrors SET last_error = ?, updated = ? WHERE mirror_id = ?",
+                        (error[:500], time(), mirror_id))
+
+    def set_backfilled(self, mirror_id: int):
+        self.db.execute("UPDATE mirrors SET last_backfill = ?, updated = ? WHERE mirror_id = ?",
+                        (time(), time(), mirror_id))
+
+    def stop(self, mirror_id: int):
+        self.db.execute("UPDATE mirrors SET status = ?, updated = ? WHERE mirror_id = ?", (STOPPED, time(), mirror_id))
+        LOGGER(__name__).info(f"Stopped mirror {mirror_id}")
+
+
+_store: Optional[MirrorStore] = None
+
+
+def get_mirror_store() -> MirrorStore:
+    global _store
+    if _store is None:
+        _store = MirrorStore(get_db())
+    return _store
@@ -0,0 +1,112 @@
+import asyncio
+import inspect
+import math
+import os
+from time import monotonic
+
+from pyrogram.types import Message
+
+from config import PyroConf
+from logger import LOGGER
+from helpers.spool import spool
+from helpers import metrics
+
+# Unit of stream_media offsets/limits
+CHUNK_SIZE = 1024 * 1024
+
+
+def _file_name(message: Message, media) -> str:
+    if getattr(media, "file_name", None):
+        return os.path.basename(media.file_name)
+    extension = ".jpg" if message.photo else ".mp4" if message.video else ".mp3" if message.audio else ".bin"
+    return f"{message.media.value}_{message.chat.id}_{message.id}{extension}"
+
+
+async def download_parallel(message: Message, directory: str, progress=None, progress_args: tuple = (),
+                            connections: int = None) -> str:
+    """Downloads a message's media into ``directory`` over several connections at once and returns the file path.
+
+    The file is split into ``connections`` ranges of 1 MiB chunks. Each range is fetched with
+    its own ``stream_media`` call (one media-DC connection each) and written at its offset
+    into a preallocated file. ``progress`` gets the same ``(current, total, *progress_args)``
+    calls as with ``Message.download``.
+    """
+    client = message._client
+    media = getattr(message, message.media.value)
+    file_size = media.file_size
+    total_chunks = math.ceil(file_size / CHUNK_SIZE)
+    connections = max(1, min(connections or PyroConf.DOWNLOAD_CONNECTIONS, total_chunks))
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, _file_name(message, media)))
+    temp_path = path + ".temp"
+
+    per_range = math.ceil(total_chunks / connections)
+    ranges = [(start, min(per_range, total_chunks - start)) for start in range(0, total_chunks, per_range)]
+    downloaded = 0
+
+    async def fetch(file, start_chunk: int, chunk_count: int):
+        nonlocal downloaded
+        position = start_chunk * CHUNK_SIZE
+        async for chunk in client.stream_media(message, offset=start_chunk, limit=chunk_count):
+            # No await between seek and write, so ranges never interleave on the shared handle
+            file.seek(position)
+            file.write(chunk)
+            position += len(chunk)
+            downloaded += len(chunk)
+            if progress:
+                result = progress(downloaded, file_size, *progress_args)
+                if inspect.isawaitable(result):
+                    await result
+
+    try:
+        with open(temp_path, "wb") as file:
+            file.truncate(file_size)
+            tasks = [asyncio.create_task(fetch(file, start, count)) for start, count in ranges]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        if downloaded != file_size:
+            raise ValueError(f"Downloaded {downloaded} of {file_size} bytes")
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    LOGGER(__name__).info(f"Downloaded {path} ({file_size} bytes) over {len(ranges)} connections",
+                          extra={"bytes": file_size})
+    return path
+
+
+async def download_message(message: Message, progress=None, progress_args: tuple = (), owner=None,
+                           ahead: bool = False) -> str:
+    """``Message.download`` into reserved spool space, with parallel ranges for files of
+    ``PARALLEL_DOWNLOAD_THRESHOLD_MB`` and up.
+
+    Waits while the spool is full, except when the ``owner`` job already holds spool space and
+    this is not a download ``ahead`` of its uploads (see ``SpoolManager``). Pass the returned
+    path to ``spool.release`` (``remove_file`` does) once the file is no longer needed.
+    """
+    file_size = getattr(getattr(message, message.media.value, None), "file_size", 0) or 0
+    reservation = await spool.reserve(file_size, owner, ahead)
+    started = monotonic()
+    mode = "single"
+    try:
+        if PyroConf.DOWNLOAD_CONNECTIONS > 1 and file_size >= PyroConf.PARALLEL_DOWNLOAD_THRESHOLD_MB * 1024 * 1024:
+            mode = "parallel"
+            path = await download_parallel(message, reservation.directory, progress, progress_args)
+        else:
+            path = await message.download(file_name=reservation.directory + os.sep, progress=progress,
+                                          progress_args=progress_args)
+        if not path:
+            raise ValueError(f"Download of message {message.id} returned no file")
+    except BaseException:
+        spool.cancel(reservation)
+        raise
+    metrics.transfer_bytes.inc(os.path.getsize(path), direction="download", mode=mode)
+    metrics.transfer_seconds.observe(monotonic() - started, direction="download", mode=mode)
+    return path
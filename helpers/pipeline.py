@@ -0,0 +1,110 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from logger import LOGGER
+
+_DONE = object()  # Sentinel marking the end of the source
+
+
+class OrderedPipeline:
+    """Overlaps a concurrent prepare stage (e.g. downloads) with an in-order consumer (e.g. uploads).
+
+    Items are pulled from ``source`` and handed to ``workers`` concurrent ``prepare`` calls.
+    Iterating the pipeline yields ``(item, prepared)`` pairs strictly in source order, so the
+    consumer can deliver them in order while later items are still being prepared.
+
+    At most ``buffer_size`` items are in flight between the source and the consumer, which
+    bounds how many prepared results (downloaded files) can pile up ahead of the consumer.
+    Results that were prepared but never consumed (the consumer stopped early) are passed
+    to ``discard`` when the pipeline is closed.
+
+    An exception raised by the source or by ``prepare`` is re-raised to the consumer when it
+    reaches the corresponding position.
+    """
+
+    def __init__(self, source: AsyncIterator, prepare: Callable[..., Awaitable],
+                 workers: int = 1, buffer_size: int = 1,
+                 discard: Optional[Callable[..., None]] = None):
+        self.source = source
+        self.prepare = prepare
+        self.discard = discard
+        self.workers = max(1, workers)
+        self._order: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer_size))
+        self._work: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._feed()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work_loop()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Drop anything prepared ahead of the consumer
+        while not self._order.empty():
+            entry = self._order.get_nowait()
+            if entry is _DONE or isinstance(entry, Exception):
+                continue
+            _, future = entry
+            if future.done() and not future.cancelled() and future.exception() is None and self.discard:
+                try:
+                    self.discard(future.result())
+                except Exception as e:
+                    LOGGER(__name__).warning(f"Error discarding unconsumed pipeline result: {e}")
+            elif not future.done():
+                future.cancel()
+
+    async def _feed(self):
+        loop = asyncio.get_running_loop()
+        try:
+            async for item in self.source:
+                future = loop.create_future()
+                await self._order.put((item, future))
+                await self._work.put((item, future))
+            await self._order.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._order.put(e)
+
+    async def _work_loop(self):
+        while True:
+            item, future = await self._work.get()
+            if future.done():
+                continue
+            try:
+                result = await self.prepare(item)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                if future.cancelled() and self.discard:
+                    self.discard(result)
+                elif not future.done():
+                    future.set_result(result)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        entry = await self._order.get()
+        if entry is _DONE:
+            raise StopAsyncIteration
+        if isinstance(entry, Exception):
+            raise entry
+        item, future = entry
+        return item, await future
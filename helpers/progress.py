@@ -0,0 +1,122 @@
+import asyncio
+from time import monotonic
+
+from pyrogram.errors import FloodWait, MessageNotModified
+from pyrogram.types import Message
+
+from config import PyroConf
+from logger import LOGGER
+
+# Edit state of messages not touched for this long is forgotten
+STATE_TTL = 3600
+
+
+class ProgressReporter:
+    """Coalesces status/progress edits from every task and sends them at a global budget.
+
+    ``update`` only records the latest text for a message and returns at once; a single
+    background task edits messages at most every ``edit_interval`` seconds overall and every
+    ``message_interval`` seconds per message. Intermediate texts are dropped, and a FloodWait on
+    an edit pauses the reporter alone, never the transfer that reported progress.
+    """
+
+    def __init__(self, edit_interval: float, message_interval: float):
+        self.edit_interval = edit_interval
+        self.message_interval = message_interval
+        self.pending = {}  # (chat_id, message_id) -> (message, text)
+        self.last_edit = {}  # (chat_id, message_id) -> monotonic() of the last edit
+        self.last_text = {}
+        self.paused_until = 0.0
+        self.edits = 0
+        self.dropped = 0
+        self._wakeup = None
+        self._task = None
+
+    @staticmethod
+    def _key(message: Message) -> tuple:
+        return message.chat.id, message.id
+
+    def update(self, message: Message, text: str):
+        """Sets the text a message should show next; never waits. Call it from the event loop only."""
+        if message is None:
+            return
+        key = self._key(message)
+        if key in self.pending:
+            self.dropped += 1
+        elif self.last_text.get(key) == text:
+            return
+        self.pending[key] = (message, text)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def discard(self, message: Message):
+        """Drops queued edits of a message, e.g. before it is deleted or given its final text directly."""
+        if message is None:
+            return
+        key = self._key(message)
+        self.pending.pop(key, None)
+        self.last_edit.pop(key, None)
+        self.last_text.pop(key, None)
+
+    async def delete(self, message: Message):
+        """Deletes a status message together with its queued edits."""
+        self.discard(message)
+        await message.delete()
+
+    def _next_ready(self, now: float):
+        """Returns ``(key, seconds until it may be edited)`` for the pending message waiting longest."""
+        key = min(self.pending, key=lambda k: self.last_edit.get(k, 0.0))
+        return key, max(0.0, self.last_edit.get(key, 0.0) + self.message_interval - now)
+
+    def _prune(self, now: float):
+        for key in [k for k, t in self.last_edit.items() if now - t > STATE_TTL and k not in self.pending]:
+            self.last_edit.pop(key, None)
+            self.last_text.pop(key, None)
+
+    async def _wait(self, seconds: float):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                self._prune(monotonic())
+                await self._wait(STATE_TTL)
+                continue
+            now = monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            key, delay = self._next_ready(now)
+            if delay > 0:
+                await self._wait(delay)  # A new message may become ready sooner
+                continue
+
+            message, text = self.pending.pop(key)
+            self.last_edit[key] = now
+            try:
+                await message.edit(text)
+                self.last_text[key] = text
+                self.edits += 1
+            except MessageNotModified:
+                self.last_text[key] = text
+            except FloodWait as fw:
+                LOGGER(__name__).warning(f"FloodWait of {fw.value}s on progress edits, pausing them")
+                self.paused_until = monotonic() + fw.value
+                self.pending.setdefault(key, (message, text))
+            except Exception as e:
+                # Usually the message was deleted; stop tracking it
+                LOGGER(__name__).debug(f"Could not edit progress message {key}: {e}")
+                self.pending.pop(key, None)
+                self.last_edit.pop(key, None)
+                self.last_text.pop(key, None)
+            await asyncio.sleep(self.edit_interval)
+
+
+progress_reporter = ProgressReporter(PyroConf.PROGRESS_EDIT_INTERVAL, PyroConf.PROGRESS_MESSAGE_INTERVAL)
+
@@ -0,0 +1,211 @@
+import asyncio
+from typing import Optional
+
+from pyrogram import Client
+from pyrogram.types import Message
+from pyrogram.errors import FloodWait
+
+from config import PyroConf
+from logger import LOGGER
+
+# Telegram rejects messages.getMessages / channels.getMessages calls with more IDs than this
+MAX_IDS_PER_REQUEST = 200
+# Albums can't hold more items than this
+MAX_MEDIA_GROUP_SIZE = 10
+
+_DONE = object()  # Sentinel marking the end of the stream
+
+
+class RangePrefetcher:
+    """Fetches a message ID range in batches and streams the messages through a bounded queue.
+
+    Usage:
+        async with RangePrefetcher(user, chat_id, 100, 5000) as prefetcher:
+            async for chat_message in prefetcher:
+                ...
+
+    Empty (deleted or never existing) IDs are dropped in the fetch stage and only counted in
+    ``skipped``. A FloodWait raised while fetching is re-raised to the consumer. IDs of batches
+    that could not be fetched are counted in ``failed`` and handed out by ``pop_failed`` so the
+    consumer can journal them in order.
+
+    With a ``delivery_index``, messages already delivered to every one of ``destinations`` are
+    dropped batch by batch (counted in ``delivered``): their IDs are left out of the fetch when
+    the chat ID is numeric, and the fetched batch is checked once more. Albums are only dropped
+    once every member was delivered; a partly delivered album is handed out whole and the
+    delivery step sends the missing items.
+    Messages a ``message_filter`` rejects are dropped here too (counted in ``filtered``), so
+    they are never downloaded; albums keep only their matching items.
+
+    Members of a media group are collapsed into a single item (the first member) so the album
+    is processed once; the members fetched in the range are available from ``pop_album``. An
+    album with a member showing up after it was handed out is reported incomplete.
+    """
+
+    def __init__(self, client: Client, chat_id, start_id: int, end_id: int,
+                 batch_size: int = None, queue_size: int = None, delivery_index=None, destinations: list = (),
+                 message_filter=None):
+        self.client = client
+        self.chat_id = chat_id
+        self.start_id = start_id
+        self.end_id = end_id
+        self.batch_size = max(1, min(batch_size or PyroConf.FETCH_BATCH_SIZE, MAX_IDS_PER_REQUEST))
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or PyroConf.FETCH_QUEUE_SIZE)
+        self.skipped = 0  # Empty/deleted IDs
+        self.failed = 0  # IDs whose batch could not be fetched
+        self._failed_ids = []  # Those IDs, until popped
+        self.grouped = 0  # Album members folded into their album's first message
+        self.delivered = 0  # Messages skipped because they were delivered before
+        self.delivery_index = delivery_index if destinations else None
+        self.destinations = list(destinations)
+        self.message_filter = message_filter
+        self.filtered = 0  # Messages/album items rejected by the filter
+        self._delivered_members = set()  # Delivered album members, until their album is flushed
+        self._albums = {}  # media_group_id -> (members fetched in this range, complete), until popped
+        self._seen_groups = set()
+        self._held = []  # Units held back until the next batch (see _emit_batch)
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def fetch_batch(self, ids: list) -> list:
+        """Fetches one batch of IDs and returns the non-empty, undelivered messages in ID order."""
+        if self.delivery_index and isinstance(self.chat_id, int):
+            delivered = self.delivery_index.delivered_ids(self.chat_id, ids, self.destinations, albums=False)
+            self.delivered += len(delivered)
+            ids = [i for i in ids if i not in delivered]
+            if not ids:
+                return []
+        messages = await self.client.get_messages(chat_id=self.chat_id, message_ids=ids)
+        found = [msg for msg in messages if msg and not msg.empty]
+        self.skipped += len(ids) - len(found)
+        if self.delivery_index:
+            delivered = self.delivery_index.delivered_messages(found, self.destinations)
+            # Album members stay until the whole album is known (see _flush_album)
+            self._delivered_members.update(msg.id for msg in found if msg.media_group_id and msg.id in delivered)
+            delivered = {msg.id for msg in found if not msg.media_group_id and msg.id in delivered}
+            self.delivered += len(delivered)
+            found = [msg for msg in found if msg.id not in delivered]
+        return sorted(found, key=lambda m: m.id)
+
+    async def _run(self):
+        try:
+            for batch_start in range(self.start_id, self.end_id + 1, self.batch_size):
+                ids = list(range(batch_start, min(batch_start + self.batch_size, self.end_id + 1)))
+                try:
+                    messages = await self.fetch_batch(ids)
+                except FloodWait:
+                    raise
+                except Exception as e:
+                    LOGGER(__name__).error(f"Error fetching messages {ids[0]}-{ids[-1]} from {self.chat_id}: {e}")
+                    self.failed += len(ids)
+                    self._failed_ids.extend(ids)
+                    continue
+                LOGGER(__name__).info(f"Fetched {len(messages)}/{len(ids)} messages ({ids[0]}-{ids[-1]}) from {self.chat_id}")
+                await self._emit_batch(messages, ids[-1])
+            await self._emit_batch([], None)
+            await self.queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.put(e)
+
+    async def _emit_batch(self, messages: list, last_id: int):
+        # Album members are gathered across the whole batch, so members that aren't adjacent
+        # (other messages were posted in between) still end up in their album
+        units, self._held = self._held, []  # Messages and album member lists, in order of their first ID
+        albums = {unit[0].media_group_id: unit for unit in units if isinstance(unit, list)}
+        for msg in messages:
+            group_id = msg.media_group_id
+            if not group_id:
+                units.append(msg)
+            elif group_id in albums:
+                albums[group_id].append(msg)
+            elif group_id in self._seen_groups:
+                # Member of an album flushed with an earlier batch: have the album fetched whole
+                self.grouped += 1
+                self._delivered_members.discard(msg.id)
+                if group_id in self._albums:
+                    self._albums[group_id] = (self._albums[group_id][0], False)
+            else:
+                albums[group_id] = [msg]
+                units.append(albums[group_id])
+        # Albums near the end of the batch may go on in the next one, so they are held back
+        # (with everything after them, to keep the order) until that batch is fetched
+        if last_id is not None:
+            for i, unit in enumerate(units):
+                if isinstance(unit, list) and unit[-1].id > last_id - MAX_MEDIA_GROUP_SIZE:
+                    units, self._held = units[:i], units[i:]
+                    break
+        for unit in units:
+            if isinstance(unit, list):
+                await self._flush_album(unit)
+            elif self.message_filter and not self.message_filter.matches(unit):
+                self.filtered += 1
+            else:
+                await self.queue.put(unit)
+
+    async def _flush_album(self, members: list):
+        group_id = members[0].media_group_id
+        self._seen_groups.add(group_id)
+        # An album touching the range edges may have members outside it
+        complete = len(members) >= MAX_MEDIA_GROUP_SIZE or (members[0].id > self.start_id and members[-1].id < self.end_id)
+        delivered = self._delivered_members & {m.id for m in members}
+        self._delivered_members -= delivered
+        if self.message_filter:
+            kept = self.message_filter.filter_album(members)
+            self.filtered += len(members) - len(kept)
+            if not kept:
+                return
+            members = kept
+        if delivered.issuperset(m.id for m in members):
+            self.delivered += len(members)
+            return
+        self.grouped += len(members) - 1
+        self._albums[group_id] = (members, complete)
+        await self.queue.put(members[0])
+
+    def pop_failed(self, before_id: Optional[int] = None) -> list:
+        """Returns the IDs of failed batches below ``before_id`` (all of them when None) and forgets them."""
+        if before_id is None:
+            ids, self._failed_ids = self._failed_ids, []
+        else:
+            ids = [i for i in self._failed_ids if i < before_id]
+            self._failed_ids = self._failed_ids[len(ids):]
+        return ids
+
+    def pop_album(self, media_group_id) -> tuple:
+        """Returns ``(members, complete)`` for an album handed out by this prefetcher.
+
+        ``members`` are the album messages fetched in this range. When ``complete`` is False the
+        album may have members outside the range and should be fetched whole.
+        """
+        return self._albums.pop(media_group_id, ([], False))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Message:
+        item = await self.queue.get()
+        if item is _DONE:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
@@ -0,0 +1,122 @@
+import asyncio
+from time import monotonic
+from typing import Optional
+
+from pyrogram import raw
+
+from config import PyroConf
+
+# Additive increase per successful call (requests/second) and multiplicative decrease per FloodWait
+INCREASE_STEP = 0.02
+DECREASE_FACTOR = 0.5
+# Learned rates may grow up to this multiple of the configured starting rate
+MAX_RATE_FACTOR = 3.0
+MIN_RATE = 0.05
+
+
+# Raw functions grouped into the method classes that Telegram rate-limits separately
+METHOD_CLASSES = {
+    raw.functions.messages.GetMessages: "get_messages",
+    raw.functions.channels.GetMessages: "get_messages",
+    raw.functions.messages.GetHistory: "get_messages",
+    raw.functions.messages.SendMessage: "send",
+    raw.functions.messages.SendMedia: "send",
+    raw.functions.messages.SendMultiMedia: "send",
+    raw.functions.messages.ForwardMessages: "send",
+    raw.functions.messages.EditMessage: "edit",
+}
+
+
+def get_method_class(query) -> Optional[str]:
+    return METHOD_CLASSES.get(type(query))
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to FloodWaits (AIMD).
+
+    Every successful call nudges the rate up by ``INCREASE_STEP``; a FloodWait halves it and
+    pauses the bucket for the requested time, so every caller sharing it backs off together.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.max_rate = rate * MAX_RATE_FACTOR
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.paused_until = 0.0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    async def acquire(self):
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                now = monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+    def on_flood_wait(self, seconds: float):
+        self.flood_waits += 1
+        self.flood_wait_seconds += seconds
+        self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+        # No tokens accrue while paused, so callers resume at the reduced rate instead of bursting
+        resume_at = monotonic() + seconds
+        self.tokens = 0
+        self.updated = max(self.updated, resume_at)
+        self.paused_until = max(self.paused_until, resume_at)
+
+    @property
+    def paused_for(self) -> float:
+        return max(0.0, self.paused_until - monotonic())
+
+
+class RateLimiter:
+    """Shared token buckets per (client, method class)."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    @staticmethod
+    def initial_rate(method_class: str) -> float:
+        return {
+            "get_messages": PyroConf.RATE_GET_MESSAGES,
+            "send": PyroConf.RATE_SEND,
+            "edit": PyroConf.RATE_EDIT,
+        }.get(method_class, PyroConf.RATE_SEND)
+
+    def bucket(self, client_name: str, method_class: str) -> TokenBucket:
+        key = (client_name, method_class)
+        if key not in self.buckets:
+            rate = self.initial_rate(method_class)
+            self.buckets[key] = TokenBucket(rate, burst=max(1.0, rate * 2))
+        return self.buckets[key]
+
+    def snapshot(self) -> dict:
+        """Current learned rates, for status output."""
+        return {
+            key: {
+                "rate": bucket.rate,
+                "paused_for": bucket.paused_for,
+                "flood_waits": bucket.flood_waits,
+                "flood_wait_seconds": bucket.flood_wait_seconds,
+            }
+            for key, bucket in self.buckets.items()
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,205 @@
+import asyncio
+from collections import deque
+from itertools import count
+from time import time
+from typing import Awaitable, Callable, Optional
+
+from config import PyroConf
+from logger import LOGGER
+
+# Job kinds. Single-post jobs are short and jump ahead of bulk range jobs.
+SINGLE = "single"
+RANGE = "range"
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+# Seconds per message assumed for ETAs until real jobs have been timed
+DEFAULT_ITEM_SECONDS = 5.0
+# Weight of the latest finished job in the per-message time average
+EMA_WEIGHT = 0.3
+
+_job_ids = count(1)
+
+
+class Job:
+    """One queued or running /dl task.
+
+    ``cancel``/``flood_stop`` are the stop flags checked by the processing code, ``message`` is the
+    task's status message (edited on /cancel) and ``done``/``total`` track progress for ETAs.
+    """
+
+    def __init__(self, user_id: int, kind: str, description: str,
+                 runner: Callable[["Job"], Awaitable], total: int = 1):
+        self.id = next(_job_ids)
+        self.user_id = user_id
+        self.kind = kind
+        self.description = description
+        self.runner = runner
+        self.total = max(1, total)
+        self.done = 0
+        self.cancel = False
+        self.flood_stop = False
+        self.message = None
+        self.journal_id: Optional[int] = None  # Checkpoint journal entry of a range job, once created
+        self.resend = False  # Deliver messages the delivery index says were already sent
+        self.filter = None  # MessageFilter from the /dl options; None delivers everything
+        self.copy_failed = set()  # (bot id, source chat id) pairs whose server-side copies failed in this job
+        self.state = QUEUED
+        self.created = time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def priority(self) -> int:
+        return 0 if self.kind == SINGLE else 1
+
+
+class JobScheduler:
+    """Global job queue with per-user and global concurrency limits.
+
+    Users are served round-robin so one user's bulk ranges cannot starve everyone else, and
+    single-post jobs are dispatched before range jobs.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int, max_queued_per_user: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_user = max(1, max_per_user)
+        self.max_queued_per_user = max(1, max_queued_per_user)
+        self.queues = {}  # user_id -> deque of queued jobs
+        self.running = {}  # job id -> Job
+        self._rr = deque()  # Users with queued jobs, in round-robin order
+        self.item_seconds = DEFAULT_ITEM_SECONDS
+
+    # --- Submission and dispatch ---
+
+    def submit(self, job: Job) -> Job:
+        """Queues a job and starts it right away if there is capacity. Raises ValueError if the user's queue is full."""
+        queue = self.queues.setdefault(job.user_id, deque())
+        if len(queue) >= self.max_queued_per_user:
+            raise ValueError(f"You already have {len(queue)} queued jobs. Wait for them to start or use /cancel.")
+        queue.append(job)
+        if job.user_id not in self._rr:
+            self._rr.append(job.user_id)
+        LOGGER(__name__).info(f"Queued job {job.id} ({job.kind}) for user {job.user_id}: {job.description}")
+        self._dispatch()
+        return job
+
+    def _running_for(self, user_id: int) -> int:
+        return sum(1 for job in self.running.values() if job.user_id == user_id)
+
+    def _next_job(self) -> Optional[Job]:
+        for priority in (0, 1):
+            for user_id in list(self._rr):
+                if self._running_for(user_id) >= self.max_per_user:
+                    continue
+                queue = self.queues[user_id]
+                job = next((j for j in queue if j.priority == priority), None)
+                if job:
+                    queue.remove(job)
+                    # Served users go to the back of the rotation
+                    self._rr.remove(user_id)
+                    if queue:
+                        self._rr.append(user_id)
+                    else:
+                        del self.queues[user_id]
+                    return job
+        return None
+
+    def _dispatch(self):
+        while len(self.running) < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            job.state = RUNNING
+            job.started = time()
+            self.running[job.id] = job
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        LOGGER(__name__).info(f"Starting job {job.id} for user {job.user_id}")
+        try:
+            await job.runner(job)
+        except Exception as e:
+            LOGGER(__name__).error(f"Job {job.id} for user {job.user_id} failed: {e}", exc_info=True)
+        finally:
+            job.state = CANCELLED if job.cancel else FINISHED
+            job.finished = time()
+            self.running.pop(job.id, None)
+            self._record_duration(job)
+            self._dispatch()
+
+    def _record_duration(self, job: Job):
+        if job.cancel or not job.done:
+            return
+        per_item = (job.finished - job.started) / job.done
+        self.item_seconds = (1 - EMA_WEIGHT) * self.item_seconds + EMA_WEIGHT * per_item
+
+    # --- Cancellation ---
+
+    def cancel_user(self, user_id: int, job_id: Optional[int] = None) -> tuple:
+        """Drops the user's queued jobs and flags their running ones (or only ``job_id``).
+
+        Returns ``(dequeued, running_jobs_flagged)``.
+        """
+        dequeued = []
+        queue = self.queues.get(user_id)
+        if queue:
+            for job in [j for j in queue if job_id is None or j.id == job_id]:
+                queue.remove(job)
+                job.state = CANCELLED
+                job.cancel = True
+                dequeued.append(job)
+            if not queue:
+                del self.queues[user_id]
+                if user_id in self._rr:
+                    self._rr.remove(user_id)
+        flagged = []
+        for job in self.running.values():
+            if job.user_id == user_id and (job_id is None or job.id == job_id) and not job.cancel:
+                job.cancel = True
+                flagged.append(job)
+        return dequeued, flagged
+
+    # --- Inspection ---
+
+    def queued_order(self) -> list:
+        """Queued jobs in the order they are expected to start."""
+        order = []
+        for priority in (0, 1):
+            pending = {u: [j for j in self.queues[u] if j.priority == priority] for u in self._rr}
+            while any(pending.values()):
+                for user_id in self._rr:
+                    if pending[user_id]:
+                        order.append(pending[user_id].pop(0))
+        return order
+
+    def remaining_seconds(self, job: Job) -> float:
+        if job.state == RUNNING and job.done:
+            elapsed = time() - job.started
+            return elapsed / job.done * (job.total - job.done)
+        return (job.total - job.done) * self.item_seconds
+
+    def eta(self, job: Job) -> float:
+        """Estimated seconds until the job finishes."""
+        if job.state == RUNNING:
+            return self.remaining_seconds(job)
+        order = self.queued_order()
+        ahead = order[:order.index(job)] if job in order else order
+        backlog = sum(self.remaining_seconds(j) for j in ahead) + sum(self.remaining_seconds(j) for j in self.running.values())
+        return backlog / self.max_concurrent + self.remaining_seconds(job)
+
+    def position(self, job: Job) -> int:
+        """1-based place in the queue, or 0 once the job is running."""
+        order = self.queued_order()
+        return order.index(job) + 1 if job in order else 0
+
+    def jobs_for(self, user_id: int) -> list:
+        running = [j for j in self.running.values() if j.user_id == user_id]
+        return running + [j for j in self.queued_order() if j.user_id == user_id]
+
+
+scheduler = JobScheduler(PyroConf.MAX_CONCURRENT_JOBS, PyroConf.MAX_JOBS_PER_USER, PyroConf.MAX_QUEUED_PER_USER)
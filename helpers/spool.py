@@ -0,0 +1,197 @@
+import asyncio
+import os
+import shutil
+from itertools import count
+from time import monotonic
+from typing import Optional
+
+from config import PyroConf
+from logger import LOGGER
+
+MB = 1024 * 1024
+# Waiting reservations re-check free space this often, in case other processes freed some
+RECHECK_INTERVAL = 5
+
+
+class SpoolError(Exception):
+    """A download can never fit into the spool (bigger than the quota or the disk)."""
+
+
+class SpoolArea:
+    """A directory downloads are spooled to, with an optional byte quota (0 = free space only)."""
+
+    def __init__(self, root: str, quota: int, max_file_size: int = 0):
+        self.root = os.path.abspath(root)
+        self.quota = quota
+        self.max_file_size = max_file_size  # 0 = any size
+        self.reserved = 0
+
+    def accepts(self, size: int) -> bool:
+        return not self.max_file_size or size <= self.max_file_size
+
+    def fits(self, size: int, unwritten: int, ignore_quota: bool = False) -> bool:
+        if self.quota and not ignore_quota and self.reserved + size > self.quota:
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        free = shutil.disk_usage(self.root).free
+        # Space already promised to running downloads is not free any more
+        return free - unwritten - size >= PyroConf.SPOOL_MIN_FREE_MB * MB
+
+
+class Reservation:
+    """Bytes set aside for one download, in a directory of its own inside a spool area."""
+
+    def __init__(self, area: SpoolArea, directory: str, size: int, owner=None):
+        self.area = area
+        self.directory = directory
+        self.size = size
+        self.owner = owner  # Job the download belongs to, if known
+
+    def written(self) -> int:
+        try:
+            return sum(entry.stat().st_blocks * 512 for entry in os.scandir(self.directory) if entry.is_file())
+        except OSError:
+            return 0
+
+
+class SpoolManager:
+    """Hands out disk space for downloads before they start.
+
+    ``reserve(file_size)`` waits until the file fits both the area's quota and the disk's free space
+    (minus what running downloads still have to write and ``SPOOL_MIN_FREE_MB``), then returns a
+    Reservation whose directory the download goes into. ``release(path)`` deletes the file's
+    directory and frees the bytes. Small files go to the tmpfs area when one is configured and has
+    room. Everything left in the areas is swept at startup, since no download survives a restart.
+
+    A request whose ``owner`` (a job) already holds reservations never waits: those files are only
+    freed once the job itself moves on (an album being assembled, downloads queued ahead of an
+    in-order upload), so waiting would deadlock. It is placed over the quota if the disk has room,
+    or fails at once. Downloads made ``ahead`` of the job's upload are skippable and wait as usual.
+    Requests that could never fit the quota fail at once.
+    """
+
+    def __init__(self, areas: list):
+        self.areas = areas
+        self.reservations = {}  # directory -> Reservation
+        self._ids = count(1)
+        # Held by the request at the head of the queue; asyncio locks are FIFO, so a big download
+        # is not starved by smaller ones overtaking it (which could also stall in-order uploads)
+        self._queue = asyncio.Lock()
+        self._released = asyncio.Event()
+
+    def _unwritten(self, area: SpoolArea) -> int:
+        return sum(max(0, r.size - r.written()) for r in self.reservations.values() if r.area is area)
+
+    def _place(self, size: int, ignore_quota: bool = False) -> Optional[SpoolArea]:
+        for area in self.areas:
+            if area.accepts(size) and area.fits(size, self._unwritten(area), ignore_quota):
+                return area
+        return None
+
+    def _held_by(self, owner) -> int:
+        if owner is None:
+            return 0
+        return sum(r.size for r in self.reservations.values() if r.owner == owner)
+
+    def _check_possible(self, size: int):
+        """Raises SpoolError when waiting could never help."""
+        if not any(area.accepts(size) and (not area.quota or size <= area.quota) for area in self.areas):
+            raise SpoolError(f"File of {size // MB} MB exceeds SPOOL_QUOTA_MB")
+        if self.reservations:
+            return  # Running downloads will free space
+        raise SpoolError(f"Not enough disk space for a file of {size // MB} MB")
+
+    def _grant(self, area: SpoolArea, size: int, owner) -> Reservation:
+        directory = os.path.join(area.root, f"job_{next(self._ids)}")
+        os.makedirs(directory, exist_ok=True)
+        reservation = Reservation(area, directory, size, owner)
+        area.reserved += size
+        self.reservations[directory] = reservation
+        return reservation
+
+    async def reserve(self, size: int, owner=None, ahead: bool = False) -> Reservation:
+        size = max(0, size or 0)
+        held = 0 if ahead else self._held_by(owner)
+        if held:
+            # Not queued behind other requests either: they may be waiting for this job's files
+            area = self._place(size)
+            if not area:
+                self._check_possible(size)
+                area = self._place(size, ignore_quota=True)
+                if not area:
+                    raise SpoolError(f"Not enough disk space for {size // MB} MB while the job holds {held // MB} MB")
+                LOGGER(__name__).info(f"Spooling {size // MB} MB over the quota: the job already holds {held // MB} MB")
+            return self._grant(area, size, owner)
+
+        async with self._queue:
+            deadline = monotonic() + PyroConf.SPOOL_WAIT_MAX
+            area = self._place(size)
+            if not area:
+                self._check_possible(size)
+                LOGGER(__name__).info(f"Waiting for spool space for {size // MB} MB "
+                                      f"({len(self.reservations)} downloads hold {self.reserved() // MB} MB)")
+            while not area:
+                self._check_possible(size)
+                if monotonic() > deadline:
+                    raise SpoolError(f"No spool space for {size // MB} MB within {PyroConf.SPOOL_WAIT_MAX}s")
+                self._released.clear()
+                try:
+                    await asyncio.wait_for(self._released.wait(), RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                area = self._place(size)
+            return self._grant(area, size, owner)
+
+    def _free(self, reservation: Reservation):
+        if self.reservations.pop(reservation.directory, None) is None:
+            return
+        reservation.area.reserved -= reservation.size
+        shutil.rmtree(reservation.directory, ignore_errors=True)
+        self._released.set()
+
+    def cancel(self, reservation: Reservation):
+        """Frees a reservation whose download failed."""
+        self._free(reservation)
+
+    def release(self, path: Optional[str]):
+        """Frees the reservation a downloaded file belongs to; other paths are ignored."""
+        if path:
+            reservation = self.reservations.get(os.path.dirname(os.path.abspath(path)))
+            if reservation:
+                self._free(reservation)
+
+    def reserved(self) -> int:
+        return sum(area.reserved for area in self.areas)
+
+    def sweep(self):
+        """Removes files orphaned by a previous run (called at startup, before any download)."""
+        removed = 0
+        for area in self.areas:
+            if not os.path.isdir(area.root):
+                continue
+            for entry in os.scandir(area.root):
+                if entry.path in self.reservations:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        removed += sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(entry.path) for f in files)
+                        shutil.rmtree(entry.path)
+                    else:
+                        removed += entry.stat(follow_symlinks=False).st_size
+                        os.remove(entry.path)
+                except OSError as e:
+                    LOGGER(__name__).warning(f"Could not remove orphaned spool entry {entry.path}: {e}")
+        if removed:
+            LOGGER(__name__).info(f"Removed {removed / MB:.1f} MB of orphaned downloads")
+
+
+def _build_areas() -> list:
+    areas = []
+    if PyroConf.SPOOL_TMPFS_DIR:
+        areas.append(SpoolArea(PyroConf.SPOOL_TMPFS_DIR, PyroConf.SPOOL_TMPFS_QUOTA_MB * MB,
+                               PyroConf.SPOOL_TMPFS_MAX_FILE_MB * MB))
+    areas.append(SpoolArea(PyroConf.SPOOL_DIR, PyroConf.SPOOL_QUOTA_MB * MB))
+    return areas
+
+
+spool = SpoolManager(_build_areas())
@@ -0,0 +1,82 @@
+import asyncio
+import io
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from config import PyroConf
+from helpers.upload import PART_SIZE
+from helpers import metrics
+
+# stream_media yields 1 MiB chunks
+CHUNK_SIZE = 1024 * 1024
+
+
+class MediaStream(io.RawIOBase):
+    """File-like handle for a source message's media, uploaded while it is still downloading.
+
+    Pass it to ``send_video``/``send_audio``/``send_document`` of a ManagedClient in place of a
+    path: the client's ``save_file`` pulls the parts from ``client.stream_media`` instead of reading
+    a local file. At most ``buffer_chunks`` MiB wait in memory between the download and the upload.
+    """
+
+    def __init__(self, client: Client, message: Message, name: str, size: int, buffer_chunks: int = None):
+        super().__init__()
+        self.client = client
+        self.message = message
+        self.name = name
+        self.size = size
+        self.buffer_chunks = max(1, buffer_chunks or PyroConf.STREAM_BUFFER_MB)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer):
+        raise io.UnsupportedOperation("MediaStream is read asynchronously through iter_parts()")
+
+    async def iter_parts(self, first_part: int = 0):
+        """Yields ``(part_index, data)`` upload parts from ``first_part`` on, as the download produces them.
+
+        Starting past the first part (to re-send one Telegram reported missing) resumes the
+        download at the chunk holding that part, so nothing has to be kept around.
+        """
+        start = first_part * PART_SIZE
+        offset = start // CHUNK_SIZE
+        skip = start - offset * CHUNK_SIZE
+        queue = asyncio.Queue(self.buffer_chunks)
+
+        async def produce():
+            try:
+                async for chunk in self.client.stream_media(self.message, offset=offset):
+                    metrics.transfer_bytes.inc(len(chunk), direction="download", mode="stream")
+                    await queue.put(chunk)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            pending = bytearray()
+            part = first_part
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is None:
+                    break
+                pending += item
+                if skip:
+                    del pending[:skip]
+                    skip = 0
+                while len(pending) >= PART_SIZE:
+                    yield part, bytes(pending[:PART_SIZE])
+                    del pending[:PART_SIZE]
+                    part += 1
+            if pending:
+                yield part, bytes(pending)
+        finally:
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import deque, namedtuple
+from time import monotonic
+from typing import Optional
+
+import psutil
+
+from config import PyroConf
+from helpers import metrics
+from logger import LOGGER
+
+Sample = namedtuple("Sample", [
+    "time", "cpu", "memory", "rss", "disk_percent", "disk_total", "disk_used", "disk_free",
+    "net_sent", "net_recv", "bot_down", "bot_up", "messages",
+])
+
+
+class SystemSampler:
+    """Takes a system reading every ``interval`` seconds on a daemon thread, keeping ``history`` seconds.
+
+    ``psutil.cpu_percent`` needs a measuring window, which must never be spent blocking the event
+    loop; here the window is simply the time between two samples. Readers only look at the ring
+    buffer, so /stats renders at once and can show rates over the last minutes instead of
+    lifetime totals.
+    """
+
+    def __init__(self, interval: float, history: float, disk_path: str = "."):
+        self.interval = max(1.0, interval)
+        self.samples = deque(maxlen=max(2, int(history / self.interval) + 1))
+        self.disk_path = disk_path
+        self.process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _read(self) -> Sample:
+        memory = psutil.virtual_memory()
+        try:
+            disk = psutil.disk_usage(self.disk_path)
+        except OSError:
+            disk = None
+        net = psutil.net_io_counters()
+        return Sample(
+            time=monotonic(),
+            cpu=psutil.cpu_percent(None),  # Since the previous call, i.e. over the last interval
+            memory=memory.percent,
+            rss=self.process.memory_info().rss,
+            disk_percent=disk.percent if disk else None,
+            disk_total=disk.total if disk else None,
+            disk_used=disk.used if disk else None,
+            disk_free=disk.free if disk else None,
+            net_sent=net.bytes_sent if net else 0,
+            net_recv=net.bytes_recv if net else 0,
+            bot_down=metrics.transfer_bytes.total(direction="download"),
+            bot_up=metrics.transfer_bytes.total(direction="upload"),
+            messages=metrics.messages_processed.total(),
+        )
+
+    def sample(self):
+        try:
+            self.samples.append(self._read())
+        except Exception as e:
+            LOGGER(__name__).warning(f"System sample failed: {e}")
+
+    def _run(self):
+        psutil.cpu_percent(None)  # Starts the first CPU window
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self) -> Optional[Sample]:
+        return self.samples[-1] if self.samples else None
+
+    def window(self, seconds: float) -> list:
+        """Samples of the last ``seconds``, oldest first (the one just before the window included)."""
+        samples = list(self.samples)
+        if not samples:
+            return []
+        since = samples[-1].time - seconds
+        start = len(samples) - 1
+        while start > 0 and samples[start].time > since:
+            start -= 1
+        return samples[start:]
+
+    def rate(self, field: str, seconds: float) -> Optional[float]:
+        """Per-second growth of a counter field over the window, or None before two samples exist."""
+        samples = self.window(seconds)
+        if len(samples) < 2 or samples[-1].time <= samples[0].time:
+            return None
+        delta = getattr(samples[-1], field) - getattr(samples[0], field)
+        return max(0.0, delta) / (samples[-1].time - samples[0].time)
+
+    def average(self, field: str, seconds: float) -> Optional[float]:
+        samples = self.window(seconds)
+        if len(samples) > 1:
+            samples = samples[1:]  # The sample before the window only anchors rates
+        values = [getattr(s, field) for s in samples if getattr(s, field) is not None]
+        return sum(values) / len(values) if values else None
+
+    def peak(self, field: str, seconds: float) -> Optional[float]:
+        values = [getattr(s, field) for s in self.window(seconds) if getattr(s, field) is not None]
+        return max(values) if values else None
+
+
+system_sampler = SystemSampler(PyroConf.STATS_SAMPLE_INTERVAL, PyroConf.STATS_HISTORY)
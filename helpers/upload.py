@@ -0,0 +1,206 @@
+import asyncio
+import inspect
+import io
+import math
+import os
+from hashlib import md5
+from time import monotonic
+
+from pyrogram import Client, raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+from config import PyroConf
+from logger import LOGGER
+from helpers import metrics
+
+# Same part size and big-file threshold as Pyrogram's save_file
+PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+# Seconds to wait before retrying a failed part, doubled on every attempt
+PART_RETRY_DELAY = 1
+
+
+async def iter_file_parts(path: str, first_part: int = 0):
+    """Yields ``(part_index, data)`` upload parts of a local file, reading off the event loop."""
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as file:
+        file.seek(first_part * PART_SIZE)
+        part = first_part
+        while True:
+            data = await loop.run_in_executor(None, file.read, PART_SIZE)
+            if not data:
+                return
+            yield part, data
+            part += 1
+
+
+class UploadedFile(io.RawIOBase):
+    """A local file already uploaded with ``save_file``, passed to ``send_*`` in place of its path.
+
+    Lets files be uploaded ahead of time (e.g. concurrently) while the messages are still sent
+    one by one in order. ManagedClient.save_file hands back the stored InputFile.
+    """
+
+    def __init__(self, path: str, input_file):
+        super().__init__()
+        self.path = path
+        self.name = os.path.basename(path)
+        self.input_file = input_file
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer):
+        raise io.UnsupportedOperation("UploadedFile has already been uploaded")
+
+
+async def preupload(client: Client, path: str) -> UploadedFile:
+    return UploadedFile(path, await client.save_file(path))
+
+
+class UploadStats:
+    """Per-part timings of one upload, summarised in the log when it finishes."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = monotonic()
+        self.part_rates = []  # MB/s of each part
+        self.retries = 0
+        self.bytes = 0
+
+    def add_part(self, size: int, seconds: float):
+        self.bytes += size
+        self.part_rates.append(size / 1024 / 1024 / max(seconds, 1e-6))
+
+    def summary(self) -> str:
+        elapsed = monotonic() - self.started
+        rates = sorted(self.part_rates) or [0.0]
+        return (
+            f"Uploaded {self.name}: {self.bytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+            f"({self.bytes / 1024 / 1024 / max(elapsed, 1e-6):.2f} MB/s overall), {len(self.part_rates)} parts at "
+            f"min {rates[0]:.2f} / median {rates[len(rates) // 2]:.2f} / max {rates[-1]:.2f} MB/s, "
+            f"{self.retries} part retries"
+        )
+
+
+async def upload_parts(client: Client, parts, file_size: int, name: str, file_id: int = None, file_part: int = 0,
+                       progress=None, progress_args: tuple = ()):
+    """Uploads ``parts`` (async iterator of ``(index, data)``) and returns the InputFile for ``send_*``.
+
+    Big files are sent by ``UPLOAD_WORKERS`` workers in parallel, each on its own media connection.
+    A failed part is retried on its own up to ``UPLOAD_PART_RETRIES`` times before the upload is
+    given up. When ``file_id`` is given only ``file_part`` is sent again (Telegram's FilePartMissing)
+    and None is returned, like Pyrogram's ``save_file``.
+    """
+    async with client.save_file_semaphore:
+        if not file_size:
+            raise ValueError("File size equals to 0 B")
+        size_limit_mib = 4000 if client.me.is_premium else 2000
+        if file_size > size_limit_mib * 1024 * 1024:
+            raise ValueError(f"Can't upload files bigger than {size_limit_mib} MiB")
+
+        total_parts = math.ceil(file_size / PART_SIZE)
+        is_big = file_size > BIG_FILE_SIZE
+        is_missing_part = file_id is not None
+        file_id = file_id or client.rnd_id()
+        md5_sum = md5() if not is_big and not is_missing_part else None
+        worker_count = max(1, PyroConf.UPLOAD_WORKERS) if is_big and not is_missing_part else 1
+        stats = UploadStats(name)
+        queue = asyncio.Queue(worker_count * 2)
+        uploaded = 0
+        queued_parts = 0
+
+        async def send_part(session: Session, part: int, data: bytes):
+            if is_big:
+                rpc = raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+                )
+            else:
+                rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data)
+            attempt = 0
+            while True:
+                started = monotonic()
+                try:
+                    if not await session.invoke(rpc):
+                        raise ValueError(f"Telegram did not accept part {part}")
+                    stats.add_part(len(data), monotonic() - started)
+                    return
+                except FloodWait:
+                    raise
+                except Exception as e:
+                    attempt += 1
+                    if attempt > PyroConf.UPLOAD_PART_RETRIES:
+                        raise
+                    stats.retries += 1
+                    delay = PART_RETRY_DELAY * 2 ** (attempt - 1)
+                    LOGGER(__name__).warning(f"Part {part} of {name} failed ({e}), retry {attempt} in {delay}s")
+                    await asyncio.sleep(delay)
+
+        async def worker():
+            nonlocal uploaded
+            session = Session(
+                client, await client.storage.dc_id(), await client.storage.auth_key(),
+                await client.storage.test_mode(), is_media=True
+            )
+            await session.start()
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    part, data = item
+                    await send_part(session, part, data)
+                    uploaded += len(data)
+                    if progress:
+                        result = progress(min(uploaded, file_size), file_size, *progress_args)
+                        if inspect.isawaitable(result):
+                            await result
+            finally:
+                await session.stop()
+
+        workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            async for part, data in parts:
+                if md5_sum:
+                    md5_sum.update(data)
+                # Wait for a free slot, but notice a worker that died with an error meanwhile
+                put = asyncio.ensure_future(queue.put((part, data)))
+                await asyncio.wait([put, *workers], return_when=asyncio.FIRST_COMPLETED)
+                for task in workers:
+                    if task.done():
+                        put.cancel()
+                        task.result()
+                        raise RuntimeError("Upload worker stopped early")
+                queued_parts += 1
+                if is_missing_part:
+                    break
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if hasattr(parts, "aclose"):
+                await parts.aclose()
+
+        if is_missing_part:
+            return None
+        if queued_parts != total_parts:
+            raise ValueError(f"Got {queued_parts} of {total_parts} parts of {name}")
+        LOGGER(__name__).info(stats.summary(),
+                              extra={"bytes": stats.bytes, "duration": round(monotonic() - stats.started, 3)})
+        mode = "parallel" if worker_count > 1 else "single"
+        metrics.transfer_bytes.inc(stats.bytes, direction="upload", mode=mode)
+        metrics.transfer_seconds.observe(monotonic() - stats.started, direction="upload", mode=mode)
+        if is_big:
+            return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+        return raw.types.InputFile(id=file_id, parts=total_parts, name=name, md5_checksum=md5_sum.hexdigest())
+
+
+async def upload_file(client: Client, path: str, file_id: int = None, file_part: int = 0,
+                      progress=None, progress_args: tuple = ()):
+    """``save_file`` for a local path through the parallel part uploader."""
+    return await upload_parts(client, iter_file_parts(path, file_part), os.path.getsize(path), os.path.basename(path),
+                              file_id, file_part, progress, progress_args)
@@ -2,13 +2,15 @@
 
 import os
 import asyncio
-from time import time
+import math
+import mimetypes
+from collections import OrderedDict
+from time import monotonic, time
 from typing import Optional
 from asyncio.subprocess import PIPE
-from asyncio import create_subprocess_exec, create_subprocess_shell, wait_for
+from asyncio import create_subprocess_exec, create_subprocess_shell
 
 from PIL import Image
-from pyleaves import Leaves
 from pyrogram.parser import Parser
 from pyrogram.utils import get_channel_id
 from pyrogram.types import (
@@ -22,25 +24,36 @@ from pyrogram.types import (
 from pyrogram.errors import FloodWait
 from pyrogram import Client # Added for type hinting
 
+from config import PyroConf
 from logger import LOGGER
+from helpers.file_cache import get_file_cache
+from helpers.streaming import MediaStream
+from helpers.parallel_download import download_message
+from helpers.upload import preupload
+from helpers.progress import progress_reporter
+from helpers.spool import spool
+from helpers import metrics
+from helpers.media_tools import MediaToolsError, media_tools, parse_probe
+from helpers.scheduler import Job
 
 SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
 
-# --- Flood Wait Handling (Imported or defined if not available globally) ---
-# Assuming handle_flood_wait is defined in main.py or accessible globally.
-# If not, it needs to be passed or redefined here.
-# For simplicity, let's assume it's accessible via a shared module or passed.
-# We will need to adjust the function signature to accept it or the necessary components.
+# --- Flood Wait Handling ---
 
-# Placeholder: Define handle_flood_wait if it's not passed
-async def handle_flood_wait(fw: FloodWait, user_id: int, message: Message, status_message: Message = None):
-    """Handles FloodWait exceptions by notifying the user and stopping the task."""
+async def handle_flood_wait(fw: FloodWait, job: Job, message: Message, status_message: Message = None):
+    """Handles a FloodWait the rate limiter could not absorb by notifying the user and stopping the job.
+
+    Shorter waits are slept out transparently by ManagedClient; only waits longer than
+    FLOOD_WAIT_MAX (or repeated ones) reach this point.
+    """
+    user_id = job.user_id
     LOGGER(__name__).error(f"Flood wait encountered for user {user_id}: {fw}")
     wait_time = fw.value
-    error_text = f"**🛑 Flood Limit Error!**\nTelegram requires a wait of {wait_time} seconds. The current task has been automatically stopped to prevent further issues. Please try again later."
+    error_text = f"**🛑 Flood Limit Error!**\nTelegram requires a wait of {wait_time} seconds, longer than the bot waits automatically. The current task has been stopped to prevent further issues. Please try again later."
     
     # Try editing status message first, then reply to original command message
     if status_message:
+        progress_reporter.discard(status_message) # Queued progress must not overwrite the error
         try:
             await status_message.edit(error_text)
         except Exception:
@@ -54,13 +67,9 @@ async def handle_flood_wait(fw: FloodWait, user_id: int, message: Message, statu
         except Exception as e_reply:
             LOGGER(__name__).error(f"Failed to notify user {user_id} about flood wait: {e_reply}")
         
-    # Mark task for cancellation/stop (Accessing global ongoing_tasks is problematic)
-    # This function should ideally signal back to the caller to update ongoing_tasks
-    # Returning a specific value or raising a custom exception might be better.
-    # For now, we assume the caller checks the return value or catches a specific exception.
-    # Let's modify processMediaGroup to return a specific status or raise.
-    # We won't modify ongoing_tasks directly here.
-    pass # Let the caller handle task state modification
+    # Mark job for cancellation/stop
+    job.cancel = True
+    job.flood_stop = True # Mark specifically as flood stopped
 
 # --- Utility Functions --- 
 
@@ -92,8 +101,22 @@ def get_readable_time(seconds: int) -> str:
     return result.strip() # Remove trailing space
 
 
+def get_max_file_size(is_premium=False) -> int:
+    return 4 * 1024 * 1024 * 1024 if is_premium else 2 * 1024 * 1024 * 1024 # 4GB/2GB
+
+
+def remove_file(path: Optional[str]):
+    """Removes a temporary file, ignoring missing paths, and frees its spool reservation."""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            LOGGER(__name__).warning(f"Error removing temp file {path}: {e}")
+    spool.release(path)
+
+
 async def fileSizeLimit(file_size, message: Message, action_type="download", is_premium=False):
-    MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024 if is_premium else 2 * 1024 * 1024 * 1024 # 4GB/2GB
+    MAX_FILE_SIZE = get_max_file_size(is_premium)
     if file_size > MAX_FILE_SIZE:
         try:
             await message.reply(
@@ -105,6 +128,157 @@ async def fileSizeLimit(file_size, message: Message, action_type="download", is_
     return True
 
 
+def is_copy_allowed(chat_message: Message) -> bool:
+    """True if neither the message nor its chat restricts saving/forwarding content."""
+    if chat_message.has_protected_content:
+        return False
+    if chat_message.chat and chat_message.chat.has_protected_content:
+        return False
+    return True
+
+
+def get_message_media(msg: Message):
+    """Returns the media object (Photo, Video, Document, ...) of a message, or None."""
+    if not msg or not msg.media:
+        return None
+    return getattr(msg, msg.media.value, None)
+
+
+def get_cached_file_id(bot: Client, source_msg: Message) -> Optional[str]:
+    """Looks up the file_id this bot got for the source message's file on an earlier upload."""
+    file_cache = get_file_cache()
+    file_unique_id = getattr(get_message_media(source_msg), "file_unique_id", None)
+    if not file_cache or not file_unique_id:
+        return None
+    return file_cache.get(bot.me.id, file_unique_id)
+
+
+def invalidate_cached_file_id(bot: Client, source_msg: Message):
+    file_cache = get_file_cache()
+    file_unique_id = getattr(get_message_media(source_msg), "file_unique_id", None)
+    if file_cache and file_unique_id:
+        file_cache.invalidate(bot.me.id, file_unique_id)
+
+
+def remember_sent_media(bot: Client, source_msg: Message, sent_msg: Message):
+    """Stores the file_id of a freshly uploaded message under the source file's file_unique_id."""
+    file_cache = get_file_cache()
+    source_media = get_message_media(source_msg)
+    sent_media = get_message_media(sent_msg)
+    if not file_cache or not getattr(source_media, "file_unique_id", None) or not getattr(sent_media, "file_id", None):
+        return
+    try:
+        file_cache.put(bot.me.id, source_media.file_unique_id, sent_media.file_id, sent_msg.media.value)
+    except Exception as e:
+        LOGGER(__name__).warning(f"Could not cache file_id for message {source_msg.id}: {e}")
+
+
+async def send_from_file_cache(bot: Client, source_msg: Message, target_chat_id, caption: str) -> Optional[Message]:
+    """Resends previously uploaded media by file_id. Returns None on a cache miss or a stale entry."""
+    file_id = get_cached_file_id(bot, source_msg)
+    if not file_id:
+        return None
+    try:
+        sent = await bot.send_cached_media(chat_id=target_chat_id, file_id=file_id, caption=caption or "")
+        LOGGER(__name__).info(f"Sent message {source_msg.id} from file_id cache to {target_chat_id}")
+        return sent
+    except FloodWait:
+        raise
+    except Exception as e:
+        LOGGER(__name__).warning(f"Cached file_id for message {source_msg.id} failed, re-uploading: {e}")
+        invalidate_cached_file_id(bot, source_msg)
+        return None
+
+
+# InputMedia class for each media type that can be re-sent in a media group
+INPUT_MEDIA_TYPES = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "audio": InputMediaAudio,
+    "document": InputMediaDocument,
+}
+
+
+async def send_copies(bot: Client, sent_messages: list, target_chat_id) -> list:
+    """Re-sends messages the bot just delivered to another chat, by file_id (nothing is transferred).
+
+    Messages that were delivered as one media group are sent as a group again. Media without a
+    file (link previews, polls, locations, contacts, ...) is copied from the delivered message.
+    """
+    group_ids = {m.media_group_id for m in sent_messages}
+    if len(sent_messages) > 1 and None not in group_ids and len(group_ids) == 1 \
+            and all(m.media and m.media.value in INPUT_MEDIA_TYPES for m in sent_messages):
+        media = [
+            INPUT_MEDIA_TYPES[m.media.value](media=get_message_media(m).file_id, caption=m.caption or "",
+                                            caption_entities=m.caption_entities)
+            for m in sent_messages
+        ]
+        return await bot.send_media_group(chat_id=target_chat_id, media=media)
+
+    copies = []
+    for sent in sent_messages:
+        file_id = getattr(get_message_media(sent), "file_id", None)
+        if file_id:
+            copies.append(await bot.send_cached_media(chat_id=target_chat_id, file_id=file_id,
+                                                      caption=sent.caption or "", caption_entities=sent.caption_entities))
+        elif sent.media:
+            copies.append(await bot.copy_message(chat_id=target_chat_id, from_chat_id=sent.chat.id, message_id=sent.id))
+        else:
+            copies.append(await bot.send_message(chat_id=target_chat_id, text=sent.text, entities=sent.entities))
+    return copies
+
+
+def parse_destination_ids(args: list) -> list:
+    """Parses destination chat IDs given as separate arguments and/or comma-separated lists."""
+    destinations = []
+    for arg in args:
+        for value in arg.split(","):
+            if not value.strip():
+                continue
+            chat_id = int(value)
+            if chat_id not in destinations:
+                destinations.append(chat_id)
+    return destinations
+
+
+def should_stream(msg: Message) -> bool:
+    """Large videos, audio and documents are streamed into the upload instead of going through disk."""
+    if not PyroConf.STREAM_MEDIA or not (msg.video or msg.audio or msg.document):
+        return False
+    file_size = getattr(get_message_media(msg), "file_size", 0) or 0
+    return file_size >= PyroConf.STREAM_THRESHOLD_MB * 1024 * 1024
+
+
+async def send_streamed_media(bot: Client, user: Client, source_msg: Message, target_chat_id, caption: str,
+                              progress_message: Message, start_time: float) -> Message:
+    """Uploads a message's media with ``bot`` while ``user`` is still downloading it.
+
+    There is no local file to probe, so duration, dimensions, tags and the thumbnail come from the
+    source message only.
+    """
+    media = get_message_media(source_msg)
+    extension = mimetypes.guess_extension(media.mime_type or "") or ""
+    file_name = media.file_name or f"{source_msg.media.value}_{source_msg.id}{extension}"
+    stream = MediaStream(user, source_msg, file_name, media.file_size)
+    progress_kwargs = dict(progress=report_progress,
+                           progress_args=progressArgs("📤 Uploading", progress_message, start_time))
+
+    metadata = await resolve_media_metadata(user, source_msg)
+    try:
+        if source_msg.video:
+            return await bot.send_video(chat_id=target_chat_id, video=stream, duration=metadata.duration,
+                                        width=metadata.width or 640, height=metadata.height or 360, thumb=metadata.thumb,
+                                        file_name=file_name, caption=caption or "", **progress_kwargs)
+        if source_msg.audio:
+            return await bot.send_audio(chat_id=target_chat_id, audio=stream, duration=metadata.duration,
+                                        performer=metadata.performer, title=metadata.title, thumb=metadata.thumb,
+                                        file_name=file_name, caption=caption or "", **progress_kwargs)
+        return await bot.send_document(chat_id=target_chat_id, document=stream, thumb=metadata.thumb,
+                                       file_name=file_name, caption=caption or "", **progress_kwargs)
+    finally:
+        remove_file(metadata.thumb)
+
+
 async def get_parsed_msg(text, entities):
     # Use html parser for better compatibility if needed, but stick to markdown for now
     return Parser.unparse(text, entities or [], is_html=False)
@@ -118,10 +292,31 @@ PROGRESS_BAR = """
 """
 
 def progressArgs(action: str, progress_message: Message, start_time: float):
-    # Ensure progress bar format is compatible with Leaves
+    # Arguments of report_progress after (current, total)
     return (action, progress_message, start_time)
 
 
+async def report_progress(current: int, total: int, action: str, progress_message: Message, start_time: float):
+    """Download/upload ``progress`` callback; hands the text to the progress reporter without waiting.
+
+    It is a coroutine function so Pyrogram awaits it on the event loop: plain functions are run in
+    Pyrogram's executor threads, where the reporter (an asyncio task and event) can't be used.
+    """
+    elapsed = max(time() - start_time, 1e-6)
+    percentage = current * 100 / total if total else 0
+    speed = current / elapsed
+    filled = math.floor(percentage / 5)
+    text = PROGRESS_BAR.format(
+        action=action,
+        percentage=percentage,
+        current=get_readable_file_size(current),
+        total=get_readable_file_size(total),
+        speed=get_readable_file_size(speed),
+        est_time=get_readable_time((total - current) / speed if speed else 0),
+    )
+    progress_reporter.update(progress_message, text.strip() + "\n" + "●" * filled + "○" * (20 - filled))
+
+
 def getChatMsgID(link: str):
     # Simplified and potentially more robust parsing
     try:
@@ -161,85 +356,123 @@ async def cmd_exec(cmd, shell=False):
 
 
 async def get_media_info(path):
+    """Probes a local file; returns ``(duration, artist, title, width, height)``."""
     try:
-        stdout, stderr, retcode = await cmd_exec(
-            [
-                "ffprobe",
-                "-hide_banner",
-                "-loglevel", "error", # Use error level
-                "-print_format", "json",
-                "-show_format",
-                "-show_streams", # Also show streams for width/height
-                path,
-            ]
-        )
-        if retcode != 0:
-            LOGGER(__name__).error(f"ffprobe error for {path}: {stderr}")
-            return 0, None, None, None, None # duration, artist, title, width, height
-            
-        data = eval(stdout) # Use json.loads for safety if possible, but eval is common here
-        format_info = data.get("format", {})
-        duration = round(float(format_info.get("duration", 0)))
-        tags = format_info.get("tags", {})
-        artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
-        title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
-        
-        # Get width/height from video stream if available
-        width, height = None, None
-        video_stream = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
-        if video_stream:
-            width = video_stream.get("width")
-            height = video_stream.get("height")
-            
-        return duration, artist, title, width, height
-        
-    except FileNotFoundError:
-         LOGGER(__name__).error(f"ffprobe not found. Ensure ffmpeg is installed.")
-         return 0, None, None, None, None
-    except Exception as e:
+        return parse_probe(await media_tools.probe(path))
+    except (MediaToolsError, ValueError) as e:
         LOGGER(__name__).error(f"Get Media Info error for {path}: {e}")
         return 0, None, None, None, None
 
 
-async def get_video_thumbnail(video_file, duration):
+def video_thumbnail_path(video_file: str) -> str:
     output = os.path.join("Assets", f"video_thumb_{os.path.basename(video_file)}.jpg") # Unique name
     if os.path.exists(output):
          try: os.remove(output) # Clean previous attempt
          except OSError: pass
-         
+    return output
+
+
+async def get_video_thumbnail(video_file, duration):
+    output = video_thumbnail_path(video_file)
     if duration is None or duration == 0:
         duration_info = (await get_media_info(video_file))[0]
         duration = duration_info if duration_info > 0 else 3 # Use fetched duration or default
-        
-    thumb_time = duration // 2
-    if thumb_time < 1: thumb_time = 1 # Ensure time is at least 1s
-        
-    cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-loglevel", "error",
-        "-ss", f"{thumb_time}",
-        "-i", video_file,
-        "-vf", "thumbnail,scale=320:-1", # Added scaling for smaller thumbs
-        "-q:v", "2", # Good quality
-        "-frames:v", "1",
-        output,
-    ]
     try:
-        _, stderr, retcode = await wait_for(cmd_exec(cmd), timeout=60)
-        if retcode != 0 or not os.path.exists(output):
-            LOGGER(__name__).error(f"ffmpeg error extracting thumbnail for {video_file}: {stderr}")
-            return None
-    except asyncio.TimeoutError:
-        LOGGER(__name__).error(f"ffmpeg timeout extracting thumbnail for {video_file}")
+        return await media_tools.thumbnail(video_file, output, duration)
+    except MediaToolsError as e:
+        LOGGER(__name__).error(f"ffmpeg error extracting thumbnail for {video_file}: {e}")
+        return None
+
+
+class MediaMetadata:
+    """Duration, dimensions, tags and thumbnail used when re-sending a video, audio or document."""
+
+    def __init__(self, duration=0, width=None, height=None, performer=None, title=None, thumb=None):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.performer = performer
+        self.title = title
+        self.thumb = thumb # Local thumbnail path; the caller removes it
+
+
+# ffprobe results by file_unique_id, so a file seen again is not probed again
+probe_cache = OrderedDict()
+PROBE_CACHE_SIZE = 1000
+
+
+async def download_source_thumbnail(user: Client, source_msg: Message) -> Optional[str]:
+    """Downloads the thumbnail Telegram already has for the source media (a few KB)."""
+    thumbs = getattr(get_message_media(source_msg), "thumbs", None)
+    if not thumbs:
         return None
+    thumb = max(thumbs, key=lambda t: (t.width or 0) * (t.height or 0))
+    try:
+        return await user.download_media(
+            thumb.file_id,
+            file_name=os.path.join("Assets", f"thumb_{source_msg.chat.id}_{source_msg.id}.jpg"),
+        )
+    except FloodWait:
+        raise
     except Exception as e:
-         LOGGER(__name__).error(f"ffmpeg error extracting thumbnail for {video_file}: {e}")
-         return None
-         
-    return output
+        LOGGER(__name__).warning(f"Could not fetch thumbnail of message {source_msg.id}: {e}")
+        return None
+
+
+async def resolve_media_metadata(user: Client, source_msg: Message, media_path: Optional[str] = None,
+                                 thumbnail: bool = True) -> MediaMetadata:
+    """Collects the metadata for re-sending a message's media.
+
+    The source message's own attributes and thumbnail come first. ffprobe/ffmpeg only run on
+    ``media_path`` for what is still missing.
+    """
+    media = get_message_media(source_msg)
+    metadata = MediaMetadata(
+        duration=getattr(media, "duration", 0) or 0,
+        width=getattr(media, "width", None),
+        height=getattr(media, "height", None),
+        performer=getattr(media, "performer", None),
+        title=getattr(media, "title", None),
+    )
+    is_video = bool(source_msg.video)
+    is_audio = bool(source_msg.audio)
+    missing = (is_video or is_audio) and (not metadata.duration or (is_video and not (metadata.width and metadata.height)))
+
+    if thumbnail:
+        metadata.thumb = await download_source_thumbnail(user, source_msg)
+
+    if missing:
+        file_unique_id = getattr(media, "file_unique_id", None)
+        probed = probe_cache.get(file_unique_id)
+        if probed:
+            probe_cache.move_to_end(file_unique_id)
+        elif media_path:
+            if is_video and thumbnail and not metadata.thumb:
+                # Needs a probe and a frame: one queue slot, and the frame reuses the probed duration
+                try:
+                    data, metadata.thumb = await media_tools.probe_with_thumbnail(media_path, video_thumbnail_path(media_path))
+                    probed = parse_probe(data)
+                except (MediaToolsError, ValueError) as e:
+                    LOGGER(__name__).error(f"Get Media Info error for {media_path}: {e}")
+                    probed = (0, None, None, None, None)
+            else:
+                probed = await get_media_info(media_path)
+            if file_unique_id and any(probed):
+                probe_cache[file_unique_id] = probed
+                if len(probe_cache) > PROBE_CACHE_SIZE:
+                    probe_cache.popitem(last=False)
+        if probed:
+            duration, artist, title, width, height = probed
+            metadata.duration = metadata.duration or duration
+            metadata.performer = metadata.performer or artist
+            metadata.title = metadata.title or title
+            metadata.width = metadata.width or width
+            metadata.height = metadata.height or height
+
+    if thumbnail and not metadata.thumb and is_video and media_path:
+        metadata.thumb = await get_video_thumbnail(media_path, metadata.duration)
+    return metadata
 
-# Removed unused send_media function as main.py handles sending directly
 
 # --- processMediaGroup --- #
 
@@ -247,24 +480,32 @@ class FloodWaitDetected(Exception):
     "Custom exception to signal a flood wait occurred." 
     pass
 
-async def processMediaGroup(chat_message: Message, bot: Client, user_message: Message, target_chat_id: int, user_id: int, ongoing_tasks: dict):
-    """Downloads and sends a media group, handling cancellation and flood waits."""
-    
-    media_group_messages = []
+async def processMediaGroup(chat_message: Message, bot: Client, user_message: Message, target_chat_id: int, job: Job, media_group_messages: list = None):
+    """Downloads and sends a media group, handling cancellation and flood waits.
+
+    Pass ``media_group_messages`` when the album members were already fetched (e.g. by a range
+    job) to skip the get_media_group call. Returns ``(source, sent)`` pairs for the items that
+    were actually sent, or False on failure.
+    """
+    user_id = job.user_id
+
     try:
         # Check cancellation before fetching group
-        if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+        if job.cancel:
             LOGGER(__name__).info(f"Task cancelled by user {user_id} before fetching media group {chat_message.media_group_id}")
             return False
             
-        media_group_messages = await chat_message.get_media_group()
+        if not media_group_messages:
+            media_group_messages = await chat_message.get_media_group()
+            if job.filter:
+                media_group_messages = job.filter.filter_album(media_group_messages)
         if not media_group_messages:
              LOGGER(__name__).warning(f"get_media_group returned empty list for {chat_message.media_group_id}")
              return False # Nothing to process
              
     except FloodWait as fw:
         LOGGER(__name__).error(f"Flood wait getting media group {chat_message.media_group_id} for user {user_id}: {fw}")
-        await handle_flood_wait(fw, user_id, user_message)
+        await handle_flood_wait(fw, job, user_message)
         raise FloodWaitDetected() # Signal flood wait occurred
     except Exception as e:
         LOGGER(__name__).error(f"Error getting media group {chat_message.media_group_id} for user {user_id}: {e}")
@@ -273,16 +514,17 @@ async def processMediaGroup(chat_message: Message, bot: Client, user_message: Me
         return False
 
     valid_media_to_send = []
+    media_sources = [] # Source message of each entry in valid_media_to_send
+    cached_sources = [] # Sources sent by cached file_id instead of a download
     downloaded_paths = []
     progress_message = None
-    start_time = time()
 
     try:
         # Send initial progress message
         try:
             progress_message = await user_message.reply(f"**📥 Downloading media group ({len(media_group_messages)} items)...**")
         except FloodWait as fw_prog:
-            await handle_flood_wait(fw_prog, user_id, user_message)
+            await handle_flood_wait(fw_prog, job, user_message)
             raise FloodWaitDetected()
         except Exception as e_prog:
             LOGGER(__name__).error(f"Error sending progress message for media group (user {user_id}): {e_prog}")
@@ -291,104 +533,145 @@ async def processMediaGroup(chat_message: Message, bot: Client, user_message: Me
 
         LOGGER(__name__).info(f"Downloading media group {chat_message.media_group_id} ({len(media_group_messages)} items) for user {user_id}")
 
-        for i, msg in enumerate(media_group_messages):
-            # Check cancellation before each download
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
-                LOGGER(__name__).info(f"Task cancelled by user {user_id} during media group download at item {i+1}")
-                return False # Indicate cancellation
-
-            media_path = None
-            try:
-                # Update progress message
-                if progress_message and (i % 5 == 0 or i == 0):
-                     try:
-                         await progress_message.edit(f"**📥 Downloading media group item {i+1}/{len(media_group_messages)}...**")
-                     except Exception: pass # Ignore edit errors
-                     
-                # Determine media type and download
-                if msg.photo or msg.video or msg.document or msg.audio:
-                    media_path = await msg.download(
-                        progress=Leaves.progress_for_pyrogram,
-                        progress_args=progressArgs(f"📥 Downloading item {i+1}", progress_message, start_time)
-                    )
-                    downloaded_paths.append(media_path)
-
-                    # Prepare InputMedia object
-                    caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
-                    if msg.photo:
-                        valid_media_to_send.append(InputMediaPhoto(media=media_path, caption=caption))
-                    elif msg.video:
-                        # Note: Thumbnails for videos in media groups might not be handled automatically by send_media_group.
-                        # Pyrogram might generate them, or they might be omitted.
-                        valid_media_to_send.append(InputMediaVideo(media=media_path, caption=caption))
-                    elif msg.document:
-                        valid_media_to_send.append(InputMediaDocument(media=media_path, caption=caption))
-                    elif msg.audio:
-                        valid_media_to_send.append(InputMediaAudio(media=media_path, caption=caption))
-                else:
-                     LOGGER(__name__).info(f"Skipping non-media message in group: {msg.id}")
-                     
-            except FloodWait as fw_dl:
-                LOGGER(__name__).error(f"Flood wait downloading media group item {i+1} for user {user_id}: {fw_dl}")
-                await handle_flood_wait(fw_dl, user_id, user_message, progress_message)
-                raise FloodWaitDetected()
-            except Exception as e_dl:
-                LOGGER(__name__).error(f"Error downloading media group item {i+1} (msg_id: {msg.id}) for user {user_id}: {e_dl}")
-                # Don't stop the whole group for one failed item, just log and continue
-                if progress_message:
-                     try: await progress_message.edit(f"**⚠️ Error downloading item {i+1}. Skipping.**")
-                     except Exception: pass
-                await asyncio.sleep(1) # Pause briefly after error
-                continue # Skip to next item
-                
-            # Optional sleep between downloads
-            await asyncio.sleep(0.1) # Small delay
+        # Download and upload the items concurrently (bounded), then build the InputMedia list in album order.
+        # Both the group send and the individual fallback then send the pre-uploaded files without re-uploading.
+        semaphore = asyncio.Semaphore(max(1, PyroConf.ALBUM_WORKERS))
+        downloaded_count = 0
+
+        async def fetch_item(i, msg):
+            nonlocal downloaded_count
+            if not (msg.photo or msg.video or msg.document or msg.audio):
+                LOGGER(__name__).info(f"Skipping non-media message in group: {msg.id}")
+                return None
+            # Unless the bot already has this file
+            cached_file_id = get_cached_file_id(bot, msg)
+            if cached_file_id:
+                metrics.album_items.inc(outcome="cached")
+                return cached_file_id, True
+            async with semaphore:
+                # Check cancellation before each download
+                if job.cancel:
+                    return None
+                try:
+                    media_path = await download_message(msg, owner=job.id)
+                except FloodWait:
+                    raise
+                except Exception as e_dl:
+                    LOGGER(__name__).error(f"Error downloading media group item {i+1} (msg_id: {msg.id}) for user {user_id}: {e_dl}")
+                    metrics.album_items.inc(outcome="failed")
+                    # Don't stop the whole group for one failed item, just log and continue
+                    if progress_message:
+                        progress_reporter.update(progress_message, f"**⚠️ Error downloading item {i+1}. Skipping.**")
+                    return None
+                downloaded_paths.append(media_path)
+                try:
+                    media = await preupload(bot, media_path)
+                except FloodWait:
+                    raise
+                except Exception as e_up:
+                    LOGGER(__name__).warning(f"Pre-upload of media group item {i+1} failed for user {user_id}: {e_up}. Uploading it with the group.")
+                    media = media_path
+            downloaded_count += 1
+            metrics.album_items.inc(outcome="downloaded")
+            if progress_message:
+                progress_reporter.update(progress_message, f"**📥 Prepared {downloaded_count}/{len(media_group_messages)} media group items...**")
+            return media, False
+
+        phase_started = monotonic()
+        tasks = [asyncio.create_task(fetch_item(i, msg)) for i, msg in enumerate(media_group_messages)]
+        try:
+            items = await asyncio.gather(*tasks)
+            metrics.album_seconds.observe(monotonic() - phase_started, phase="prepare")
+        except FloodWait as fw_dl:
+            LOGGER(__name__).error(f"Flood wait downloading media group {chat_message.media_group_id} for user {user_id}: {fw_dl}")
+            await handle_flood_wait(fw_dl, job, user_message, progress_message)
+            raise FloodWaitDetected()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if job.cancel:
+            LOGGER(__name__).info(f"Task cancelled by user {user_id} during media group download")
+            return False # Indicate cancellation
+
+        for msg, item in zip(media_group_messages, items):
+            if item is None:
+                continue
+            media_path, is_cached = item
+            media_sources.append(msg)
+            if is_cached:
+                cached_sources.append(msg)
+
+            # Prepare InputMedia object
+            caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
+            if msg.photo:
+                valid_media_to_send.append(InputMediaPhoto(media=media_path, caption=caption))
+            elif msg.video and not is_cached:
+                # Source metadata and thumbnail; send_media_group would otherwise send the video without them
+                metadata = await resolve_media_metadata(msg._client, msg)
+                if metadata.thumb:
+                    downloaded_paths.append(metadata.thumb)
+                valid_media_to_send.append(InputMediaVideo(media=media_path, caption=caption, thumb=metadata.thumb,
+                                                           duration=metadata.duration, width=metadata.width or 0,
+                                                           height=metadata.height or 0))
+            elif msg.video:
+                valid_media_to_send.append(InputMediaVideo(media=media_path, caption=caption))
+            elif msg.document:
+                valid_media_to_send.append(InputMediaDocument(media=media_path, caption=caption))
+            elif msg.audio:
+                valid_media_to_send.append(InputMediaAudio(media=media_path, caption=caption))
 
         # --- Sending Phase --- # 
         LOGGER(__name__).info(f"Downloaded {len(valid_media_to_send)} valid media items for group {chat_message.media_group_id} (user {user_id})")
 
         if not valid_media_to_send:
-            if progress_message: await progress_message.delete()
+            if progress_message: await progress_reporter.delete(progress_message)
             await user_message.reply("**❌ No valid media could be downloaded from the media group.**")
             return False
 
         # Check cancellation before sending
-        if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+        if job.cancel:
             LOGGER(__name__).info(f"Task cancelled by user {user_id} before sending media group {chat_message.media_group_id}")
             return False
 
         if progress_message:
-             try: await progress_message.edit(f"**📤 Uploading media group ({len(valid_media_to_send)} items)...**")
-             except Exception: pass
+             progress_reporter.update(progress_message, f"**📤 Sending media group ({len(valid_media_to_send)} items)...**")
              
         try:
             # Use BOT client to send to the target chat
-            await bot.send_media_group(chat_id=target_chat_id, media=valid_media_to_send)
-            if progress_message: await progress_message.delete()
+            phase_started = monotonic()
+            sent_messages = await bot.send_media_group(chat_id=target_chat_id, media=valid_media_to_send)
+            metrics.album_seconds.observe(monotonic() - phase_started, phase="send")
+            for source_msg, sent_msg in zip(media_sources, sent_messages or []):
+                if source_msg not in cached_sources:
+                    remember_sent_media(bot, source_msg, sent_msg)
+            if progress_message: await progress_reporter.delete(progress_message)
             progress_message = None # Mark as deleted
             LOGGER(__name__).info(f"Successfully sent media group {chat_message.media_group_id} to {target_chat_id} for user {user_id}")
-            return True # Success
+            return list(zip(media_sources, sent_messages or [])) # Success
             
         except FloodWait as fw_send:
             LOGGER(__name__).error(f"Flood wait sending media group {chat_message.media_group_id} for user {user_id}: {fw_send}")
-            await handle_flood_wait(fw_send, user_id, user_message, progress_message)
+            await handle_flood_wait(fw_send, job, user_message, progress_message)
             raise FloodWaitDetected()
             
         except Exception as e_send:
             # Handle potential failure to send as a group (e.g., mixed types not supported by target client)
-            LOGGER(__name__.error(f"Failed to send media group {chat_message.media_group_id} as a whole for user {user_id}: {e_send}. Trying individual uploads."))
+            for source_msg in cached_sources:
+                invalidate_cached_file_id(bot, source_msg) # A stale file_id may be the cause
+            LOGGER(__name__).error(f"Failed to send media group {chat_message.media_group_id} as a whole for user {user_id}: {e_send}. Trying individual uploads.")
             if progress_message:
-                 try: await progress_message.edit("**⚠️ Failed to send as group. Trying individual uploads...**")
-                 except Exception: pass
+                 progress_reporter.update(progress_message, "**⚠️ Failed to send as group. Trying individual uploads...**")
             else: # If no progress message, inform user
                  try: await user_message.reply("**⚠️ Failed to send as group. Trying individual uploads...**")
                  except Exception: pass
                  
             # --- Fallback: Send Individually --- #
-            success_count = 0
-            for i, media_input in enumerate(valid_media_to_send):
+            sent_individually = []
+            for i, (source_msg, media_input) in enumerate(zip(media_sources, valid_media_to_send)):
                  # Check cancellation before each individual send
-                 if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+                 if job.cancel:
                      LOGGER(__name__).info(f"Task cancelled by user {user_id} during individual fallback send at item {i+1}")
                      return False # Indicate cancellation
                      
@@ -397,19 +680,24 @@ async def processMediaGroup(chat_message: Message, bot: Client, user_message: Me
                  media_type = type(media_input)
                  
                  try:
+                     if source_msg in cached_sources:
+                         # Its file_id was just invalidated, so download the item instead of resending it
+                         item = await fetch_item(i, source_msg)
+                         if item is None:
+                             raise ValueError("download failed")
+                         media_path = item[0]
                      if progress_message:
-                          try: await progress_message.edit(f"**📤 Uploading item {i+1}/{len(valid_media_to_send)} individually...**")
-                          except Exception: pass
+                          progress_reporter.update(progress_message, f"**📤 Sending item {i+1}/{len(valid_media_to_send)} individually...**")
                           
                      # Use appropriate send method based on type
                      if media_type is InputMediaPhoto:
-                         await bot.send_photo(chat_id=target_chat_id, photo=media_path, caption=caption)
+                         sent = await bot.send_photo(chat_id=target_chat_id, photo=media_path, caption=caption)
                      elif media_type is InputMediaVideo:
-                         await bot.send_video(chat_id=target_chat_id, video=media_path, caption=caption)
+                         sent = await bot.send_video(chat_id=target_chat_id, video=media_path, caption=caption)
                      elif media_type is InputMediaDocument:
-                         await bot.send_document(chat_id=target_chat_id, document=media_path, caption=caption)
+                         sent = await bot.send_document(chat_id=target_chat_id, document=media_path, caption=caption)
                      elif media_type is InputMediaAudio:
-                         await bot.send_audio(chat_id=target_chat_id, audio=media_path, caption=caption)
+                         sent = await bot.send_audio(chat_id=target_chat_id, audio=media_path, caption=caption)
                      # Add other types like Voice if necessary
                      # elif isinstance(media_input, Voice):
                      #     await bot.send_voice(chat_id=target_chat_id, voice=media_path, caption=caption)
@@ -417,27 +705,26 @@ async def processMediaGroup(chat_message: Message, bot: Client, user_message: Me
                           LOGGER(__name__).warning(f"Unsupported media type in fallback send: {media_type}")
                           continue # Skip unsupported type
                           
-                     success_count += 1
-                     await asyncio.sleep(0.5) # Small delay between individual sends
+                     sent_individually.append((source_msg, sent))
                      
                  except FloodWait as fw_ind:
                      LOGGER(__name__).error(f"Flood wait sending individual media item {i+1} for user {user_id}: {fw_ind}")
-                     await handle_flood_wait(fw_ind, user_id, user_message, progress_message)
+                     await handle_flood_wait(fw_ind, job, user_message, progress_message)
                      raise FloodWaitDetected()
                  except Exception as e_ind:
-                     LOGGER(__name__).error(f"Failed to upload individual media item {i+1} (path: {media_path}) for user {user_id}: {e_ind}")
+                     LOGGER(__name__).error(f"Failed to send individual media item {i+1} for user {user_id}: {e_ind}")
                      if progress_message:
-                          try: await progress_message.edit(f"**❌ Failed item {i+1}. Skipping.**")
-                          except Exception: pass
+                          progress_reporter.update(progress_message, f"**❌ Failed item {i+1}. Skipping.**")
                      await asyncio.sleep(1)
                      continue # Skip failed item
                      
             # Final status for fallback
-            if progress_message: await progress_message.delete()
+            if progress_message: await progress_reporter.delete(progress_message)
             progress_message = None
-            if success_count > 0:
-                 await user_message.reply(f"**✅ Sent {success_count}/{len(valid_media_to_send)} items individually.**")
-                 return True # Partial success is still success overall for the group processing
+            if sent_individually:
+                 await user_message.reply(f"**✅ Sent {len(sent_individually)}/{len(valid_media_to_send)} items individually.**")
+                 metrics.album_seconds.observe(monotonic() - phase_started, phase="send_individually")
+                 return sent_individually # Partial success is still success overall for the group processing
             else:
                  await user_message.reply(f"**❌ Failed to send any media items individually.**")
                  return False # Complete failure
@@ -445,13 +732,9 @@ async def processMediaGroup(chat_message: Message, bot: Client, user_message: Me
     finally:
         # Cleanup downloaded files
         for path in downloaded_paths:
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                except OSError as e:
-                    LOGGER(__name__).warning(f"Error removing temp file {path}: {e}")
+            remove_file(path)
         # Cleanup progress message if it still exists
         if progress_message:
-            try: await progress_message.delete()
+            try: await progress_reporter.delete(progress_message)
             except Exception: pass
 
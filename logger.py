@@ -1,25 +1,149 @@
+import atexit
+import copy
+import gzip
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import tempfile
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from time import monotonic
+
+from config import PyroConf
+
+LOG_FILE = "logs.txt"
+TEXT_FORMAT = "[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(message)s"
+DATE_FORMAT = "%d-%b-%y %I:%M:%S %p"
+# Passed as ``extra={...}`` on hot-path log calls; emitted as JSON fields when LOG_JSON is on
+STRUCTURED_FIELDS = ("job_id", "chat_id", "message_id", "bytes", "duration")
 
 # removing old logs file if they exist.
-try:
-    os.remove("logs.txt")
-except:
-    pass
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s - %(levelname)s] - %(funcName)s() - Line %(lineno)d: %(name)s - %(message)s",
-    datefmt="%d-%b-%y %I:%M:%S %p",
-    handlers=[
-        RotatingFileHandler("logs.txt", mode="w+", maxBytes=5000000, backupCount=10),
+for old_log in [LOG_FILE, *(f"{LOG_FILE}.{i}" for i in range(1, PyroConf.LOG_BACKUP_COUNT + 1))]:
+    try:
+        os.remove(old_log)
+    except:
+        pass
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the structured fields a record carries."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RepeatFilter(logging.Filter):
+    """Drops warnings/errors identical to one logged less than ``interval`` seconds ago.
+
+    The next copy after the interval carries the number of copies dropped in between, so a
+    failing loop costs one line per interval instead of flooding the log.
+    """
+
+    MAX_KEYS = 1000
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self.seen = {}  # (logger, level, message) -> [monotonic() of the last emitted copy, dropped copies]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0 or record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = monotonic()
+        with self._lock:
+            state = self.seen.get(key)
+            if state and now - state[0] < self.interval:
+                state[1] += 1
+                return False
+            if len(self.seen) >= self.MAX_KEYS:
+                self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.interval}
+            self.seen[key] = [now, 0]
+        if state and state[1]:
+            record.msg = f"{key[2]} (repeated {state[1]} more times in the last {now - state[0]:.0f}s)"
+            record.args = None
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """Queues records as they are, only merging the message arguments while they still hold their
+    current values; exceptions are formatted later by the writer thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _build_handlers() -> list:
+    formatter = JsonFormatter() if PyroConf.LOG_JSON else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+    handlers = [
+        RotatingFileHandler(LOG_FILE, mode="w+", maxBytes=PyroConf.LOG_FILE_MAX_MB * 1024 * 1024,
+                            backupCount=PyroConf.LOG_BACKUP_COUNT),
         logging.StreamHandler(),
-    ],
-)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+# Records are only queued on the calling thread (the event loop); formatting and the file/console
+# writes happen on the listener's thread, so a slow disk never stalls a transfer
+log_queue = queue.SimpleQueue()
+queue_handler = LogQueueHandler(log_queue)
+queue_handler.addFilter(RepeatFilter(PyroConf.LOG_REPEAT_INTERVAL))
+log_listener = QueueListener(log_queue, *_build_handlers(), respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flushes what is still queued
+
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
 
 logging.getLogger("pyrogram").setLevel(logging.ERROR)
 
 
 def LOGGER(name: str) -> logging.Logger:
     return logging.getLogger(name)
+
+
+def compress_log_tail(max_bytes: int) -> str:
+    """Gzips the last ``max_bytes`` of the log (rotated files included, oldest first) into a temp file.
+
+    Blocking; run it in a thread. The caller removes the returned file.
+    """
+    files = [f"{LOG_FILE}.{i}" for i in range(PyroConf.LOG_BACKUP_COUNT, 0, -1)] + [LOG_FILE]
+    files = [path for path in files if os.path.exists(path)]
+    # Newest files first until the budget is used up, then written out in chronological order
+    parts, remaining = [], max_bytes
+    for path in reversed(files):
+        if remaining <= 0:
+            break
+        size = os.path.getsize(path)
+        parts.append((path, max(0, size - remaining)))
+        remaining -= size
+    fd, archive = tempfile.mkstemp(prefix="logs_", suffix=".txt.gz")
+    with os.fdopen(fd, "wb") as raw, gzip.GzipFile(filename="logs.txt", mode="wb", fileobj=raw) as out:
+        for path, offset in reversed(parts):
+            with open(path, "rb") as source:
+                source.seek(offset)
+                if offset:
+                    source.readline()  # Starts at a whole line
+                while chunk := source.read(1024 * 1024):
+                    out.write(chunk)
+    return archive
@@ -1,16 +1,13 @@
 
 
 import os
-import shutil
 import asyncio
-from time import time
+from time import monotonic, time
 
-import psutil
 from pyrogram.types import Message
 from pyrogram.enums import ParseMode
-from pyrogram import Client, filters
-from pyrogram.errors import PeerIdInvalid, BadRequest, FloodWait
-from pyleaves import Leaves
+from pyrogram import Client, filters, idle
+from pyrogram.errors import PeerIdInvalid, BadRequest, FloodWait, ChannelPrivate, ChatForwardsRestricted, InternalServerError
 from PIL import Image
 
 from helpers.utils import (
@@ -19,18 +16,48 @@ from helpers.utils import (
     get_parsed_msg,
     fileSizeLimit,
     progressArgs,
+    report_progress,
     # send_media, # This helper seems unused, removing import
     get_readable_file_size,
     get_readable_time,
-    get_media_info,
-    get_video_thumbnail,
+    resolve_media_metadata,
+    handle_flood_wait,
+    FloodWaitDetected,
+    is_copy_allowed,
+    get_max_file_size,
+    remove_file,
+    get_message_media,
+    get_cached_file_id,
+    send_from_file_cache,
+    remember_sent_media,
+    should_stream,
+    send_streamed_media,
+    send_copies,
+    parse_destination_ids,
 )
 
+from helpers.client import ManagedClient
+from helpers.client_pool import ClientPool
+from helpers.range_fetch import RangePrefetcher
+from helpers.pipeline import OrderedPipeline
+from helpers.parallel_download import download_message
+from helpers.progress import progress_reporter
+from helpers.spool import spool
+from helpers.delivery_index import get_delivery_index
+from helpers.message_filter import MessageFilter
+from helpers.mirror import get_mirror_store, ACTIVE as MIRROR_ACTIVE
+from helpers.sysmon import system_sampler
+from helpers import metrics
+from helpers.media_tools import media_tools
+from helpers import checkpoint
+from helpers.checkpoint import get_job_journal, parse_chat_id, get_forward_chat_ids, get_destination_success
+from helpers.scheduler import scheduler, Job, SINGLE, RANGE, QUEUED, RUNNING
+
 from config import PyroConf
-from logger import LOGGER
+from logger import LOGGER, LOG_FILE, compress_log_tail
 
-# Initialize the bot client
-bot = Client(
+# Initialize the bot client (API calls are paced by the shared adaptive rate limiter)
+bot = ManagedClient(
     "media_bot",
     api_id=PyroConf.API_ID,
     api_hash=PyroConf.API_HASH,
@@ -40,10 +67,34 @@ bot = Client(
 )
 
 # Client for user session
-user = Client("user_session", workers=1000, session_string=PyroConf.SESSION_STRING)
+user = ManagedClient("user_session", workers=1000, session_string=PyroConf.SESSION_STRING)
+
+# Extra sessions/bots only transfer media, so they don't need to receive updates
+extra_users = [
+    ManagedClient(f"user_session_{i}", session_string=session_string, no_updates=True)
+    for i, session_string in enumerate(PyroConf.SESSION_STRINGS[1:], start=1)
+]
+extra_bots = [
+    ManagedClient(f"media_bot_{i}", api_id=PyroConf.API_ID, api_hash=PyroConf.API_HASH, bot_token=bot_token,
+                  no_updates=True, parse_mode=ParseMode.MARKDOWN)
+    for i, bot_token in enumerate(PyroConf.BOT_TOKENS[1:], start=1)
+]
+user_pool = ClientPool("users", [user, *extra_users])
+bot_pool = ClientPool("bots", [bot, *extra_bots])
+
+# Queue depths and in-flight work, read on every /metrics scrape
+metrics.registry.gauge("fwdbot_jobs_running", "Jobs currently running", lambda: len(scheduler.running))
+metrics.registry.gauge("fwdbot_jobs_queued", "Jobs waiting in the scheduler queue",
+                       lambda: sum(len(queue) for queue in scheduler.queues.values()))
+metrics.registry.gauge("fwdbot_spool_reserved_bytes", "Disk space reserved by running downloads", spool.reserved)
+metrics.registry.gauge("fwdbot_progress_edits_pending", "Status edits waiting to be sent",
+                       lambda: len(progress_reporter.pending))
+metrics.registry.gauge("fwdbot_media_tools_processes", "ffprobe/ffmpeg calls by state",
+                       lambda: {"running": media_tools.running, "queued": media_tools.queued}, ("state",))
+metrics.registry.gauge("fwdbot_pool_load", "Jobs leasing each pooled client",
+                       lambda: {(pool.name, m["name"]): m["load"] for pool in (user_pool, bot_pool) for m in pool.status()},
+                       ("pool", "client"))
 
-# Dictionary to track ongoing tasks per user
-ongoing_tasks = {}  # Key: user_id, Value: {"cancel": False, "message": status_message_object (optional), "flood_stop": False}
 
 
 @bot.on_message(filters.command("start") & filters.private)
@@ -63,14 +114,22 @@ async def help_command(_, message: Message):
         "1. Send the command `/dl post URL` to download media from a specific message.\n"
         "2. Send the command `/dl post_URL start_ID end_ID` to download a range of messages.\n"
         "3. Add a channel ID at the end to forward content: `/dl post_URL [end_ID] channel_ID`\n"
-        "4. Use `/cancel` to stop any ongoing download/forwarding task initiated by you.\n"
+        "   Several channels (comma-separated) get the content from a single download: `/dl post_URL [end_ID] ID1,ID2`\n"
+        "   Messages already sent to a chat are skipped, so re-running an overlapping range only sends new posts. Add `--resend` to send them again.\n"
+        "   Filter what gets sent: `--only video,photo`, `--min-size 5MB`, `--max-size 1G`, `--skip-text`, `--caption REGEX`, `--exclude-caption REGEX`.\n"
+        "4. Use `/cancel` to stop your running and queued tasks (or `/cancel task_ID` for one of them).\n"
+        "   Range jobs are checkpointed: `/resume` continues your last stopped one (or `/resume job_ID`).\n"
+        "   Tasks are queued when the bot is busy: `/queue` shows yours with their ETA, `/jobs` shows everyone's.\n"
+        "   `/mirror source destination_ID` keeps copying new posts of a chat (`/mirrors` lists them, `/unmirror ID` stops one).\n"
         "5. The bot will download the media (photos, videos, audio, or documents) or copy messages.\n"
         "6. Make sure the bot and the user client are part of the source chat to download the media.\n"
-        "7. **Flood Errors:** If the bot encounters repeated Telegram flood limits, the task will be automatically stopped.\n\n"
+        "7. **Flood Errors:** The bot slows down automatically on Telegram flood limits. A task is only stopped if Telegram asks for a very long wait.\n\n"
         "**Example (Single Post)**: `/dl https://t.me/itsSmartDev/547`\n"
         "**Example (Range)**: `/dl https://t.me/c/2572510647/120 150`\n"
         "**Example (Forward to Channel)**: `/dl https://t.me/c/2572510647/120 -1002694175455`\n"
-        "**Example (Range & Forward)**: `/dl https://t.me/c/2572510647/120 150 -1002694175455`"
+        "**Example (Range & Forward)**: `/dl https://t.me/c/2572510647/120 150 -1002694175455`\n"
+        "**Example (Range & Several Channels)**: `/dl https://t.me/c/2572510647/120 150 -1002694175455,-1002512345678`\n"
+        "**Example (Range, Videos Only)**: `/dl https://t.me/c/2572510647/120 150 --only video --min-size 10MB`"
     )
     await message.reply(help_text)
 
@@ -78,112 +137,423 @@ async def help_command(_, message: Message):
 @bot.on_message(filters.command("cancel") & filters.private)
 async def cancel_command(_, message: Message):
     user_id = message.from_user.id
-    if user_id in ongoing_tasks and not ongoing_tasks[user_id]["cancel"]:
-        ongoing_tasks[user_id]["cancel"] = True
-        await message.reply("**Attempting to cancel your ongoing task...**")
-        status_msg = ongoing_tasks[user_id].get("message")
-        if status_msg:
-            try:
-                await status_msg.edit("**⚠️ Task cancellation requested...**")
-            except Exception as e:
-                LOGGER(__name__).warning(f"Could not edit status message during cancel: {e}")
-    else:
+    job_id = None
+    if len(message.command) >= 2:
+        try:
+            job_id = int(message.command[1])
+        except ValueError:
+            await message.reply("**Invalid task ID. Use `/cancel` or `/cancel task_ID`.**")
+            return
+
+    dequeued, flagged = scheduler.cancel_user(user_id, job_id)
+    if not dequeued and not flagged:
         await message.reply("**You have no active task to cancel.**")
+        return
+    if dequeued:
+        await message.reply(f"**Removed {len(dequeued)} queued task(s).**")
+    if flagged:
+        await message.reply("**Attempting to cancel your ongoing task...**")
+    for job in flagged:
+        if job.message:
+            progress_reporter.update(job.message, "**⚠️ Task cancellation requested...**")
 
 
-async def handle_flood_wait(fw: FloodWait, user_id: int, message: Message, status_message: Message = None):
-    """Handles FloodWait exceptions by notifying the user and stopping the task."""
-    LOGGER(__name__).error(f"Flood wait encountered for user {user_id}: {fw}")
-    wait_time = fw.value
-    error_text = f"**🛑 Flood Limit Error!**\nTelegram requires a wait of {wait_time} seconds. The current task has been automatically stopped to prevent further issues. Please try again later."
-    
-    # Try editing status message first, then reply to original command message
-    if status_message:
-        try:
-            await status_message.edit(error_text)
-        except Exception:
-            await message.reply(error_text)
-    else:
-        await message.reply(error_text)
-        
-    # Mark task for cancellation/stop
-    if user_id in ongoing_tasks:
-        ongoing_tasks[user_id]["cancel"] = True
-        ongoing_tasks[user_id]["flood_stop"] = True # Mark specifically as flood stopped
+@bot.on_message(filters.command("queue") & filters.private)
+async def queue_command(_, message: Message):
+    jobs = scheduler.jobs_for(message.from_user.id)
+    if not jobs:
+        await message.reply("**You have no running or queued tasks.**")
+        return
+    lines = ["**🗂 Your Tasks**\n"]
+    for job in jobs:
+        eta = get_readable_time(scheduler.eta(job))
+        if job.state == QUEUED:
+            lines.append(f"**#{job.id}** `{job.description}`\n   Queued at position {scheduler.position(job)} | ETA: {eta}")
+        else:
+            lines.append(f"**#{job.id}** `{job.description}`\n   Running: {job.done}/{job.total} | ETA: {eta}")
+    await message.reply("\n".join(lines))
+
+
+@bot.on_message(filters.command("jobs") & filters.private)
+async def jobs_command(_, message: Message):
+    queued = scheduler.queued_order()
+    lines = [
+        "**📋 Bot Jobs**\n",
+        f"**Running:** {len(scheduler.running)}/{scheduler.max_concurrent} | **Queued:** {len(queued)}",
+    ]
+    for job in scheduler.running.values():
+        lines.append(f"▶️ #{job.id} {job.kind} — {job.done}/{job.total} | ETA: {get_readable_time(scheduler.eta(job))}")
+    for job in queued[:10]:
+        lines.append(f"🕒 #{job.id} {job.kind} — position {scheduler.position(job)} | ETA: {get_readable_time(scheduler.eta(job))}")
+    if len(queued) > 10:
+        lines.append(f"... and {len(queued) - 10} more")
+    await message.reply("\n".join(lines))
+
+
+async def run_job(job: Job, message: Message, chat_id, forward_chat_ids, work):
+    """Runs a job's work on pooled clients, reporting errors to the user like /dl always has.
+
+    ``work(user_client, upload_bot)`` gets a user session that can read ``chat_id`` and a bot that
+    can post to every chat in ``forward_chat_ids``. Without forward chats the files go to the user's
+    private chat, which only the main bot can write to.
+    """
+    user_id = job.user_id
+    try:
+        async with user_pool.lease(chat_id) as user_client, bot_pool.lease(*forward_chat_ids) as upload_bot:
+            await work(user_client, upload_bot)
+    except FloodWait as fw:
+        # Catch flood wait during initial setup
+        await handle_flood_wait(fw, job, message)
+    except (PeerIdInvalid, BadRequest, KeyError):
+        await message.reply("**Make sure the user client is part of the chat.**")
+    except Exception as e:
+        error_message = f"**❌ An error occurred: {str(e)}**"
+        await message.reply(error_message)
+        LOGGER(__name__).error(f"Error in job {job.id} for user {user_id}: {e}", exc_info=True)
+
+
+async def submit_job(job: Job, message: Message):
+    """Hands a job to the scheduler and tells the user if it has to wait."""
+    try:
+        scheduler.submit(job)
+    except ValueError as e:
+        await message.reply(f"**{e}**")
+        return
+    if job.state == QUEUED:
+        await message.reply(
+            f"**🕒 Task #{job.id} queued at position {scheduler.position(job)} "
+            f"(ETA: {get_readable_time(scheduler.eta(job))}). Use /queue to follow it.**"
+        )
 
 
 @bot.on_message(filters.command("dl") & filters.private)
 async def download_media(bot: Client, message: Message):
     user_id = message.from_user.id
 
-    if user_id in ongoing_tasks:
-        await message.reply("**You already have an ongoing task. Please wait for it to complete or use /cancel.**")
-        return
-
     if len(message.command) < 2:
         await message.reply("**Provide a post URL after the /dl command. Use /help for details.**")
         return
 
     post_url = message.command[1]
     end_message_id = None
-    forward_chat_id = None
 
-    # Parse arguments: URL [End_ID] [Forward_ID]
-    if len(message.command) >= 3:
+    # Parse arguments: URL [End_ID] [Forward_ID[,Forward_ID...] ...] [--resend] [filter options]
+    args = message.command[2:]
+    resend = "--resend" in args
+    args = [arg for arg in args if arg != "--resend"]
+    try:
+        message_filter, args = MessageFilter.parse(args)
+    except ValueError as e:
+        await message.reply(f"**❌ {e}. Use /help for the /dl options.**")
+        return
+    if args and args[0].isdigit():
+        end_message_id = int(args.pop(0))
+    try:
+        forward_chat_ids = parse_destination_ids(args)
+    except ValueError:
+        await message.reply("**Invalid End Message ID or Forward Channel ID. Please provide valid numbers.**")
+        return
+
+    if forward_chat_ids:
+         LOGGER(__name__).info(f"Content will be forwarded to channel/group IDs: {forward_chat_ids}")
+
+    try:
+        chat_id, start_message_id = getChatMsgID(post_url)
+    except Exception as e:
+        await message.reply(f"**❌ An error occurred: {str(e)}**")
+        return
+
+    if end_message_id is None:
+        async def work(user_client, upload_bot):
+            await download_single_message(upload_bot, message, user_client, chat_id, start_message_id, forward_chat_ids, job)
+
+        job = Job(user_id, SINGLE, post_url, lambda job: run_job(job, message, chat_id, forward_chat_ids, work))
+    else:
+        async def work(user_client, upload_bot):
+            await download_message_range(upload_bot, message, user_client, chat_id, start_message_id, end_message_id,
+                                         forward_chat_ids, job)
+
+        job = Job(user_id, RANGE, f"{post_url} → {end_message_id}", lambda job: run_job(job, message, chat_id, forward_chat_ids, work),
+                  total=end_message_id - start_message_id + 1)
+    job.resend = resend
+    if message_filter:
+        job.filter = message_filter
+        job.description += f" ({message_filter.describe()})"
+    await submit_job(job, message)
+
+@bot.on_message(filters.command("resume") & filters.private)
+async def resume_command(bot: Client, message: Message):
+    user_id = message.from_user.id
+
+    journal_id = None
+    if len(message.command) >= 2:
         try:
-            potential_id = int(message.command[2])
-            if potential_id < 0:
-                forward_chat_id = potential_id
-            else:
-                end_message_id = potential_id
+            journal_id = int(message.command[1])
         except ValueError:
-            await message.reply("**Invalid End Message ID or Forward Channel ID. Please provide valid numbers.**")
+            await message.reply("**Invalid job ID. Use `/resume` or `/resume job_ID`.**")
             return
 
-    if len(message.command) >= 4:
+    journal_job = get_job_journal().get_resumable(user_id, journal_id)
+    if not journal_job:
+        await message.reply("**No interrupted range job to resume.**")
+        return
+    if any(job.journal_id == journal_job["job_id"] for job in scheduler.jobs_for(user_id)):
+        await message.reply(f"**Job #{journal_job['job_id']} is already running or queued.**")
+        return
+    await resume_range_job(bot, message, user_id, journal_job)
+
+
+async def resume_range_job(bot: Client, message: Message, user_id, journal_job):
+    """Queues a journaled range job to continue from the message after its last checkpoint."""
+    journal_id = journal_job["job_id"]
+    resume_from = (journal_job["last_committed_id"] or journal_job["start_id"] - 1) + 1
+    end_id = journal_job["end_id"]
+    if resume_from > end_id:
+        get_job_journal().set_status(journal_id, checkpoint.COMPLETED)
+        await message.reply(f"**Job #{journal_id} had already reached its last message.**")
+        return
+
+    LOGGER(__name__).info(f"Resuming range job {journal_id} for user {user_id} from message {resume_from}")
+    chat_id = parse_chat_id(journal_job["chat_id"])
+    forward_chat_ids = get_forward_chat_ids(journal_job)
+
+    async def work(user_client, upload_bot):
+        await download_message_range(upload_bot, message, user_client, chat_id, resume_from, end_id, forward_chat_ids, job,
+                                     journal_id=journal_id)
+
+    job = Job(user_id, RANGE, f"resume job #{journal_id} from {resume_from}", lambda job: run_job(job, message, chat_id, forward_chat_ids, work),
+              total=end_id - resume_from + 1)
+    job.journal_id = journal_id
+    job.filter = MessageFilter.from_json(journal_job["filters"])
+    await submit_job(job, message)
+
+
+async def resume_interrupted_jobs():
+    """Restarts range jobs that were still running when the bot last stopped."""
+    journal = get_job_journal()
+    for journal_job in journal.get_interrupted():
+        if journal_job["mirror_id"]:
+            # The mirror's next poll syncs again from its high-water mark (delivered posts are skipped)
+            journal.set_status(journal_job["job_id"], checkpoint.CANCELLED)
+            continue
+        user_id = journal_job["user_id"]
         try:
-            if end_message_id is not None:
-                 forward_chat_id = int(message.command[3])
-            else:
-                 await message.reply("**Invalid command structure. Use /help for details.**")
-                 return
-        except (ValueError, IndexError):
-            await message.reply("**Invalid Forward Channel ID. Please provide a valid number.**")
-            return
+            notice = await bot.send_message(user_id, f"**🔁 Resuming job #{journal_job['job_id']} interrupted by a restart...**")
+        except Exception as e:
+            LOGGER(__name__).warning(f"Could not notify user {user_id} about resuming job {journal_job['job_id']}: {e}")
+            continue
+        await resume_range_job(bot, notice, user_id, journal_job)
+
+
+# --- Mirrors ---
+
+mirror_jobs = {}  # mirror_id -> sync Job running or queued for it
+
+
+def mirror_syncing(mirror_id: int) -> bool:
+    """Whether a sync job of the mirror is still queued or running (a /cancel dequeues it without running it)."""
+    job = mirror_jobs.get(mirror_id)
+    if job and job.state in (QUEUED, RUNNING):
+        return True
+    mirror_jobs.pop(mirror_id, None)
+    return False
+
+
+def parse_mirror_source(value: str) -> tuple:
+    """``(chat_id, message_id)`` of a /mirror source: a post link, whose message is where mirroring
+    starts, or a chat ID / @username (message_id None)."""
+    if "t.me/" in value:
+        return getChatMsgID(value if value.startswith("http") else f"https://{value}")
+    return parse_chat_id(value.lstrip("@")), None
+
+
+async def get_latest_message_id(user: Client, chat_id) -> int:
+    async for chat_message in user.get_chat_history(chat_id, limit=1):
+        return chat_message.id
+    return 0
+
+
+async def find_undelivered(user: Client, chat_id, mirror) -> list:
+    """Backfill check: IDs of mirrored posts (newest first, up to MIRROR_BACKFILL_LIMIT) that the
+    delivery index has no record of, e.g. because their sync failed."""
+    index = get_delivery_index()
+    if not index:
+        return []
+    history = []
+    async for chat_message in user.get_chat_history(chat_id, limit=PyroConf.MIRROR_BACKFILL_LIMIT,
+                                                    offset_id=mirror["high_water"] + 1, min_id=mirror["start_id"]):
+        if not chat_message.empty and not chat_message.service and chat_message.id >= mirror["start_id"]:
+            history.append(chat_message)
+    delivered = index.delivered_messages(history, [mirror["destination"]])
+    return [m.id for m in history if m.id not in delivered]
 
-    if forward_chat_id:
-         LOGGER(__name__).info(f"Content will be forwarded to channel/group ID: {forward_chat_id}")
 
+async def start_mirror_sync(mirror, start_id: int, end_id: int, advance: bool = True):
+    """Queues a range job delivering messages ``start_id``..``end_id`` of a mirror's source.
+
+    With ``advance`` the mirror's high-water mark follows the job: to ``end_id`` when it completes,
+    to its last checkpoint otherwise. Backfills don't move it.
+    """
+    mirror_id, user_id, destination = mirror["mirror_id"], mirror["user_id"], mirror["destination"]
+    chat_id = parse_chat_id(mirror["source_chat"])
+    store = get_mirror_store()
     try:
-        chat_id, start_message_id = getChatMsgID(post_url)
+        notice = await bot.send_message(user_id, f"**🪞 Mirror #{mirror_id}: syncing messages {start_id} to {end_id}...**")
+    except Exception as e:
+        LOGGER(__name__).warning(f"Could not notify user {user_id} about mirror {mirror_id}: {e}")
+        store.set_error(mirror_id, str(e))
+        return
 
-        # Initialize task tracking
-        ongoing_tasks[user_id] = {"cancel": False, "message": None, "flood_stop": False}
+    async def work(user_client, upload_bot):
+        await download_message_range(upload_bot, notice, user_client, chat_id, start_id, end_id, [destination], job,
+                                     mirror_id=mirror_id)
+
+    async def runner(job):
+        try:
+            await run_job(job, notice, chat_id, [destination], work)
+        finally:
+            mirror_jobs.pop(mirror_id, None)
+            journal_job = get_job_journal().get(job.journal_id) if job.journal_id else None
+            if not journal_job:
+                store.set_error(mirror_id, "Sync could not start")
+            elif advance and journal_job["status"] == checkpoint.COMPLETED:
+                store.advance(mirror_id, end_id)
+            elif advance and journal_job["last_committed_id"]:
+                store.advance(mirror_id, journal_job["last_committed_id"])
+            try: await notice.delete() # The range status message below it keeps the result
+            except Exception: pass
+
+    job = Job(user_id, RANGE, f"mirror #{mirror_id}: {start_id} → {end_id}", runner, total=end_id - start_id + 1)
+    mirror_jobs[mirror_id] = job
+    await submit_job(job, notice)
+    if job not in scheduler.jobs_for(user_id):
+        mirror_jobs.pop(mirror_id, None) # Rejected (queue full); retried at the next poll
+
+
+async def poll_mirror(mirror):
+    """Syncs a mirror's new posts, or runs its backfill check when it is due and nothing is new."""
+    mirror_id = mirror["mirror_id"]
+    chat_id = parse_chat_id(mirror["source_chat"])
+    backfill_due = PyroConf.MIRROR_BACKFILL_INTERVAL and \
+        time() - (mirror["last_backfill"] or mirror["created"]) >= PyroConf.MIRROR_BACKFILL_INTERVAL
+    missing = []
+    async with user_pool.lease(chat_id) as user_client:
+        latest_id = await get_latest_message_id(user_client, chat_id)
+        if latest_id <= mirror["high_water"] and backfill_due:
+            missing = await find_undelivered(user_client, chat_id, mirror)
+    if latest_id > mirror["high_water"]:
+        await start_mirror_sync(mirror, mirror["high_water"] + 1, latest_id)
+        return
+    get_mirror_store().advance(mirror_id, latest_id) # Nothing new; records the poll
+    if backfill_due:
+        get_mirror_store().set_backfilled(mirror_id)
+        if missing:
+            LOGGER(__name__).info(f"Mirror {mirror_id} backfill found {len(missing)} undelivered messages")
+            await start_mirror_sync(mirror, min(missing), max(missing), advance=False)
+
+
+async def poll_mirrors():
+    """Background loop polling every active mirror that has no sync running."""
+    while True:
+        store = get_mirror_store()
+        for mirror in store.active():
+            if mirror_syncing(mirror["mirror_id"]):
+                continue
+            try:
+                await poll_mirror(mirror)
+            except FloodWait as fw:
+                LOGGER(__name__).warning(f"FloodWait of {fw.value}s polling mirror {mirror['mirror_id']}")
+                store.set_error(mirror["mirror_id"], f"FloodWait of {fw.value}s")
+            except Exception as e:
+                LOGGER(__name__).warning(f"Could not poll mirror {mirror['mirror_id']}: {e}")
+                store.set_error(mirror["mirror_id"], str(e))
+        await asyncio.sleep(PyroConf.MIRROR_POLL_INTERVAL)
 
-        if end_message_id is None:
-            await download_single_message(bot, message, user, chat_id, start_message_id, forward_chat_id, user_id)
-        else:
-            await download_message_range(bot, message, user, chat_id, start_message_id, end_message_id, forward_chat_id, user_id)
 
+@bot.on_message(filters.command("mirror") & filters.private)
+async def mirror_command(_, message: Message):
+    user_id = message.from_user.id
+    if len(message.command) < 3:
+        await message.reply("**Usage: `/mirror <source> <destination ID>`**\n"
+                            "The source is a chat ID, @username or a post link to start from.")
+        return
+    try:
+        source_chat, from_id = parse_mirror_source(message.command[1])
+        destination = int(message.command[2])
+    except ValueError as e:
+        await message.reply(f"**❌ Invalid source or destination: {e}**")
+        return
+
+    store = get_mirror_store()
+    existing = store.find_active(source_chat, destination)
+    if existing:
+        await message.reply(f"**Mirror #{existing['mirror_id']} already copies this chat there.**")
+        return
+    try:
+        async with user_pool.lease(source_chat) as user_client:
+            latest_id = await get_latest_message_id(user_client, source_chat)
     except FloodWait as fw:
-        # Catch flood wait during initial setup (e.g., getChatMsgID if it uses API)
-        await handle_flood_wait(fw, user_id, message)
-    except (PeerIdInvalid, BadRequest, KeyError):
-        await message.reply("**Make sure the user client is part of the chat.**")
+        await message.reply(f"**⏳ Telegram asked to wait {fw.value}s. Try again later.**")
+        return
     except Exception as e:
-        error_message = f"**❌ An error occurred: {str(e)}**"
-        await message.reply(error_message)
-        LOGGER(__name__).error(f"Error in /dl command for user {user_id}: {e}", exc_info=True)
-    finally:
-        # Clean up task tracking only if it exists
-        if user_id in ongoing_tasks:
-            del ongoing_tasks[user_id]
+        LOGGER(__name__).info(f"Could not read chat {source_chat} for a mirror of user {user_id}: {e}")
+        await message.reply("**Make sure the user client is part of the chat.**")
+        return
+
+    high_water = from_id - 1 if from_id else latest_id
+    mirror_id = store.create(user_id, source_chat, destination, high_water)
+    await message.reply(
+        f"**🪞 Mirror #{mirror_id} created: posts of `{source_chat}` after message {high_water} are copied to "
+        f"`{destination}`, checked every {get_readable_time(PyroConf.MIRROR_POLL_INTERVAL)}.**\n"
+        "**Use /mirrors to list your mirrors and `/unmirror ID` to stop one.**"
+    )
+    if latest_id > high_water:
+        await start_mirror_sync(store.get(mirror_id), high_water + 1, latest_id)
+
+
+@bot.on_message(filters.command("mirrors") & filters.private)
+async def mirrors_command(_, message: Message):
+    mirrors = get_mirror_store().for_user(message.from_user.id)
+    if not mirrors:
+        await message.reply("**You have no mirrors. Create one with `/mirror <source> <destination ID>`.**")
+        return
+    lines = ["**🪞 Your Mirrors**\n"]
+    for mirror in mirrors:
+        state = "syncing" if mirror_syncing(mirror["mirror_id"]) else "idle"
+        last_poll = f"{get_readable_time(time() - mirror['last_sync'])} ago" if mirror["last_sync"] else "never"
+        lines.append(f"**#{mirror['mirror_id']}** `{mirror['source_chat']}` → `{mirror['destination']}`\n"
+                     f"   Up to message {mirror['high_water']} | Last check: {last_poll} | {state}")
+        if mirror["last_error"]:
+            lines.append(f"   ⚠️ {mirror['last_error']}")
+    await message.reply("\n".join(lines))
+
+
+@bot.on_message(filters.command("unmirror") & filters.private)
+async def unmirror_command(_, message: Message):
+    user_id = message.from_user.id
+    try:
+        mirror_id = int(message.command[1])
+    except (IndexError, ValueError):
+        await message.reply("**Usage: `/unmirror ID` (see /mirrors).**")
+        return
+    store = get_mirror_store()
+    mirror = store.get(mirror_id)
+    if not mirror or mirror["user_id"] != user_id or mirror["status"] != MIRROR_ACTIVE:
+        await message.reply(f"**You have no mirror #{mirror_id}.**")
+        return
+    store.stop(mirror_id)
+    job = mirror_jobs.pop(mirror_id, None)
+    if job:
+        scheduler.cancel_user(user_id, job.id)
+    await message.reply(f"**🪞 Mirror #{mirror_id} stopped.**")
 
-async def download_single_message(bot: Client, message: Message, user: Client, chat_id, message_id, forward_chat_id, user_id):
-    if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+
+async def download_single_message(bot: Client, message: Message, user: Client, chat_id, message_id, forward_chat_ids, job: Job):
+    user_id = job.user_id
+    if job.cancel:
         LOGGER(__name__).info(f"Task cancelled by user {user_id} before processing message {message_id}")
         # Don't send another message if it was a flood stop
-        if not ongoing_tasks[user_id].get("flood_stop", False):
+        if not job.flood_stop:
             await message.reply("**Task cancelled.**")
         return False
         
@@ -193,18 +563,47 @@ async def download_single_message(bot: Client, message: Message, user: Client, c
             await message.reply(f"**Message with ID {message_id} not found.**")
             return False
 
+        album = None
+        if chat_message.media_group_id:
+            album = await chat_message.get_media_group()
+            if job.filter:
+                album = job.filter.filter_album(album)
+        if job.filter and not (album if chat_message.media_group_id else job.filter.matches(chat_message)):
+            job.done = 1
+            await message.reply(f"**Message {message_id} doesn't match the filters ({job.filter.describe()}).**")
+            return True
+
+        index = None if job.resend else get_delivery_index()
+        source_messages = album or [chat_message]
+        if index and len(index.delivered_messages(source_messages, forward_chat_ids or [message.chat.id])) == len(source_messages):
+            job.done = 1
+            await message.reply(f"**Message {message_id} was already delivered. Add `--resend` to send it again.**")
+            return True
+
         LOGGER(__name__).info(f"Processing single message ID: {message_id} for user {user_id}")
-        return await process_message(bot, message, user, chat_message, forward_chat_id, user_id)
+        results = await deliver_message(bot, message, user, chat_message, forward_chat_ids, job, album=album)
+        job.done = 1
+        if len(results) > 1 and not all(results.values()) and any(results.values()):
+            await message.reply(f"**⚠️ Delivered to {sum(results.values())}/{len(results)} destinations.**\n"
+                                + format_destination_counts({d: int(ok) for d, ok in results.items()}))
+        return all(results.values())
         
     except FloodWait as fw:
-        await handle_flood_wait(fw, user_id, message)
+        await handle_flood_wait(fw, job, message)
         return False # Indicate failure due to flood wait
     except Exception as e:
         LOGGER(__name__).error(f"Error downloading single message {message_id} for user {user_id}: {str(e)}")
         await message.reply(f"**Error processing message {message_id}: {str(e)}**")
         return False
 
-async def download_message_range(bot: Client, message: Message, user: Client, chat_id, start_id, end_id, forward_chat_id, user_id):
+async def download_message_range(bot: Client, message: Message, user: Client, chat_id, start_id, end_id, forward_chat_ids, job: Job, journal_id=None,
+                                 mirror_id=None):
+    """Processes a message ID range, checkpointing progress in the job journal.
+
+    Pass ``journal_id`` to continue a journaled job; ``start_id`` is then the first uncommitted ID.
+    ``mirror_id`` marks the journal entry of a mirror sync.
+    """
+    user_id = job.user_id
     if start_id > end_id:
         await message.reply("**Start message ID must be less than or equal to end message ID.**")
         return
@@ -212,99 +611,164 @@ async def download_message_range(bot: Client, message: Message, user: Client, ch
     status_message = None
     try:
         status_message = await message.reply(f"**📥 Preparing to download messages from {start_id} to {end_id}...**")
-        if user_id in ongoing_tasks:
-            ongoing_tasks[user_id]["message"] = status_message
+        job.message = status_message
     except FloodWait as fw_status:
         # Handle flood wait even when sending the initial status message
-        await handle_flood_wait(fw_status, user_id, message)
+        await handle_flood_wait(fw_status, job, message)
         return # Stop the task immediately
     except Exception as e_status:
         LOGGER(__name__).error(f"Error sending initial status message for user {user_id}: {e_status}")
         await message.reply(f"**Error starting task: {e_status}**")
-        # Ensure task is marked as stopped if it was created
-        if user_id in ongoing_tasks:
-             ongoing_tasks[user_id]["cancel"] = True 
+        # Ensure task is marked as stopped
+        job.cancel = True
         return
 
-    success_count = 0
-    failed_count = 0
+    journal = get_job_journal()
+    if journal_id is None:
+        journal_id = journal.create(user_id, chat_id, start_id, end_id, forward_chat_ids,
+                                    job.filter.to_json() if job.filter else None, mirror_id)
+        success_count = 0
+        failed_count = 0
+        destination_success = {}
+    else:
+        journal_job = journal.get(journal_id)
+        success_count = journal_job["success"]
+        failed_count = journal_job["failed"]
+        destination_success = get_destination_success(journal_job)
+        journal.set_status(journal_id, checkpoint.RUNNING)
+    for destination in forward_chat_ids:
+        destination_success.setdefault(destination, 0)
+    job.journal_id = journal_id
     skipped_count = 0
     cancelled = False # Tracks user cancel or flood stop
+    # Messages already delivered to every destination are dropped in the fetch stage
+    index = None if job.resend else get_delivery_index()
 
-    for msg_id in range(start_id, end_id + 1):
-        # Check for cancellation/stop at the start of each iteration
-        if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
-            LOGGER(__name__).info(f"Task stopped/cancelled by user {user_id} during range processing at message {msg_id}")
-            cancelled = True
-            break
-            
-        try:
-            # Fetch message
-            chat_message = await user.get_messages(chat_id=chat_id, message_ids=msg_id)
+    async def download_stage(chat_message):
+        return await predownload_media(chat_message, bot, user, job)
 
-            if not chat_message:
-                LOGGER(__name__).info(f"Message {msg_id} not found, skipping.")
-                skipped_count += 1
-                await asyncio.sleep(0.5) # Shorter sleep for skipped messages
-                continue
+    # Fetch stage -> download stage (DOWNLOAD_WORKERS concurrent downloads) -> in-order upload loop below
+    try:
+        async with RangePrefetcher(user, chat_id, start_id, end_id, delivery_index=index,
+                                   destinations=forward_chat_ids or [message.chat.id],
+                                   message_filter=job.filter) as prefetcher, \
+                OrderedPipeline(prefetcher, download_stage, workers=PyroConf.DOWNLOAD_WORKERS,
+                                buffer_size=PyroConf.PIPELINE_BUFFER, discard=remove_file) as pipeline:
+            stage_started = monotonic()
+            async for chat_message, media_path in pipeline:
+                # Time spent waiting for the fetch/download stages to hand over the next message
+                metrics.range_stage_seconds.observe(monotonic() - stage_started, stage="wait")
+                msg_id = chat_message.id
+                job.done = msg_id - start_id + 1
+                # Check for cancellation/stop at the start of each iteration
+                if job.cancel:
+                    LOGGER(__name__).info(f"Task stopped/cancelled by user {user_id} during range processing at message {msg_id}")
+                    remove_file(media_path)
+                    cancelled = True
+                    break
 
-            LOGGER(__name__).info(f"Processing message ID: {msg_id} in range for user {user_id}")
+                # IDs of batches that failed to fetch are journaled before the checkpoint moves past them
+                failed_ids = prefetcher.pop_failed(msg_id)
+                if failed_ids:
+                    failed_count += len(failed_ids)
+                    journal.commit(journal_id, failed_ids, "failed", success_count, failed_count)
 
-            # Update status periodically
-            if msg_id % 10 == 0 or msg_id == start_id: # Update less frequently
-                if cancelled: break
+                unit_ids = [msg_id]
                 try:
-                    await status_message.edit(
+                    LOGGER(__name__).info(f"Processing message ID: {msg_id} in range for user {user_id}",
+                                          extra={"job_id": job.id, "chat_id": chat_id, "message_id": msg_id})
+
+                    # Update status (the reporter only sends the latest text, at its own pace)
+                    progress_reporter.update(
+                        status_message,
                         f"**📥 Downloading messages {start_id} to {end_id}...**\n"
                         f"**Current: {msg_id}/{end_id}**\n"
-                        f"**Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count}**"
+                        f"**Success: {success_count} | Failed: {failed_count} | Skipped: {prefetcher.skipped}**"
+                        + (f"\n**Already sent: {prefetcher.delivered}**" if prefetcher.delivered else "")
+                        + (f"\n**Filtered out: {prefetcher.filtered}**" if prefetcher.filtered else "")
                     )
-                except FloodWait as fw_edit:
-                    # If editing status message gets flood waited, log it but continue the main task
-                    LOGGER(__name__).warning(f"Flood wait editing status message for user {user_id}: {fw_edit}. Pausing edit.")
-                    await asyncio.sleep(fw_edit.value + 2)
-                except Exception as edit_err:
-                    LOGGER(__name__).warning(f"Could not edit status message for user {user_id}: {edit_err}")
-
-            # Process message
-            if cancelled: break
-            result = await process_message(bot, message, user, chat_message, forward_chat_id, user_id)
-            
-            # Check if process_message caused a flood stop
-            if user_id in ongoing_tasks and ongoing_tasks[user_id].get("flood_stop", False):
-                 LOGGER(__name__).info(f"Flood stop detected after process_message for user {user_id} at msg {msg_id}")
-                 cancelled = True
-                 break # Exit loop immediately after flood stop
-                 
-            if result:
-                success_count += 1
-            else:
-                # If process_message returned False but wasn't a flood stop, count as failed/skipped
-                failed_count += 1
-            
-            # Check cancellation status again before sleeping
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
-                cancelled = True
-                break
-                
-            await asyncio.sleep(PyroConf.SLEEP_TIMER) # Use configured sleep timer
 
-        except FloodWait as fw:
-            await handle_flood_wait(fw, user_id, message, status_message)
-            cancelled = True # Mark as cancelled to stop the loop
-            break # Exit loop immediately
-        except Exception as e:
-            LOGGER(__name__).error(f"Error processing message {msg_id} in range for user {user_id}: {str(e)}")
-            failed_count += 1
-            await asyncio.sleep(2) # Short sleep on general error
-            continue # Continue to next message if possible
+                    # Process message (albums arrive once, as their first member)
+                    album = None
+                    if chat_message.media_group_id:
+                        album_members, album_complete = prefetcher.pop_album(chat_message.media_group_id)
+                        unit_ids = [m.id for m in album_members] or unit_ids
+                        album = album_members if album_complete else None
+                    deliver_started = monotonic()
+                    results = await deliver_message(bot, message, user, chat_message, forward_chat_ids, job, media_path, album)
+                    metrics.range_stage_seconds.observe(monotonic() - deliver_started, stage="deliver")
+                    result = all(results.values())
+                    for destination, delivered in results.items():
+                        if delivered and destination is not None:
+                            destination_success[destination] += 1
+
+                    # Check if process_message caused a flood stop
+                    if job.flood_stop:
+                         LOGGER(__name__).info(f"Flood stop detected after process_message for user {user_id} at msg {msg_id}")
+                         cancelled = True
+                         break # Exit loop immediately after flood stop
+
+                    if result:
+                        success_count += 1
+                    else:
+                        # If process_message returned False but wasn't a flood stop, count as failed/skipped
+                        failed_count += 1
+                    commit_started = monotonic()
+                    journal.commit(journal_id, unit_ids, "success" if result else "failed", success_count, failed_count,
+                                   destination_success)
+                    metrics.range_stage_seconds.observe(monotonic() - commit_started, stage="commit")
+
+                    # Check cancellation status again before the next message
+                    if job.cancel:
+                        cancelled = True
+                        break
+                    stage_started = monotonic()
+
+                except FloodWait as fw:
+                    await handle_flood_wait(fw, job, message, status_message)
+                    cancelled = True # Mark as cancelled to stop the loop
+                    break # Exit loop immediately
+                except Exception as e:
+                    LOGGER(__name__).error(f"Error processing message {msg_id} in range for user {user_id}: {str(e)}")
+                    failed_count += 1
+                    journal.commit(journal_id, unit_ids, "failed", success_count, failed_count)
+                    await asyncio.sleep(2) # Short sleep on general error
+                    stage_started = monotonic()
+                    continue # Continue to next message if possible
+
+    except FloodWait as fw_fetch:
+        # Flood wait while prefetching a batch of messages or pre-downloading media
+        await handle_flood_wait(fw_fetch, job, message, status_message)
+        cancelled = True
+
+    # Unfetched IDs past the last processed message; a stopped job retries them on /resume
+    failed_ids = prefetcher.pop_failed() if not cancelled else []
+    if failed_ids:
+        failed_count += len(failed_ids)
+        journal.commit(journal_id, failed_ids, "failed", success_count, failed_count)
+    skipped_count = prefetcher.skipped
+    metrics.messages_processed.inc(prefetcher.failed, kind="fetch", outcome="failed")
+    metrics.messages_processed.inc(prefetcher.skipped, kind="fetch", outcome="skipped")
+    metrics.messages_processed.inc(prefetcher.delivered, kind="fetch", outcome="already_delivered")
+    metrics.messages_processed.inc(prefetcher.filtered, kind="fetch", outcome="filtered")
+
+    is_flood_stop = job.flood_stop
+    journal.set_status(journal_id, checkpoint.STOPPED if is_flood_stop else (checkpoint.CANCELLED if cancelled else checkpoint.COMPLETED))
+    resume_hint = f"\n**Use `/resume {journal_id}` to continue where it stopped.**" if cancelled else ""
 
     # Final status update
     if status_message:
-        is_flood_stop = ongoing_tasks.get(user_id, {}).get("flood_stop", False)
         final_prefix = "🛑 Task Stopped (Flood Error)" if is_flood_stop else ("⚠️ Task Cancelled" if cancelled else "✅ Task Completed")
         final_text = f"**{final_prefix} for messages {start_id} to {end_id}**\n"
         final_text += f"**Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count}**"
+        if prefetcher.delivered:
+            final_text += f"\n**Already sent before: {prefetcher.delivered}**"
+        if prefetcher.filtered:
+            final_text += f"\n**Filtered out: {prefetcher.filtered}**"
+        if len(forward_chat_ids) > 1:
+            final_text += "\n" + format_destination_counts(destination_success)
+        final_text += resume_hint
+        progress_reporter.discard(status_message)
         try:
             await status_message.edit(final_text)
         except Exception as final_edit_err:
@@ -314,21 +778,196 @@ async def download_message_range(bot: Client, message: Message, user: Client, ch
                  await message.reply(final_text)
     elif cancelled:
          # If status message failed initially but task was cancelled later
-         is_flood_stop = ongoing_tasks.get(user_id, {}).get("flood_stop", False)
          if not is_flood_stop:
-              await message.reply(f"**⚠️ Task Cancelled for messages {start_id} to {end_id}**\n**Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count}**")
+              await message.reply(f"**⚠️ Task Cancelled for messages {start_id} to {end_id}**\n**Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count}**{resume_hint}")
+
+def format_destination_counts(destination_counts: dict) -> str:
+    return "\n".join(f"**→ `{destination}`: {count}**" for destination, count in destination_counts.items())
+
+
+async def deliver_message(bot: Client, message: Message, user: Client, chat_message, forward_chat_ids, job: Job, media_path=None, album=None) -> dict:
+    """Sends a source message to every destination while transferring its media only once.
+
+    The first destination that accepts it gets it through process_message; the others get the
+    delivered messages re-sent by file_id. Destinations the delivery index lists as already
+    having the message are skipped and count as delivered. Album members are checked one by one:
+    a destination missing only some items gets just those. Returns ``{destination: delivered}``,
+    where the destination None stands for the user's own chat.
+    """
+    index = None if job.resend else get_delivery_index()
+    if chat_message.media_group_id and album is None:
+        album = await chat_message.get_media_group()
+        if job.filter:
+            album = job.filter.filter_album(album)
+        if not album:
+            LOGGER(__name__).info(f"No item of media group {chat_message.media_group_id} is left to send")
+            return {destination: True for destination in forward_chat_ids or [None]}
+    source_messages = album or [chat_message]
+    # Albums a filter may have thinned can't be copied whole
+    thinned = bool(album) and bool(job.filter and job.filter.selects_items)
+    results = {}
+    deliveries = None # (source, sent) pairs of the last process_message call
+    sent_ids = None # Source IDs that call was given
+    for destination in forward_chat_ids or [None]:
+        target_chat_id = destination if destination is not None else message.chat.id
+        if job.cancel:
+            results[destination] = False
+            continue
+        pending = source_messages
+        if index:
+            delivered = index.delivered_messages(source_messages, [target_chat_id])
+            pending = [m for m in source_messages if m.id not in delivered]
+        if not pending:
+            metrics.delivery_paths.inc(path="already_delivered")
+            results[destination] = True
+            LOGGER(__name__).info(f"Message {chat_message.id} was already delivered to {target_chat_id}, skipping")
+            continue
+        pending_ids = [m.id for m in pending]
+        if sent_ids != pending_ids:
+            # First delivery, or a destination missing other album items than the one before
+            partial = thinned or len(pending) < len(source_messages)
+            deliveries = await process_message(bot, message, user, chat_message, destination, job, media_path,
+                                               pending if album else None, partial)
+            media_path = None # process_message removes the pre-downloaded file
+            sent_ids = pending_ids if deliveries else None
+            results[destination] = bool(deliveries)
+            if deliveries and index:
+                index.record(deliveries, target_chat_id)
+            continue
+        try:
+            # Only what reached the first destination is passed on, so unsent items stay pending everywhere
+            copies = await send_copies(bot, [sent for _, sent in deliveries], destination)
+            metrics.delivery_paths.inc(path="fanout_copy")
+            results[destination] = True
+            if index:
+                index.record(list(zip([source for source, _ in deliveries], copies)), target_chat_id)
+            LOGGER(__name__).info(f"Sent copy of message {chat_message.id} to {destination} for user {job.user_id}")
+        except FloodWait as fw:
+            await handle_flood_wait(fw, job, message)
+            results[destination] = False
+        except Exception as e:
+            LOGGER(__name__).error(f"Could not send message {chat_message.id} to {destination} for user {job.user_id}: {e}")
+            results[destination] = False
+    remove_file(media_path) # Pre-downloaded for destinations that all turned out to have it
+    return results
+
+
+async def predownload_media(chat_message: Message, bot: Client, user: Client, job: Job):
+    """Download stage of the range pipeline: fetches single-media messages to disk ahead of upload.
+
+    Returns the downloaded path, or None when process_message should handle the message on its
+    own (text, media groups, server-side copies, cached files, oversize files, download errors).
+    """
+    if not chat_message.media or chat_message.media_group_id:
+        return None
+    if job.cancel:
+        return None
+    if can_copy_fast(bot, chat_message, job):
+        return None
+    if (getattr(get_message_media(chat_message), "file_size", 0) or 0) > get_max_file_size(user.me.is_premium):
+        return None
+    if get_cached_file_id(bot, chat_message):
+        return None
+    if should_stream(chat_message):
+        return None  # Streamed straight into the upload by process_message
+    try:
+        return await download_message(chat_message, owner=job.id, ahead=True)
+    except FloodWait:
+        raise
+    except Exception as e:
+        LOGGER(__name__).warning(f"Pre-download of message {chat_message.id} failed for user {job.user_id}: {e}. Retrying during upload.")
+        return None
+
 
-async def process_message(bot: Client, message: Message, user: Client, chat_message, forward_chat_id, user_id):
-    media_path = None
+# (bot id, source chat id) pairs the bot could not copy from (not a member, no access); skip the fast path for them
+copy_unavailable_chats = set()
+
+
+def can_copy_fast(bot: Client, chat_message: Message, job: Job) -> bool:
+    """Whether the server-side copy fast path should be tried for this message."""
+    if not (PyroConf.COPY_FAST_PATH and is_copy_allowed(chat_message)):
+        return False
+    key = (bot.me.id, chat_message.chat.id)
+    return key not in copy_unavailable_chats and key not in job.copy_failed
+
+
+async def copy_message_fast(bot: Client, chat_message: Message, target_chat_id, job: Job):
+    """Copies a message (or its whole media group) server-side without downloading it.
+
+    Returns the copied messages, or None when the caller should fall back to the
+    download+upload pipeline. A chat whose copies fail with a permanent error is not tried
+    again for the rest of the job; only server and network errors are retried per message.
+    """
+    user_id = job.user_id
+    source_chat_id = chat_message.chat.id
+    try:
+        if chat_message.media_group_id:
+            copied = await bot.copy_media_group(chat_id=target_chat_id, from_chat_id=source_chat_id, message_id=chat_message.id)
+        else:
+            copied = [await bot.copy_message(chat_id=target_chat_id, from_chat_id=source_chat_id, message_id=chat_message.id)]
+        LOGGER(__name__).info(f"Copied message {chat_message.id} from {source_chat_id} to {target_chat_id} for user {user_id}")
+        return copied
+    except FloodWait:
+        raise
+    except (PeerIdInvalid, ChannelPrivate, ChatForwardsRestricted) as e:
+        LOGGER(__name__).info(f"Copy fast path unavailable for chat {source_chat_id}: {e}. Falling back to download.")
+        copy_unavailable_chats.add((bot.me.id, source_chat_id))
+        return None
+    except (InternalServerError, OSError, asyncio.TimeoutError) as e:
+        LOGGER(__name__).warning(f"Could not copy message {chat_message.id} for user {user_id}: {e}. Falling back to download.")
+        return None
+    except Exception as e:
+        LOGGER(__name__).warning(f"Could not copy message {chat_message.id} for user {user_id}: {e}. "
+                                 f"Falling back to download for the rest of job {job.id}.")
+        job.copy_failed.add((bot.me.id, source_chat_id))
+        return None
+
+
+async def process_message(bot: Client, message: Message, user: Client, chat_message, forward_chat_id, job: Job, media_path=None, album=None,
+                          partial=False):
+    """Sends one source message to the target chat and returns ``(source, sent)`` pairs for what
+    was delivered (an album may be delivered in part), or False on failure.
+
+    ``media_path`` may point to a file already downloaded by the range pipeline, in which case
+    the download step is skipped. The file is removed when processing ends either way.
+    ``album`` holds the already-fetched members when ``chat_message`` belongs to a media group;
+    ``partial`` marks an album missing some of its items, which can't be copied server-side.
+    """
+    kind = "album" if chat_message.media_group_id else "media" if chat_message.media else "text"
+    started = monotonic()
+    sent = await _process_message(bot, message, user, chat_message, forward_chat_id, job, media_path, album, partial)
+    outcome = "success" if sent else "flood_stop" if job.flood_stop else "cancelled" if job.cancel else "failed"
+    duration = monotonic() - started
+    metrics.messages_processed.inc(kind=kind, outcome=outcome)
+    metrics.message_seconds.observe(duration, kind=kind)
+    LOGGER(__name__).info(f"Message {chat_message.id} ({kind}): {outcome} in {duration:.2f}s",
+                          extra={"job_id": job.id, "chat_id": chat_message.chat.id,
+                                 "message_id": chat_message.id, "duration": round(duration, 3)})
+    return sent
+
+
+async def _process_message(bot: Client, message: Message, user: Client, chat_message, forward_chat_id, job: Job, media_path=None, album=None,
+                           partial=False):
+    user_id = job.user_id
     thumb_path = None
     progress_message = None
     
     try:
         # Check for cancellation before processing
-        if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+        if job.cancel:
             LOGGER(__name__).info(f"Task cancelled by user {user_id} before processing message {chat_message.id}")
             return False
 
+        target_chat_id = forward_chat_id if forward_chat_id else message.chat.id
+
+        # --- Server-side Copy Fast Path ---
+        # copy_media_group sends whole albums, so partial ones are uploaded instead
+        if can_copy_fast(bot, chat_message, job) and not (chat_message.media_group_id and partial):
+            copied = await copy_message_fast(bot, chat_message, target_chat_id, job)
+            if copied is not None:
+                metrics.delivery_paths.inc(path="copy")
+                return list(zip(album or [chat_message], copied))
+
         if chat_message.document or chat_message.video or chat_message.audio:
             file_size = (
                 chat_message.document.file_size if chat_message.document else
@@ -340,64 +979,94 @@ async def process_message(bot: Client, message: Message, user: Client, chat_mess
 
         parsed_caption = await get_parsed_msg(chat_message.caption or "", chat_message.caption_entities)
         parsed_text = await get_parsed_msg(chat_message.text or "", chat_message.entities)
-        target_chat_id = forward_chat_id if forward_chat_id else message.chat.id
 
         # --- Media Group Processing --- 
         if chat_message.media_group_id:
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+            if job.cancel:
                 return False
             LOGGER(__name__).info(f"Processing media group: {chat_message.media_group_id} for user {user_id}")
             # Ensure processMediaGroup handles FloodWait and cancellation internally
-            if not await processMediaGroup(chat_message, bot, message, target_chat_id, user_id, ongoing_tasks):
+            sent_group = await processMediaGroup(chat_message, bot, message, target_chat_id, job, album)
+            if not sent_group:
                  # Check if failure was due to flood stop
-                 if user_id in ongoing_tasks and ongoing_tasks[user_id].get("flood_stop", False):
+                 if job.flood_stop:
                      return False # Already handled
                  await message.reply("**Could not process the media group (possibly cancelled or failed).**")
                  return False
-            return True
+            metrics.delivery_paths.inc(path="album")
+            return sent_group
 
         # --- Single Media Processing --- 
         elif chat_message.media:
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+            if job.cancel:
                 return False
+
+            # Same file uploaded before: resend its file_id with zero transfer
+            sent = await send_from_file_cache(bot, chat_message, target_chat_id, parsed_caption)
+            if sent:
+                metrics.delivery_paths.inc(path="cached")
+                return [(chat_message, sent)]
                 
             start_time = time()
             try:
-                progress_message = await message.reply("**📥 Preparing Download...**") 
+                progress_message = await message.reply("**📥 Preparing Download...**" if media_path is None and not should_stream(chat_message) else "**📤 Preparing Upload...**")
             except FloodWait as fw_prog:
-                 await handle_flood_wait(fw_prog, user_id, message)
+                 await handle_flood_wait(fw_prog, job, message)
                  return False # Stop task
             except Exception as e_prog:
                  LOGGER(__name__).error(f"Error sending progress message for user {user_id}: {e_prog}")
                  await message.reply(f"**Error starting download: {e_prog}**")
-                 if user_id in ongoing_tasks: ongoing_tasks[user_id]["cancel"] = True
+                 job.cancel = True
                  return False # Stop task
 
-            try:
-                 media_path = await chat_message.download(
-                    progress=Leaves.progress_for_pyrogram,
-                    progress_args=progressArgs("📥 Downloading", progress_message, start_time)
-                 )
-            except FloodWait as fw_dl:
-                 await handle_flood_wait(fw_dl, user_id, message, progress_message)
-                 return False # Stop task
-            except Exception as download_err:
-                 LOGGER(__name__).error(f"Error during media download for message {chat_message.id} user {user_id}: {download_err}")
-                 try: await progress_message.edit(f"**❌ Download Failed: {download_err}**")
-                 except Exception: pass
-                 return False
+            # Large media: upload while downloading, no temporary file. Falls back to disk on errors.
+            if media_path is None and should_stream(chat_message):
+                try:
+                    sent = await send_streamed_media(bot, user, chat_message, target_chat_id, parsed_caption,
+                                                     progress_message, start_time)
+                except FloodWait as fw_stream:
+                    await handle_flood_wait(fw_stream, job, message, progress_message)
+                    return False # Stop task
+                except Exception as stream_err:
+                    LOGGER(__name__).warning(f"Streaming message {chat_message.id} failed for user {user_id}: {stream_err}. Retrying through disk.")
+                    sent = None
+                if sent:
+                    metrics.delivery_paths.inc(path="stream")
+                    remember_sent_media(bot, chat_message, sent)
+                    try: await progress_reporter.delete(progress_message)
+                    except Exception: pass
+                    progress_message = None
+                    return [(chat_message, sent)]
+
+            if media_path is None:
+                try:
+                     media_path = await download_message(
+                        chat_message,
+                        progress=report_progress,
+                        progress_args=progressArgs("📥 Downloading", progress_message, start_time),
+                        owner=job.id
+                     )
+                except FloodWait as fw_dl:
+                     await handle_flood_wait(fw_dl, job, message, progress_message)
+                     return False # Stop task
+                except Exception as download_err:
+                     LOGGER(__name__).error(f"Error during media download for message {chat_message.id} user {user_id}: {download_err}")
+                     try: await progress_message.edit(f"**❌ Download Failed: {download_err}**")
+                     except Exception: pass
+                     return False
 
             # Check cancellation after download
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+            if job.cancel:
                 LOGGER(__name__).info(f"Task cancelled by user {user_id} after downloading message {chat_message.id}")
                 try: await progress_message.edit("**Task Cancelled after download.**")
                 except Exception: pass
                 # Cleanup handled in finally block
                 return False
 
-            LOGGER(__name__).info(f"Downloaded media: {media_path}")
-            try: await progress_message.edit("**📤 Preparing Upload...**")
-            except Exception: pass
+            LOGGER(__name__).info(f"Downloaded media: {media_path}",
+                                  extra={"job_id": job.id, "message_id": chat_message.id,
+                                         "bytes": os.path.getsize(media_path)})
+            progress_reporter.update(progress_message, "**📤 Preparing Upload...**")
 
             media_type = (
                 "photo" if chat_message.photo else
@@ -406,39 +1075,35 @@ async def process_message(bot: Client, message: Message, user: Client, chat_mess
                 "document"
             )
 
-            # Send media
-            thumb = None
+            # Send media (metadata and thumbnail come from the source message, ffprobe/ffmpeg only fill gaps)
+            sent = None
             try:
                 if media_type == "photo":
-                    await bot.send_photo(chat_id=target_chat_id, photo=media_path, caption=parsed_caption or "",
-                                         progress=Leaves.progress_for_pyrogram, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
-                elif media_type == "video":
-                    thumb_path = "Assets/video_thumb.jpg" # Define here for finally block
-                    if os.path.exists(thumb_path):
-                        try: os.remove(thumb_path)
-                        except OSError: pass
-                    duration = (await get_media_info(media_path))[0]
-                    thumb = await get_video_thumbnail(media_path, duration)
-                    width, height = chat_message.video.width, chat_message.video.height
-                    if (not width or not height) and thumb and thumb != "none":
+                    sent = await bot.send_photo(chat_id=target_chat_id, photo=media_path, caption=parsed_caption or "",
+                                         progress=report_progress, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
+                else:
+                    metadata = await resolve_media_metadata(user, chat_message, media_path)
+                    thumb_path = metadata.thumb # Removed in the finally block
+                if media_type == "video":
+                    width, height = metadata.width, metadata.height
+                    if (not width or not height) and thumb_path:
                         try:
-                            with Image.open(thumb) as img: width, height = img.size
+                            with Image.open(thumb_path) as img: width, height = img.size
                         except Exception as img_err: LOGGER(__name__).warning(f"Could not read thumb dimensions: {img_err}")
                     if not width: width = 640
                     if not height: height = 360
-                    if thumb == "none": thumb = None
 
-                    await bot.send_video(chat_id=target_chat_id, video=media_path, duration=duration, width=width, height=height, thumb=thumb, caption=parsed_caption or "",
-                                         progress=Leaves.progress_for_pyrogram, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
+                    sent = await bot.send_video(chat_id=target_chat_id, video=media_path, duration=metadata.duration, width=width, height=height, thumb=thumb_path, caption=parsed_caption or "",
+                                         progress=report_progress, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
                 elif media_type == "audio":
-                    duration, artist, title = await get_media_info(media_path)
-                    await bot.send_audio(chat_id=target_chat_id, audio=media_path, duration=duration, performer=artist, title=title, caption=parsed_caption or "",
-                                         progress=Leaves.progress_for_pyrogram, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
+                    sent = await bot.send_audio(chat_id=target_chat_id, audio=media_path, duration=metadata.duration, performer=metadata.performer, title=metadata.title,
+                                         thumb=thumb_path, caption=parsed_caption or "",
+                                         progress=report_progress, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
                 elif media_type == "document":
-                    await bot.send_document(chat_id=target_chat_id, document=media_path, caption=parsed_caption or "",
-                                            progress=Leaves.progress_for_pyrogram, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
+                    sent = await bot.send_document(chat_id=target_chat_id, document=media_path, thumb=thumb_path, caption=parsed_caption or "",
+                                            progress=report_progress, progress_args=progressArgs("📤 Uploading", progress_message, start_time))
             except FloodWait as fw_send:
-                 await handle_flood_wait(fw_send, user_id, message, progress_message)
+                 await handle_flood_wait(fw_send, job, message, progress_message)
                  # Cleanup handled in finally block
                  return False # Stop task
             except Exception as send_err:
@@ -448,20 +1113,22 @@ async def process_message(bot: Client, message: Message, user: Client, chat_mess
                  # Cleanup handled in finally block
                  return False # Indicate failure
 
-            try: await progress_message.delete()
+            metrics.delivery_paths.inc(path="disk")
+            remember_sent_media(bot, chat_message, sent)
+            try: await progress_reporter.delete(progress_message)
             except Exception: pass
             progress_message = None # Prevent deletion in finally
-            return True # Success for single media
+            return [(chat_message, sent)] # Success for single media
 
         # --- Text Message Processing --- 
         elif chat_message.text or chat_message.caption:
-            if user_id in ongoing_tasks and ongoing_tasks[user_id]["cancel"]:
+            if job.cancel:
                 return False
             try:
-                await bot.send_message(chat_id=target_chat_id, text=parsed_text or parsed_caption)
-                return True # Success for text message
+                sent = await bot.send_message(chat_id=target_chat_id, text=parsed_text or parsed_caption)
+                return [(chat_message, sent)] # Success for text message
             except FloodWait as fw_text:
-                 await handle_flood_wait(fw_text, user_id, message)
+                 await handle_flood_wait(fw_text, job, message)
                  return False # Stop task
             except Exception as text_err:
                 LOGGER(__name__).error(f"Error sending text message {chat_message.id} user {user_id}: {text_err}")
@@ -473,8 +1140,11 @@ async def process_message(bot: Client, message: Message, user: Client, chat_mess
 
     except FloodWait as fw_outer:
         # Catch flood waits happening outside specific blocks within process_message
-        await handle_flood_wait(fw_outer, user_id, message, progress_message)
+        await handle_flood_wait(fw_outer, job, message, progress_message)
         return False # Stop task
+    except FloodWaitDetected:
+        # processMediaGroup already notified the user and flagged the job
+        return False
     except Exception as e:
         LOGGER(__name__).error(f"Error processing message {chat_message.id} for user {user_id}: {str(e)}", exc_info=True)
         # Avoid double error reporting if progress_message exists
@@ -486,77 +1156,107 @@ async def process_message(bot: Client, message: Message, user: Client, chat_mess
         return False # Indicate general failure
     finally:
         # Ensure cleanup of downloaded file and thumbnail
-        if media_path and os.path.exists(media_path):
-            try: os.remove(media_path)
-            except OSError as e: LOGGER(__name__).warning(f"Error removing media file {media_path}: {e}")
+        remove_file(media_path)
         if thumb_path and os.path.exists(thumb_path):
             try: os.remove(thumb_path)
             except OSError as e: LOGGER(__name__).warning(f"Error removing thumb file {thumb_path}: {e}")
         # Try deleting progress message if it still exists and wasn't deleted after success
         if progress_message:
-             try: await progress_message.delete()
+             try: await progress_reporter.delete(progress_message)
              except Exception: pass
 
 
+def _readable_rate(rate) -> str:
+    return "N/A" if rate is None else f"{get_readable_file_size(rate)}/s"
+
+
+def _readable_percent(value) -> str:
+    return "N/A" if value is None else f"{value:.1f}%"
+
+
 @bot.on_message(filters.command("stats") & filters.private)
 async def stats(_, message: Message):
-    # ... (stats command remains the same) ...
+    # Rendered from the background sampler's buffer, so this never waits on psutil
     currentTime = get_readable_time(time() - PyroConf.BOT_START_TIME)
-    try:
-        total, used, free = shutil.disk_usage(".")
-        total = get_readable_file_size(total)
-        used = get_readable_file_size(used)
-        free = get_readable_file_size(free)
-    except FileNotFoundError:
-        total, used, free = "N/A", "N/A", "N/A"
-        
-    try:
-        net_io = psutil.net_io_counters()
-        sent = get_readable_file_size(net_io.bytes_sent)
-        recv = get_readable_file_size(net_io.bytes_recv)
-    except Exception:
-        sent, recv = "N/A", "N/A"
-        
-    try:    
-        cpuUsage = psutil.cpu_percent(interval=0.5)
-        memory = psutil.virtual_memory().percent
-        disk = psutil.disk_usage("/").percent
-        process = psutil.Process(os.getpid())
-        mem_used = f"{round(process.memory_info()[0] / 1024**2)} MiB"
-    except Exception:
-         cpuUsage, memory, disk, mem_used = "N/A", "N/A", "N/A", "N/A"
+    sample = system_sampler.latest()
+    if sample is None:
+        await message.reply("**📊 Still collecting system samples, try again in a few seconds.**")
+        return
+
+    minute, history = 60, PyroConf.STATS_HISTORY
+    window = get_readable_time(min(history, sample.time - system_sampler.samples[0].time))
+    messages_rate = system_sampler.rate("messages", minute)
+    messages_rate = "N/A" if messages_rate is None else f"{messages_rate * 60:.1f}/min"
+    disk_space = (
+        f"**➜ Total Disk Space:** `{get_readable_file_size(sample.disk_total)}`\n"
+        f"**➜ Used:** `{get_readable_file_size(sample.disk_used)}`\n"
+        f"**➜ Free:** `{get_readable_file_size(sample.disk_free)}`\n\n"
+    ) if sample.disk_total is not None else "**➜ Disk Space:** `N/A`\n\n"
 
     stats = (
         "**📊 Bot Status**\n\n"
         f"**➜ Bot Uptime:** `{currentTime}`\n"
-        f"**➜ CPU:** `{cpuUsage}%` | "
-        f"**➜ RAM:** `{memory}%` | "
-        f"**➜ DISK:** `{disk}%`\n"
-        f"**➜ Memory Usage:** `{mem_used}`\n\n"
-        f"**➜ Total Disk Space:** `{total}`\n"
-        f"**➜ Used:** `{used}`\n"
-        f"**➜ Free:** `{free}`\n\n"
-        f"**➜ Upload:** `{sent}`\n"
-        f"**➜ Download:** `{recv}`"
+        f"**➜ CPU:** `{sample.cpu:.1f}%` (1m avg `{_readable_percent(system_sampler.average('cpu', minute))}`, "
+        f"{window} peak `{_readable_percent(system_sampler.peak('cpu', history))}`)\n"
+        f"**➜ RAM:** `{sample.memory}%` | "
+        f"**➜ DISK:** `{_readable_percent(sample.disk_percent)}`\n"
+        f"**➜ Memory Usage:** `{round(sample.rss / 1024**2)} MiB` "
+        f"({window} peak `{round(system_sampler.peak('rss', history) / 1024**2)} MiB`)\n\n"
+        + disk_space +
+        f"**➜ Transfers (1m | {window}):**\n"
+        f"   Download `{_readable_rate(system_sampler.rate('bot_down', minute))}` | "
+        f"`{_readable_rate(system_sampler.rate('bot_down', history))}`\n"
+        f"   Upload `{_readable_rate(system_sampler.rate('bot_up', minute))}` | "
+        f"`{_readable_rate(system_sampler.rate('bot_up', history))}`\n"
+        f"   Messages `{messages_rate}`\n"
+        f"**➜ Network (1m):** ⬆️ `{_readable_rate(system_sampler.rate('net_sent', minute))}` | "
+        f"⬇️ `{_readable_rate(system_sampler.rate('net_recv', minute))}`\n\n"
+        f"**➜ Upload:** `{get_readable_file_size(sample.net_sent)}`\n"
+        f"**➜ Download:** `{get_readable_file_size(sample.net_recv)}`"
     )
     await message.reply(stats)
 
 
 @bot.on_message(filters.command("logs") & filters.private)
 async def logs(_, message: Message):
-    # ... (logs command remains the same) ...
-    log_file = "logs.txt"
-    if os.path.exists(log_file):
-        try:
-            await message.reply_document(document=log_file, caption="**Bot Logs**")
-        except Exception as e:
-             LOGGER(__name__).error(f"Failed to send logs: {e}")
-             await message.reply(f"**Error sending logs: {e}**")
-    else:
+    # /logs [MB]: the last LOG_TAIL_MB (or MB) of the log, rotated files included, gzipped
+    if not os.path.exists(LOG_FILE):
         await message.reply("**Log file not found.**")
+        return
+    tail_mb = PyroConf.LOG_TAIL_MB
+    if len(message.command) > 1:
+        try:
+            tail_mb = float(message.command[1])
+        except ValueError:
+            await message.reply("**Usage: /logs [MB]**")
+            return
+    archive = None
+    try:
+        archive = await asyncio.to_thread(compress_log_tail, int(tail_mb * 1024 * 1024))
+        await message.reply_document(document=archive, file_name="logs.txt.gz",
+                                     caption=f"**Bot Logs** (last {tail_mb:g} MB)")
+    except Exception as e:
+         LOGGER(__name__).error(f"Failed to send logs: {e}")
+         await message.reply(f"**Error sending logs: {e}**")
+    finally:
+        if archive and os.path.exists(archive):
+            os.remove(archive)
+
+async def run_bot():
+    spool.sweep() # Downloads orphaned by a killed process
+    system_sampler.start()
+    await bot.start()
+    await user_pool.start()
+    await bot_pool.start()
+    if PyroConf.AUTO_RESUME:
+        await resume_interrupted_jobs()
+    mirror_task = asyncio.create_task(poll_mirrors())
+    await idle()
+    mirror_task.cancel()
+    await bot_pool.stop()
+    await user_pool.stop()
+    await bot.stop()
 
-# Need to modify processMediaGroup in helpers/utils.py to accept user_id and ongoing_tasks
-# and implement FloodWait handling with handle_flood_wait call.
 
 if __name__ == "__main__":
     # ... (main execution block remains largely the same) ...
@@ -565,7 +1265,7 @@ if __name__ == "__main__":
         
     try:
         import os
-        from flask import Flask, jsonify
+        from flask import Flask, Response, jsonify
         import threading
         
         app = Flask(__name__)
@@ -573,6 +1273,10 @@ if __name__ == "__main__":
         @app.route("/")
         def index():
             return jsonify({"status": "running"})
+
+        @app.route("/metrics")
+        def metrics_endpoint():
+            return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
         
         port = int(os.environ.get("PORT", 8000))
         
@@ -589,7 +1293,7 @@ if __name__ == "__main__":
         LOGGER(__name__).info("Bot Starting!")
         user.start()
         PyroConf.BOT_START_TIME = time() # Record start time
-        bot.run()
+        bot.run(run_bot())
         
     except KeyboardInterrupt:
         LOGGER(__name__).info("Bot stopping due to KeyboardInterrupt...")
@@ -597,5 +1301,4 @@ if __name__ == "__main__":
         LOGGER(__name__).critical(f"Bot failed to start or run: {err}", exc_info=True)
     finally:
         LOGGER(__name__).info("Bot Stopped")
-        ongoing_tasks.clear()
 